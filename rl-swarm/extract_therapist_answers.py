@@ -109,11 +109,16 @@ def main():
     parser.add_argument("--file", "-f", default="supervisor_content.txt", help="Path to the supervisor_content.txt file")
     parser.add_argument("--therapist-output", "-t", help="Path to write the extracted therapist answers")
     parser.add_argument("--supervisor-output", "-s", help="Path to write the extracted supervisor feedback")
+    parser.add_argument("--render", "-r", action="store_true", help="Render the file from the supervisor session store first")
     args = parser.parse_args()
     
     # Get the absolute path to the supervisor_content.txt file
     file_path = os.path.abspath(args.file)
     
+    if args.render:
+        from hivemind_exp.session_store import session_store
+        session_store.render_to(file_path)
+    
     # Extract therapist answers
     extract_therapist_answers(file_path, args.therapist_output)
     
@@ -0,0 +1,98 @@
+"""
+Stage 2 dataset build time and memory: padded wide columns vs. long format.
+
+Each (format, agents) pair runs in its own process so peak RSS isn't
+shared. By default only the dataset is built; --prompts also builds the
+stage 2 prompts, which scores every answer and dominates at scale.
+
+    python -m hivemind_exp.benchmarks.long_format_merge --agents 50 200 1000
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import resource
+import tempfile
+import time
+
+
+def _values(num_agents: int, num_questions: int, answer_rate: float, seed: int = 0):
+    rng = random.Random(seed)
+    values = []
+    for q in range(num_questions):
+        answers = {
+            str(a): f"<think>\nAgent {a} reasons about question {q}.\n</think>\n<answer>\n{rng.randint(0, 99)}\n</answer>\n"
+            for a in range(num_agents)
+            if rng.random() < answer_rate
+        }
+        values.append({"question": f"Question {q}?", "answer": "42", "agent_answers": answers})
+    return values
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files
+    )
+
+
+def _run(long_format: bool, num_agents: int, args, queue):
+    from datasets import Dataset
+
+    from hivemind_exp.gsm8k import generate_prompts
+    from hivemind_exp.gsm8k.long_format import long_format_dataset
+
+    values = _values(num_agents, args.questions, args.answer_rate)
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as cache_dir:
+        start_time = time.perf_counter()
+        if args.prompts:
+            os.environ["HF_DATASETS_CACHE"] = cache_dir
+            dataset, _ = generate_prompts.get_stage2_samples(values, long_format=long_format)
+        elif long_format:
+            dataset = long_format_dataset(values)
+        else:
+            generate_prompts.fill_unknown_answers_opinions(values)
+            dataset = Dataset.from_generator(
+                generate_prompts.stage2_generator, gen_kwargs={"values": values}, cache_dir=cache_dir
+            )
+        elapsed = time.perf_counter() - start_time
+        disk_bytes = _dir_bytes(cache_dir)
+
+    peak_rss_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss) / 1024
+    queue.put((elapsed, len(dataset.column_names), dataset.data.nbytes, disk_bytes, peak_rss_mb))
+
+
+def measure(long_format: bool, num_agents: int, args):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run, args=(long_format, num_agents, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--agents", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--questions", type=int, default=16)
+    parser.add_argument("--answer-rate", type=float, default=0.25, help="Share of agents answering each question")
+    parser.add_argument("--prompts", action="store_true", help="Also build stage 2 prompts")
+    args = parser.parse_args()
+
+    print(
+        f"{'agents':>7} {'format':>6} {'build (s)':>10} {'columns':>8} "
+        f"{'arrow (KB)':>11} {'disk (KB)':>10} {'peak RSS +MB':>13}"
+    )
+    for num_agents in args.agents:
+        for long_format in (False, True):
+            elapsed, columns, nbytes, disk_bytes, peak_rss_mb = measure(long_format, num_agents, args)
+            print(
+                f"{num_agents:>7} {'long' if long_format else 'wide':>6} {elapsed:>10.3f} {columns:>8} "
+                f"{nbytes / 1024:>11.0f} {disk_bytes / 1024:>10.0f} {peak_rss_mb:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
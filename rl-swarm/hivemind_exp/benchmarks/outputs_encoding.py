@@ -0,0 +1,88 @@
+"""
+Bytes stored in the DHT per round for node outputs, legacy vs. encoded.
+
+Every simulated peer answers the same questions in all three stages, as in a
+swarm round. Shared strings (questions, stage prompts) are assumed identical
+across peers; blobs are counted once per round.
+
+    python -m hivemind_exp.benchmarks.outputs_encoding
+"""
+
+import argparse
+import random
+import string
+import time
+
+from hivemind.utils.serializer import MSGPackSerializer
+
+from hivemind_exp.outputs_codec import encode_blob, encode_outputs
+
+
+def _text(rng: random.Random, n_words: int) -> str:
+    return " ".join(
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        for _ in range(n_words)
+    )
+
+
+def round_outputs(num_peers: int, num_questions: int, seed: int = 0):
+    """Yields (node_key, outputs) for every value published in one round."""
+    rng = random.Random(seed)
+    for q in range(num_questions):
+        question = _text(rng, 60)
+        answer = str(rng.randint(0, 1000))
+        response = lambda: _text(rng, 150)  # noqa: E731
+        stage2_prompt = f"{question}\n\n" + "\n\n".join(response() for _ in range(5))
+        stage3_prompt = f"{stage2_prompt}\n\n" + "\n\n".join(
+            response() for _ in range(5)
+        )
+        for p in range(num_peers):
+            node_key = f"peer_{p}"
+            yield node_key, {
+                "question": question,
+                "answer": answer,
+                "agent_answers": {node_key: response()},
+            }
+            yield node_key, {
+                "question": question,
+                "answer": answer,
+                "stage2_prompt": stage2_prompt,
+                "agent_opinion": {node_key: response()},
+            }
+            yield node_key, {
+                "question": question,
+                "answer": answer,
+                "stage3_prompt": stage3_prompt,
+                "final_agent_decision": {node_key: response()},
+            }
+
+
+def measure(num_peers: int, num_questions: int) -> tuple[int, int]:
+    legacy_bytes = encoded_bytes = 0
+    blobs = {}
+    ts = time.time()
+    for _, outputs in round_outputs(num_peers, num_questions):
+        legacy_bytes += len(MSGPackSerializer.dumps((ts, outputs)))
+        encoded, new_blobs = encode_outputs(outputs)
+        encoded_bytes += len(MSGPackSerializer.dumps((ts, encoded)))
+        blobs.update(new_blobs)
+
+    for text in blobs.values():
+        encoded_bytes += len(MSGPackSerializer.dumps(encode_blob(text)))
+    return legacy_bytes, encoded_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--peers", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--questions", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'peers':>6} {'legacy':>14} {'encoded':>14} {'ratio':>7}")
+    for num_peers in args.peers:
+        legacy, encoded = measure(num_peers, args.questions)
+        print(f"{num_peers:>6} {legacy:>14,} {encoded:>14,} {legacy / encoded:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Stage 0 prompt preparation per round: chat template + tokenizer vs. PromptCache.
+
+Times what GRPOTrainer._prepare_inputs does to the prompts of every stage 0
+batch, for the stage 0 dataset from get_stage1_samples. The cache is opened
+fresh each round, as after a restart.
+
+    python -m hivemind_exp.benchmarks.prompt_cache --tokenizer Qwen/Qwen2.5-0.5B-Instruct
+"""
+
+import argparse
+import tempfile
+import time
+
+from transformers import AutoTokenizer
+from trl.data_utils import maybe_apply_chat_template
+
+from hivemind_exp.gsm8k.generate_prompts import get_stage1_samples
+from hivemind_exp.prompt_cache import PromptCache
+
+
+def prepare(tokenizer, batch):
+    texts = [maybe_apply_chat_template(x, tokenizer)["prompt"] for x in batch]
+    return tokenizer(texts, return_tensors="pt", padding=True, padding_side="left", add_special_tokens=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokenizer", default="trl-internal-testing/tiny-Qwen2ForCausalLM-2.5")
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    dataset, _ = get_stage1_samples()
+    rows = [{"prompt": p} for p in dataset["prompt"]]
+    batches = [rows[i : i + args.batch_size] for i in range(0, len(rows), args.batch_size)]
+
+    with tempfile.TemporaryDirectory() as root:
+        start_time = time.perf_counter()
+        PromptCache(tokenizer, root).add(x["prompt"] for x in rows)
+        fill = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for _ in range(args.rounds):
+            for batch in batches:
+                prepare(tokenizer, batch)
+        uncached = (time.perf_counter() - start_time) / args.rounds
+
+        start_time = time.perf_counter()
+        for _ in range(args.rounds):
+            cache = PromptCache(tokenizer, root)
+            for batch in batches:
+                prepare(cache.tokenizer_for([x["prompt"] for x in batch]), batch)
+        cached = (time.perf_counter() - start_time) / args.rounds
+
+    print(f"{len(rows)} prompts in {len(batches)} batches, first fill {fill * 1000:.1f} ms")
+    print(f"{'path':>9} {'ms/round':>9}")
+    print(f"{'uncached':>9} {uncached * 1000:>9.2f}")
+    print(f"{'cached':>9} {cached * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
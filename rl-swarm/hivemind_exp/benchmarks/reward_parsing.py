@@ -0,0 +1,153 @@
+"""
+Reward function time per batch, with and without sharing work between calls.
+
+Each batch is one prompt with `num_generations` completions of about
+`max_completion_length` tokens. Every reward function of the stage is called
+once, as GRPOTrainer does, including the cumulative one that needs all the
+others. "unshared" clears every cache before each call; "parsed" keeps
+completion and prompt parses but recomputes rewards; "matrix" also reuses the rewards
+already computed for the batch.
+
+    python -m hivemind_exp.benchmarks.reward_parsing
+"""
+
+import argparse
+import random
+import string
+import time
+from functools import partial
+
+import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+import hivemind_exp.gsm8k.stage2_rewards as stage2_rewards
+import hivemind_exp.gsm8k.stage3_rewards as stage3_rewards
+from hivemind_exp.gsm8k.completion_parse import parse_completion
+from hivemind_exp.hivemind_utils import HivemindNode
+
+CHARS_PER_TOKEN = 4
+MODULES = (stage1_rewards, stage2_rewards, stage3_rewards)
+
+
+def _text(rng: random.Random, n_chars: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < n_chars:
+        words.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))))
+    return " ".join(words)
+
+
+def _completion(rng: random.Random, tags: list[str], n_chars: int) -> str:
+    # Mostly well-formed; some completions drop a tag or add trailing text.
+    per_tag = n_chars // len(tags)
+    parts = [f"<{tag}>\n{_text(rng, per_tag)}\n</{tag}>\n" for tag in tags]
+    if rng.random() < 0.25:
+        parts.pop(rng.randrange(len(parts)))
+    if rng.random() < 0.25:
+        parts.append(_text(rng, rng.randint(10, 200)))
+    return "".join(parts)
+
+
+STAGE_TAGS = [
+    ["think", "answer"],
+    ["compare", "explain", "identify"],
+    ["summarize_feedback", "majority", "question", "think", "answer"],
+]
+
+
+def batch(rng: random.Random, stage: int, num_generations: int, n_chars: int):
+    question = _text(rng, 300)
+    students = {
+        f"student_{i}": _completion(rng, STAGE_TAGS[0], 1000) for i in range(4)
+    }
+    prompt = (
+        f"The question we were given is: {question}  \n\n"
+        "The following answers to this question were suggested:"
+        + "".join(f"<student>{k}</student> said \n{v}\n" for k, v in students.items())
+    )
+    if stage == 2:
+        prompt += (
+            "  \nAfter comparing these answers, the following feedback was given about which answer is best: \n"
+            + "".join(f"<identify>{k}</identify>\n" for k in students)
+        )
+    completions = [
+        [{"role": "assistant", "content": _completion(rng, STAGE_TAGS[stage], n_chars)}]
+        for _ in range(num_generations)
+    ]
+    return {
+        "prompts": [[{"role": "user", "content": prompt}]] * num_generations,
+        "completions": completions,
+        "answer": [str(rng.randint(0, 100))] * num_generations,
+    }
+
+
+def reward_funcs(stage: int, node: HivemindNode):
+    module = MODULES[stage]
+    names = [
+        [
+            "xmlcount_reward_func",
+            "soft_format_reward_func",
+            "strict_format_reward_func",
+            "int_reward_func",
+            "correctness_reward_func",
+        ],
+        [
+            "proper_id_reward_func",
+            "correctness_reward_func",
+            "strict_format_reward_func",
+            "soft_format_reward_func",
+            "xmlcount_reward_func",
+        ],
+        [
+            "consensus_reward_func",
+            "concensus_correctness_reward_func",
+            "question_recreation_reward_func",
+            "final_correctness_reward_func",
+            "strict_format_reward_func",
+            "soft_format_reward_func",
+            "xmlcount_reward_func",
+        ],
+    ][stage]
+    funcs = [partial(getattr(module, name), logging=False) for name in names]
+    funcs.append(partial(module.hivemind_cumulative_reward, node, logging=False))
+    return funcs
+
+
+def measure(stage: int, batches: list[dict], mode: str) -> float:
+    node = HivemindNode("bench", "bench")
+    node.stage_num = stage
+    funcs = reward_funcs(stage, node)
+    engine = MODULES[stage].reward_engine
+    parse_completion.cache_clear()
+    engine.clear()
+    start_time = time.perf_counter()
+    for inputs in batches:
+        for func in funcs:
+            if mode == "unshared":
+                parse_completion.cache_clear()
+                stage3_rewards.parse_prompt.cache_clear()
+            if mode != "matrix":
+                engine.clear()
+            func(**inputs)
+    return (time.perf_counter() - start_time) / len(batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max_completion_length", type=int, default=1024)
+    parser.add_argument("--num_generations", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    n_chars = args.max_completion_length * CHARS_PER_TOKEN
+    modes = ("unshared", "parsed", "matrix")
+    print(f"{'stage':>6}" + "".join(f"{mode:>12}" for mode in modes))
+    for stage in range(3):
+        batches = [
+            batch(rng, stage, args.num_generations, n_chars)
+            for _ in range(args.batches)
+        ]
+        times = [measure(stage, batches, mode) for mode in modes]
+        print(f"{stage:>6}" + "".join(f"{t * 1e3:>10.2f}ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
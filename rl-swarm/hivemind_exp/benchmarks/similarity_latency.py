@@ -0,0 +1,78 @@
+"""
+Latency of scoring one recreated question against the original, per backend.
+
+Completions are about `max_completion_length` tokens of text built to be slow
+for SequenceMatcher: the question repeated or shuffled, long runs over the
+question's alphabet, and plain random text as a baseline. Caching is off, so
+every call does the full comparison; p50, p99 and max are per call.
+
+    python -m hivemind_exp.benchmarks.similarity_latency
+"""
+
+import argparse
+import random
+import string
+import time
+
+from hivemind_exp.gsm8k.similarity import BACKENDS
+
+CHARS_PER_TOKEN = 4
+
+
+def _text(rng: random.Random, n_chars: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < n_chars:
+        words.append("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))))
+    return " ".join(words)
+
+
+def completions(rng: random.Random, question: str, n_chars: int) -> dict[str, str]:
+    words = question.split()
+    alphabet = sorted(set(question))
+    shuffled = []
+    while sum(len(w) + 1 for w in shuffled) < n_chars:
+        shuffled.extend(rng.sample(words, len(words)))
+    return {
+        "random": _text(rng, n_chars),
+        "repeated": (question + " ") * (n_chars // (len(question) + 1)),
+        "shuffled": " ".join(shuffled)[:n_chars],
+        "alphabet": "".join(rng.choices(alphabet, k=n_chars)),
+        "two_chars": "".join(rng.choices(alphabet[:2], k=n_chars)),
+    }
+
+
+def percentiles(times: list[float]) -> tuple[float, float, float]:
+    times = sorted(times)
+    return times[len(times) // 2], times[int(len(times) * 0.99)], times[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--max_completion_length", type=int, default=1024)
+    parser.add_argument("--question_chars", type=int, default=150)
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    n_chars = args.max_completion_length * CHARS_PER_TOKEN
+    samples = []
+    for _ in range(args.samples):
+        question = _text(rng, args.question_chars)
+        samples.append((question, completions(rng, question, n_chars)))
+
+    print(f"{'case':>10} {'backend':>8} {'p50':>10} {'p99':>10} {'max':>10}")
+    for case in samples[0][1]:
+        for backend, ratio in BACKENDS.items():
+            times = []
+            for question, texts in samples:
+                start_time = time.perf_counter()
+                ratio(texts[case], question)
+                times.append(time.perf_counter() - start_time)
+            p50, p99, worst = percentiles(times)
+            print(
+                f"{case:>10} {backend:>8} {p50 * 1e3:>8.2f}ms {p99 * 1e3:>8.2f}ms {worst * 1e3:>8.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Per-stage GRPO trainer setup time and peak RSS: rebuilt vs. reused trainer.
+
+Each mode runs in its own process so peak RSS isn't shared. Only setup is
+timed; no training steps are run.
+
+    python -m hivemind_exp.benchmarks.stage_setup --model <name or path>
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import tempfile
+import time
+
+TEST_MODEL_NAME = "trl-internal-testing/tiny-Qwen2ForCausalLM-2.5"
+
+
+def _reward_func(completions, **kwargs):
+    return [0.0 for _ in completions]
+
+
+def _run(model_name: str, reuse: bool, num_stages: int, queue):
+    import hivemind
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+    from trl import GRPOConfig
+
+    from hivemind_exp.hivemind_utils import HivemindNode
+    from hivemind_exp.tests.fake_data import SAMPLES
+    from hivemind_exp.trainer.hivemind_grpo_trainer import HivemindGRPOTrainer
+
+    dht = hivemind.DHT(start=True)
+    node = HivemindNode.coordinator("bench", "bench")
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    with tempfile.TemporaryDirectory() as output_dir:
+        config = GRPOConfig(output_dir=output_dir, report_to=[], max_steps=1)
+        trainer = HivemindGRPOTrainer(
+            node=node,
+            dht=dht,
+            stage_data=None,  # type: ignore
+            config=config,
+            model=model,
+            tokenizer=tokenizer,
+            reuse_trainer=reuse,
+        )
+
+        class Stage:
+            reward_funcs = [_reward_func]
+
+        times = []
+        for _ in range(num_stages):
+            start_time = time.perf_counter()
+            trainer.get_stage_trainer(Stage, SAMPLES, SAMPLES)
+            times.append(time.perf_counter() - start_time)
+
+    dht.shutdown()
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((times, peak_rss_mb))
+
+
+def measure(model_name: str, reuse: bool, num_stages: int):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run, args=(model_name, reuse, num_stages, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model", default=TEST_MODEL_NAME)
+    parser.add_argument("--stages", type=int, default=9, help="e.g. 3 rounds x 3 stages")
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'first (s)':>10} {'later avg (s)':>14} {'total (s)':>10} {'peak RSS (MB)':>14}")
+    for reuse in (False, True):
+        times, peak_rss_mb = measure(args.model, reuse, args.stages)
+        later = times[1:] or [0.0]
+        print(
+            f"{'reuse' if reuse else 'rebuild':>8} {times[0]:>10.3f} "
+            f"{sum(later) / len(later):>14.4f} {sum(times):>10.3f} {peak_rss_mb:>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from hivemind_exp.session_store import SESSION_DIR
+
+logger = logging.getLogger(__name__)
+
+# Written by the web app (pages/api/chat.js) as one JSON array of
+# {"timestamp", "user", "assistant"} objects.
+CHAT_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data/msg/chat.json",
+)
+CURSOR_FILE = os.path.join(SESSION_DIR, "chat_cursor.json")
+MAX_NEW_MESSAGES = 64
+CHUNK_SIZE = 64 * 2**10
+# Bytes before the cursor offset kept to detect a rewritten history.
+TAIL_BYTES = 64
+
+
+def message_hash(text: str) -> str:
+    return hashlib.blake2b(text.strip().encode(), digest_size=8).hexdigest()
+
+
+def iter_json_array(
+    path: str, offset: int = 0, chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[int, Any]]:
+    """
+    Streams the items of a top-level JSON array of objects, reading
+    `chunk_size` bytes at a time. Yields (end byte offset, item); a yielded
+    offset can be passed back as `offset` to resume after that item.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        buf, pos, eof = "", offset, False
+        started = offset > 0
+
+        while True:
+            stripped = buf.lstrip()
+            pos += len(buf[: len(buf) - len(stripped)].encode())
+            buf = stripped
+            if not buf:
+                if eof:
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf += utf8.decode(chunk, final=eof)
+                continue
+
+            if not started:
+                if buf[0] != "[":
+                    raise ValueError(f"{path} is not a JSON array")
+                started = True
+                buf, pos = buf[1:], pos + 1
+                continue
+            if buf[0] == "]":
+                return
+            if buf[0] == ",":
+                buf, pos = buf[1:], pos + 1
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf += utf8.decode(chunk, final=eof)
+                continue
+            pos += len(buf[:end].encode())
+            buf = buf[end:]
+            yield pos, item
+
+
+@dataclass
+class ChatIngestStats:
+    read: int = 0
+    new: int = 0
+    duplicates: int = 0  # Same text as an already consumed message.
+    deferred: int = 0  # Runs that stopped at max_new with messages left.
+    rescans: int = 0  # History was rewritten; read again from the start.
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class ChatIngest:
+    """
+    Incremental reader for the chat.json history.
+
+    A cursor persisted at `cursor_path` records the byte offset after the
+    last consumed message, the bytes just before it and the hashes of all
+    consumed messages. `new_messages` resumes from the offset, so old
+    history is neither parsed nor retrained, and returns at most `max_new`
+    user messages whose text wasn't seen before. Messages past `max_new`
+    are left for the next run. If the history was rewritten under the
+    cursor, it is read again from the start and the hashes drop repeats.
+
+    With `commit=False` the cursor only advances in memory, so later calls
+    still see new messages, and is saved by `commit` once they were used.
+    """
+
+    def __init__(
+        self,
+        path: str = CHAT_FILE,
+        cursor_path: str = CURSOR_FILE,
+        max_new: int = MAX_NEW_MESSAGES,
+        log: logging.Logger | None = None,
+    ):
+        self.path = path
+        self.cursor_path = cursor_path
+        self.max_new = max_new
+        self.logger = log or logger
+        self.stats = ChatIngestStats()
+
+        self._pending: dict | None = None
+
+    def _load_cursor(self) -> dict:
+        try:
+            with open(self.cursor_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable chat cursor: {e}")
+        return {"offset": 0, "tail": "", "hashes": []}
+
+    def _save_cursor(self, cursor: dict):
+        os.makedirs(os.path.dirname(self.cursor_path) or ".", exist_ok=True)
+        tmp = self.cursor_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cursor, f)
+        os.replace(tmp, self.cursor_path)
+
+    def _tail(self, offset: int) -> str:
+        start = max(0, offset - TAIL_BYTES)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            return f.read(offset - start).hex()
+
+    def new_messages(self, commit: bool = True) -> list[str]:
+        """User messages added since the last run, oldest first."""
+        cursor = self._pending or self._load_cursor()
+        offset = cursor["offset"]
+        if offset and (
+            os.path.getsize(self.path) < offset or self._tail(offset) != cursor["tail"]
+        ):
+            self.logger.info("Chat history was rewritten; reading it from the start")
+            self.stats.rescans += 1
+            offset = 0
+
+        seen = set(cursor["hashes"])
+        messages = []
+        for end, message in iter_json_array(self.path, offset):
+            text = message.get("user") if isinstance(message, dict) else None
+            if text and text.strip():
+                h = message_hash(text)
+                if h in seen:
+                    self.stats.duplicates += 1
+                elif len(messages) >= self.max_new:
+                    self.stats.deferred += 1
+                    break
+                else:
+                    seen.add(h)
+                    cursor["hashes"].append(h)
+                    messages.append(text)
+            self.stats.read += 1
+            offset = end
+
+        self.stats.new += len(messages)
+        cursor["offset"] = offset
+        cursor["tail"] = self._tail(offset)
+        self._pending = cursor
+        if commit:
+            self.commit()
+        return messages
+
+    def commit(self):
+        """Saves the cursor past every message returned so far."""
+        if self._pending is not None:
+            self._save_cursor(self._pending)
+            self._pending = None
+
+
+# Shared by the chat.json entry points in generate_prompts.
+chat_ingest = ChatIngest()
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import torch
+from safetensors.torch import load_file, save_file
+
+from hivemind_exp.stage_timeline import StageTimeline
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PREFIX = "round"
+MODEL_FILE = "model.safetensors"
+ROUND_CACHE_FILE = "round_cache.json"
+META_FILE = "checkpoint.json"
+
+
+@dataclass
+class CheckpointMeta:
+    round_num: int
+    stage: int  # Last completed stage.
+    created_at: float
+
+    def next_stage(self) -> tuple[int, int]:
+        return self.round_num, self.stage + 1
+
+
+@dataclass
+class _Snapshot:
+    meta: CheckpointMeta
+    state_dict: dict[str, torch.Tensor]
+    model_config: Any
+    round_cache: dict[tuple[int, int], dict[str, tuple[float, dict]]]
+
+
+def checkpoint_name(round_num, stage) -> str:
+    return f"{CHECKPOINT_PREFIX}-{round_num}-stage-{stage}"
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    encoded = json.dumps(
+        [
+            len(tokenizer),
+            tokenizer.name_or_path,
+            tokenizer.special_tokens_map,
+            getattr(tokenizer, "chat_template", None),
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.md5(encoded.encode()).hexdigest()
+
+
+class CheckpointManager:
+    """
+    Writes stage-boundary checkpoints on a background thread.
+
+    `save` snapshots the model state dict and round cache to CPU on the
+    calling thread and returns; a daemon worker writes them as safetensors +
+    JSON into `<root>/round-R-stage-S`, renaming into place when complete.
+    Only the latest pending snapshot is kept if the writer falls behind, and
+    only the newest `keep_last` checkpoints are kept on disk.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        keep_last: int = 2,
+        timeline: StageTimeline | None = None,
+        log: logging.Logger | None = None,
+    ):
+        self.root = root
+        self.keep_last = keep_last
+        self.timeline = timeline
+        self.logger = log or logger
+        self.saved = 0
+        self.skipped = 0  # Replaced by a newer snapshot before being written.
+
+        self._tokenizer_fingerprint = None
+        self._pending: _Snapshot | None = None
+        self._writing = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="checkpoint-writer", daemon=True
+        )
+        self._thread.start()
+
+    def save(self, model, round_num, stage, round_cache):
+        state_dict = {
+            k: v.detach().to("cpu", copy=True).contiguous()
+            for k, v in model.state_dict().items()
+        }
+        snapshot = _Snapshot(
+            meta=CheckpointMeta(round_num, stage, time.time()),
+            state_dict=state_dict,
+            model_config=getattr(model, "config", None),
+            round_cache={k: dict(v) for k, v in round_cache.items()},
+        )
+        with self._cond:
+            if self._pending is not None:
+                self.skipped += 1
+            self._pending = snapshot
+            self._cond.notify_all()
+
+    def save_tokenizer(self, tokenizer, path: str) -> bool:
+        """Saves the tokenizer to `path` unless it hasn't changed since the last save."""
+        fingerprint = tokenizer_fingerprint(tokenizer)
+        if fingerprint == self._tokenizer_fingerprint:
+            return False
+
+        tokenizer.save_pretrained(path)
+        self._tokenizer_fingerprint = fingerprint
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                snapshot, self._pending = self._pending, None
+                self._writing = True
+
+            try:
+                self._write(snapshot)
+                self._rotate()
+            except Exception as e:
+                self.logger.warning(f"Failed to write checkpoint {snapshot.meta}: {e}")
+
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+    def _write(self, snapshot: _Snapshot):
+        start_time = time.monotonic()
+        meta = snapshot.meta
+        path = os.path.join(self.root, checkpoint_name(meta.round_num, meta.stage))
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        save_file(snapshot.state_dict, os.path.join(tmp_path, MODEL_FILE))
+        if snapshot.model_config is not None:
+            snapshot.model_config.save_pretrained(tmp_path)
+        with open(os.path.join(tmp_path, ROUND_CACHE_FILE), "w") as f:
+            json.dump(
+                [[r, s, outputs] for (r, s), outputs in snapshot.round_cache.items()], f
+            )
+        with open(os.path.join(tmp_path, META_FILE), "w") as f:
+            json.dump(asdict(meta), f)
+
+        nbytes = sum(
+            os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path)
+        )
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self.saved += 1
+        if self.timeline:
+            self.timeline.record(
+                "checkpoint_write",
+                time.monotonic() - start_time,
+                nbytes,
+                meta.round_num,
+                meta.stage,
+            )
+        self.logger.info(f"Checkpoint written to {path}")
+
+    def _checkpoints(self) -> list[CheckpointMeta]:
+        if not os.path.isdir(self.root):
+            return []
+
+        metas = []
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self.root, name, META_FILE)
+            if name.endswith(".tmp") or not os.path.exists(meta_path):
+                continue
+            with open(meta_path) as f:
+                metas.append(CheckpointMeta(**json.load(f)))
+        return sorted(metas, key=lambda m: (m.round_num, m.stage))
+
+    def _rotate(self):
+        for meta in self._checkpoints()[: -self.keep_last]:
+            shutil.rmtree(
+                os.path.join(self.root, checkpoint_name(meta.round_num, meta.stage)),
+                ignore_errors=True,
+            )
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Blocks until queued checkpoints are on disk. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._pending is None and not self._writing, timeout
+            )
+
+    def latest(self) -> CheckpointMeta | None:
+        checkpoints = self._checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def load(
+        self, meta: CheckpointMeta, model
+    ) -> dict[tuple[int, int], dict[str, tuple[float, dict]]]:
+        """Loads weights into `model` and returns the saved round cache."""
+        path = os.path.join(self.root, checkpoint_name(meta.round_num, meta.stage))
+        model.load_state_dict(load_file(os.path.join(path, MODEL_FILE)))
+        with open(os.path.join(path, ROUND_CACHE_FILE)) as f:
+            return {
+                (r, s): {q: tuple(value) for q, value in outputs.items()}
+                for r, s, outputs in json.load(f)
+            }
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Hashable
+
+from hivemind.dht import DHT
+
+from hivemind_exp.stage_timeline import get_timeline, value_nbytes
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PublisherStats:
+    enqueued: int = 0
+    merged: int = 0  # Replaced a pending write to the same key/subkey.
+    dropped: int = 0  # Evicted because the queue was full.
+    published: int = 0
+    failed: int = 0  # Raised, or returned False (e.g. DHT.store rejected).
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class DHTPublisher:
+    """
+    Write-behind queue for DHT writes issued from the training loop.
+
+    Writes are keyed by (key, subkey); a newer write to a pending slot replaces
+    the older value instead of queueing twice. When the queue is full, the
+    oldest pending write not marked `keep` is dropped; kept writes (blobs that
+    a queued outputs record references) may grow the queue past `max_pending`
+    instead. A task returning False counts as failed. A single daemon worker
+    drains the queue.
+    """
+
+    def __init__(
+        self, dht: DHT, max_pending: int = 256, log: logging.Logger | None = None
+    ):
+        self.dht = dht
+        self.max_pending = max_pending
+        self.logger = log or logger
+        self.stats = PublisherStats()
+
+        self._pending: OrderedDict[Hashable, tuple[Callable[[], Any], bool]] = (
+            OrderedDict()
+        )
+        self._inflight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="dht-publisher", daemon=True
+        )
+        self._thread.start()
+
+    def store(
+        self,
+        key: str,
+        value: Any,
+        expiration_time: float,
+        subkey=None,
+        keep: bool = False,
+    ):
+        write = partial(
+            self.dht.store,
+            key=key,
+            subkey=subkey,
+            value=value,
+            expiration_time=expiration_time,
+        )
+        if timeline := get_timeline(self.dht):
+            write = timeline.timed("dht_store", write, value_nbytes(value))
+        self._enqueue(("store", key, subkey), write, keep)
+
+    def submit(self, key: Hashable, fn: Callable[[], Any]):
+        """Queues an arbitrary DHT task; pending tasks with the same key are merged."""
+        self._enqueue(("call", key), fn)
+
+    def _enqueue(self, slot: Hashable, task: Callable[[], Any], keep: bool = False):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("publisher is closed")
+
+            self.stats.enqueued += 1
+            if slot in self._pending:
+                self.stats.merged += 1
+                keep = keep or self._pending[slot][1]
+            elif len(self._pending) >= self.max_pending:
+                self._drop_oldest()
+
+            self._pending[slot] = (task, keep)
+            self._update_depth()
+            self._cond.notify_all()
+
+    def _drop_oldest(self):
+        """Evicts the oldest droppable write; the caller holds `_cond`."""
+        for slot, (_, keep) in self._pending.items():
+            if not keep:
+                del self._pending[slot]
+                self.stats.dropped += 1
+                self.logger.warning(f"DHT publish queue full; dropped write: {slot}")
+                return
+
+    def _update_depth(self):
+        depth = len(self._pending) + self._inflight
+        self.stats.queue_depth = depth
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, depth)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return  # Closed and drained.
+
+                slot, (task, _) = self._pending.popitem(last=False)
+                self._inflight += 1
+
+            try:
+                ok = task() is not False
+                if not ok:
+                    self.logger.warning(f"DHT publish rejected for {slot}")
+            except Exception as e:
+                self.logger.warning(f"DHT publish failed for {slot}: {e}")
+                ok = False
+
+            with self._cond:
+                self._inflight -= 1
+                if ok:
+                    self.stats.published += 1
+                else:
+                    self.stats.failed += 1
+                self._update_depth()
+                self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until every queued write has been sent. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float | None = None):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
@@ -1,28 +1,53 @@
 import hashlib
-from functools import lru_cache
-from typing import Any
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Iterable, NamedTuple
 
 from hivemind.dht import DHT
 from hivemind.utils import ValueWithExpiration
 
 from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.outputs_codec import (
+    BlobCache,
+    BlobFn,
+    blob_digest,
+    decode_blob,
+    decode_outputs,
+)
+from hivemind_exp.outputs_cache import OutputsCache
+from hivemind_exp.stage_timeline import record_dht_get
 
 ROUND_STAGE_NUMBER_KEY = "rl_swarm_rs"  # No subkeys. Coordinator publishes.
+# Versioned round/stage record with transition estimates. No subkeys. Coordinator publishes.
+ROUND_STAGE_RECORD_KEY = "rl_swarm_rs_record"
 
 # Round and stage (e.g. 0_0) appended.
 LEADERBOARD_KEY_PREFIX = (
     "rl_swarm_leaderboard"  # Subkey = Metric. Coordinator publishes.
 )
+# Round and stage appended. Versioned diff of the leaderboard. Coordinator publishes.
+LEADERBOARD_DELTA_KEY_PREFIX = "rl_swarm_leaderboard_delta"
 REWARDS_KEY = "rl_swarm_rewards"  # Subkey = Metric. Everyone publishes.
 
 # Node key, round, and stage (e.g. abcde_0_0) appended.
 OUTPUTS_KEY_PREFIX = "rl_swarm_outputs"  # Subkey = Example Hash. Everyone publishes.
 
+# Content digest appended. Shared strings referenced from encoded outputs. Everyone publishes.
+BLOB_KEY_PREFIX = "rl_swarm_blob"
+
 
 def leaderboard_key(round_num, stage) -> str:
     return f"{LEADERBOARD_KEY_PREFIX}_{round_num}_{stage}"
 
 
+def leaderboard_delta_key(round_num, stage) -> str:
+    return f"{LEADERBOARD_DELTA_KEY_PREFIX}_{round_num}_{stage}"
+
+
 def rewards_key(round_num, stage) -> str:
     return f"{REWARDS_KEY}_{round_num}_{stage}"
 
@@ -35,10 +60,42 @@ def node_outputs_key(node: HivemindNode) -> str:
     return outputs_key(node.key, node.round_num, node.stage_num)
 
 
-def hash_keys(outputs):
+def blob_key(digest: str) -> str:
+    return f"{BLOB_KEY_PREFIX}_{digest}"
+
+
+_blob_cache = BlobCache()
+
+
+def get_blob(dht: DHT, digest: str) -> str | None:
+    if (text := _blob_cache.get(digest)) is not None:
+        return text
+
+    if value := get_dht_value(dht, key=blob_key(digest), latest=False):
+        text = decode_blob(value)
+        if blob_digest(text) == digest:
+            _blob_cache.put(digest, text)
+            return text
+    return None
+
+
+def decode_values(outputs, get_blob_fn: BlobFn | None = None):
+    # Decodes (timestamp, outputs) values stored in either wire format.
+    # Entries whose shared strings can't be retrieved are left out.
+    result = {}
+    for k, (ts, v) in outputs.items():
+        try:
+            result[k] = (ts, decode_outputs(v, get_blob_fn))
+        except ValueError:
+            continue
+
+    return result
+
+
+def hash_keys(outputs, get_blob_fn: BlobFn | None = None):
     # Handles older versions of the trainer that did not hash question keys.
     result = {}
-    for k, v in outputs.items():
+    for k, v in decode_values(outputs, get_blob_fn).items():
         if len(k) != 32:  # Not perfect, but good enough.
             k = hashlib.md5(k.encode()).hexdigest()
         result[k] = v
@@ -46,7 +103,20 @@ def hash_keys(outputs):
     return result
 
 
-@lru_cache
+_outputs_caches: "weakref.WeakKeyDictionary[DHT, OutputsCache]" = (
+    weakref.WeakKeyDictionary()
+)
+_outputs_caches_lock = threading.Lock()
+
+
+def get_outputs_cache(dht: DHT) -> OutputsCache:
+    # One cache per DHT instance; dropped along with it.
+    with _outputs_caches_lock:
+        if dht not in _outputs_caches:
+            _outputs_caches[dht] = OutputsCache()
+        return _outputs_caches[dht]
+
+
 def get_outputs(
     dht: DHT, node_key: str, r, s, get_cached_fn=None
 ) -> dict[str, tuple[float, dict]]:  # Q: (timestamp, outputs)
@@ -55,15 +125,131 @@ def get_outputs(
         if outputs := get_cached_fn(r, s):
             return hash_keys(outputs)
 
-    # Try from DHT next to include peered outputs.
-    if outputs := get_dht_value(dht, key=outputs_key(node_key, r, s), latest=False):
-        return hash_keys(outputs)
+    # Then recently fetched peer outputs.
+    cache = get_outputs_cache(dht)
+    found, outputs = cache.lookup(node_key, r, s)
+    if not found:
+        # Try from DHT next to include peered outputs.
+        outputs = get_dht_value(dht, key=outputs_key(node_key, r, s), latest=False)
+        if outputs := hash_keys(outputs or {}, partial(get_blob, dht)):
+            cache.put(node_key, r, s, outputs)
+        else:
+            cache.put_missing(node_key, r, s)
+
+    if outputs:
+        return outputs
 
     raise ValueError(
         f"could not retrieve stage outputs for {node_key} at round {r} stage {s}"
     )
 
 
+@dataclass
+class OutputsBatch:
+    outputs: dict[str, dict[str, tuple[float, dict]]] = field(default_factory=dict)
+    missing: list[str] = field(default_factory=list)  # Answered, but no outputs.
+    timed_out: list[str] = field(default_factory=list)  # No answer in time.
+
+
+def get_outputs_batch(
+    dht: DHT,
+    node_keys: Iterable[str],
+    r,
+    s,
+    max_concurrency: int = 32,
+    request_timeout: float = 10.0,
+    deadline: float = 30.0,
+) -> OutputsBatch:
+    """
+    Fetches stage outputs for many peers concurrently, keeping at most
+    `max_concurrency` DHT gets in flight. Returns whatever arrived before
+    `deadline` seconds; peers without an answer are reported as timed out.
+    Peers in the DHT's outputs cache are served without a request.
+    """
+    batch = OutputsBatch()
+    cache = get_outputs_cache(dht)
+    queued = []
+    for node_key in node_keys:
+        found, outputs = cache.lookup(node_key, r, s)
+        if not found:
+            queued.append(node_key)
+        elif outputs:
+            batch.outputs[node_key] = outputs
+        else:
+            batch.missing.append(node_key)
+
+    queued.reverse()
+    inflight: dict[Future, tuple[str, float]] = {}
+    end_time = time.monotonic() + deadline
+
+    while (queued or inflight) and time.monotonic() < end_time:
+        while queued and len(inflight) < max_concurrency:
+            node_key = queued.pop()
+            future = dht.get(
+                outputs_key(node_key, r, s), latest=False, return_future=True
+            )
+            inflight[future] = (node_key, time.monotonic())
+
+        now = time.monotonic()
+        next_expiry = min(start for _, start in inflight.values()) + request_timeout
+        done, _ = wait(
+            inflight,
+            timeout=max(0.0, min(next_expiry, end_time) - now),
+            return_when=FIRST_COMPLETED,
+        )
+        for future in done:
+            node_key, start = inflight.pop(future)
+            try:
+                outputs = _unwrap_dht_value(future.result())
+            except Exception:
+                # Failed request; don't remember it as a miss.
+                batch.missing.append(node_key)
+                continue
+
+            record_dht_get(dht, start, outputs)
+
+            if outputs := hash_keys(outputs or {}, partial(get_blob, dht)):
+                batch.outputs[node_key] = outputs
+                cache.put(node_key, r, s, outputs)
+            else:
+                batch.missing.append(node_key)
+                cache.put_missing(node_key, r, s)
+
+        now = time.monotonic()
+        for future, (node_key, start) in list(inflight.items()):
+            if now - start >= request_timeout:
+                future.cancel()
+                del inflight[future]
+                batch.timed_out.append(node_key)
+
+    # Deadline reached.
+    for future, (node_key, _) in inflight.items():
+        future.cancel()
+        batch.timed_out.append(node_key)
+    batch.timed_out.extend(reversed(queued))
+    return batch
+
+
+class RoundStageRecord(NamedTuple):
+    # Stored as a plain tuple. Times are DHT times; 0.0 when not yet known.
+    version: int  # Increases with every round/stage transition.
+    round_num: int
+    stage: int
+    started_at: float
+    next_transition_at: float  # Expected start of the next stage.
+    next_round_at: float  # Expected start of the next round.
+
+
+def round_stage_version(round_num, stage, num_stages) -> int:
+    return round_num * num_stages + stage + 1
+
+
+def get_round_stage_record(dht: DHT) -> RoundStageRecord | None:
+    if value := get_dht_value(dht, key=ROUND_STAGE_RECORD_KEY, latest=True):
+        return RoundStageRecord(*value)
+    return None
+
+
 def get_round_and_stage(
     dht: DHT,
 ) -> tuple[int, int]:
@@ -76,7 +262,13 @@ def get_round_and_stage(
 
 
 def get_dht_value(dht: DHT, **kwargs) -> Any | None:
-    wrapper = dht.get(**kwargs)
+    start_time = time.monotonic()
+    value = _unwrap_dht_value(dht.get(**kwargs))
+    record_dht_get(dht, start_time, value)
+    return value
+
+
+def _unwrap_dht_value(wrapper) -> Any | None:
     if not wrapper:
         return None
 
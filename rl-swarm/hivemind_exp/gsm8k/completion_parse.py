@@ -0,0 +1,168 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+# Tags the reward functions of all three stages look for in completions.
+TAGS = (
+    "think",
+    "answer",
+    "compare",
+    "explain",
+    "identify",
+    "summarize_feedback",
+    "majority",
+    "question",
+)
+_TAG_RE = re.compile(r"</?(?:%s)>" % "|".join(TAGS))
+
+# Completions of one batch; every reward function of a stage sees the same ones.
+PARSE_CACHE_SIZE = 1024
+
+
+class ParsedCompletion:
+    """
+    A completion scanned once for the tags in TAGS.
+
+    `extract`, `count`, `trailing` and the format checks give the same
+    results as the str.split / str.count / re.match expressions reward
+    functions used on the raw text. Results are memoized on the object.
+    """
+
+    __slots__ = ("text", "_positions", "_memo")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._positions: dict[str, list[int]] = defaultdict(list)
+        for m in _TAG_RE.finditer(text):
+            self._positions[m.group()].append(m.start())
+        self._memo = {}
+
+    def spans(self, tag: str) -> list[tuple[int, int]]:
+        """(start, end) of each occurrence of `tag`, e.g. "<answer>" or "</answer>"."""
+        return [(p, p + len(tag)) for p in self._positions.get(tag, ())]
+
+    def extract(self, name: str) -> str:
+        """Same as text.split(f"<{name}>")[-1].split(f"</{name}>")[0].strip()."""
+        key = ("extract", name)
+        if key not in self._memo:
+            opens = self._positions.get(f"<{name}>")
+            start = opens[-1] + len(name) + 2 if opens else 0
+            closes = self._positions.get(f"</{name}>", [])
+            i = bisect_left(closes, start)
+            stop = closes[i] if i < len(closes) else len(self.text)
+            self._memo[key] = self.text[start:stop].strip()
+        return self._memo[key]
+
+    def _scan(self, pattern: str) -> tuple[int, int]:
+        # (occurrences, end of the last one) of a tag with optional newlines
+        # around it, counted without overlaps like str.count.
+        key = ("scan", pattern)
+        if key in self._memo:
+            return self._memo[key]
+
+        lead = pattern.startswith("\n")
+        trail = pattern.endswith("\n") and len(pattern) > 1
+        tag = pattern[lead : len(pattern) - trail]
+        if _TAG_RE.fullmatch(tag) is None:
+            count = self.text.count(pattern)
+            last_end = len(self.text) - len(self.text.split(pattern)[-1])
+            self._memo[key] = (count, last_end)
+            return count, last_end
+
+        text = self.text
+        count, last_end = 0, 0
+        for p in self._positions.get(tag, ()):
+            start, end = p - lead, p + len(tag) + trail
+            if start < last_end:
+                continue
+            if lead and (p == 0 or text[p - 1] != "\n"):
+                continue
+            if trail and text[end - 1 : end] != "\n":
+                continue
+            count += 1
+            last_end = end
+
+        self._memo[key] = (count, last_end)
+        return count, last_end
+
+    def count(self, pattern: str) -> int:
+        """Same as text.count(pattern) for a tag with optional newlines around it."""
+        return self._scan(pattern)[0]
+
+    def trailing(self, pattern: str) -> int:
+        """Same as len(text.split(pattern)[-1])."""
+        count, last_end = self._scan(pattern)
+        return len(self.text) - last_end if count else len(self.text)
+
+    def strict_format(self, tags: tuple[str, ...]) -> bool:
+        """
+        Same as re.match(r"^<a>\\n.*?\\n</a>\\n<b>\\n.*?\\n</b>\\n$", text) for
+        tags (a, b), extended to any number of tags.
+        """
+        key = ("strict", tags)
+        if key in self._memo:
+            return self._memo[key]
+
+        text, pos, ok = self.text, 0, True
+        for tag in tags:
+            head, tail = f"<{tag}>\n", f"\n</{tag}>\n"
+            if not text.startswith(head, pos):
+                ok = False
+                break
+            # `.` doesn't match newlines, so the content ends at the next one.
+            newline = text.find("\n", pos + len(head))
+            if newline < 0 or not text.startswith(tail, newline):
+                ok = False
+                break
+            pos = newline + len(tail)
+
+        # `$` also matches before a final newline.
+        ok = ok and (pos == len(text) or (pos == len(text) - 1 and text[pos] == "\n"))
+        self._memo[key] = ok
+        return ok
+
+    def soft_format(self, tags: tuple[str, ...]) -> bool:
+        """
+        Same as re.match(r"<a>.*?</a>\\s*<b>.*?</b>", text) for tags (a, b),
+        extended to any number of tags.
+        """
+        key = ("soft", tags)
+        if key not in self._memo:
+            self._memo[key] = self._soft_format_from(tags, 0)
+        return self._memo[key]
+
+    def _soft_format_from(self, tags: tuple[str, ...], pos: int) -> bool:
+        text = self.text
+        head, tail = f"<{tags[0]}>", f"</{tags[0]}>"
+        if not text.startswith(head, pos):
+            return False
+
+        start = pos + len(head)
+        line_end = text.find("\n", start)
+        if line_end < 0:
+            line_end = len(text)
+        closes = self._positions.get(tail, [])
+        # Lazy `.*?`: try each closing tag on the same line, nearest first.
+        for i in range(bisect_left(closes, start), len(closes)):
+            close = closes[i]
+            if close >= line_end:
+                break
+            if len(tags) == 1:
+                return True
+            next_pos = close + len(tail)
+            while next_pos < len(text) and text[next_pos].isspace():
+                next_pos += 1
+            if self._soft_format_from(tags[1:], next_pos):
+                return True
+        return False
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_completion(text: str) -> ParsedCompletion:
+    return ParsedCompletion(text)
+
+
+def parse_completions(completions) -> list[ParsedCompletion]:
+    """Parses (or reuses parses of) chat-format completions."""
+    return [parse_completion(completion[0]["content"]) for completion in completions]
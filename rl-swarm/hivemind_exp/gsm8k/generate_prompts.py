@@ -1,14 +1,21 @@
 #For geting top-k ranking for subsampling
 import hashlib
+import heapq
+import json
 import os
 import random
 import re
 import time
+from collections import OrderedDict
+from functools import lru_cache
 
 from datasets import Dataset, load_dataset
 
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
 import hivemind_exp.gsm8k.stage2_rewards as stage2_rewards
+from hivemind_exp.chat_ingest import chat_ingest
+from hivemind_exp.gsm8k.long_format import agent_ids, long_format_dataset, wide_cols, wide_row
+from hivemind_exp.session_store import session_store
 
 #############################################################################################################
 # TODO: Lots of repitition across stages, so would be good to fold them into one another and simplify things.#
@@ -155,6 +162,41 @@ def get_unique_student_ids(cols):
 def get_unique_critic_ids(cols):
     return {a: i for i, a in enumerate(sorted_agent_ids(cols, "agent_opinion_"))}
 
+# Scores of previous-stage answers, keyed by (stage, question hash, agent id, content hash).
+# The str hashes are per process, like the cache.
+COLUMN_REWARD_CACHE_SIZE = 65536
+_column_reward_cache = OrderedDict()
+
+
+@lru_cache(maxsize=256)
+def column_tiebreakers(cols):
+    #Hash column names for tiebreaker. Note: Only needed in experimental setting since we don't have a consistent numerical ID per model output.
+    return {c: int(hashlib.md5(str.encode(c)).hexdigest(), 16) for c in cols}
+
+
+def column_rewards(datum, cols, current_stage):
+    """Total previous-stage reward of each column's answer; only uncached answers are scored."""
+    q_hash = hash(datum['question'])
+    keys = {c: (current_stage, q_hash, c, hash(datum[c])) for c in cols}
+    rewards = {}
+    for c, key in keys.items():
+        if key in _column_reward_cache:
+            _column_reward_cache.move_to_end(key)
+            rewards[c] = _column_reward_cache[key]
+    missing = [c for c in cols if c not in rewards]
+    if missing:
+        question, completions, answer = [[{'content':datum['question']}]], [[{'content':datum[c]}] for c in missing], [datum['answer'] for _ in missing] #Weird formatting is for compatability with stage reward functions
+        if current_stage == 2:
+            total_rewards = stage1_rewards.top_k_cumulative_reward(question, completions, answer)
+        elif current_stage == 3:
+            total_rewards = stage2_rewards.top_k_cumulative_reward(question, completions, answer)
+        for c, reward in zip(missing, total_rewards):
+            rewards[c] = _column_reward_cache[keys[c]] = reward
+        while len(_column_reward_cache) > COLUMN_REWARD_CACHE_SIZE:
+            _column_reward_cache.popitem(last=False)
+    return rewards
+
+
 def pick_k_cols(cols, datum, current_stage, default_k=15, method='top_k'):
     #Filter columns according to current round
     if current_stage == 2:
@@ -168,45 +210,88 @@ def pick_k_cols(cols, datum, current_stage, default_k=15, method='top_k'):
     if method == 'uniform_random':
         #Random sample k cols without replacement
         subsampled_cols = random.sample(valid_cols, k)
-    elif method == 'top_k': #TODO: Clean this up. Super ugly way of doing this, but too jet-lagged to optimize...
-        #Find total reward per answer and map in dict for easy sorting/filtering
-        question, completions, answer = [[{'content':datum['question']}]], [[{'content':datum[c]}] for c in valid_cols], [datum['answer'] for _ in valid_cols] #Weird formatting is for compatability with stage reward functions
-        if current_stage == 2:
-            total_rewards = stage1_rewards.top_k_cumulative_reward(question, completions, answer)
-        elif current_stage == 3:
-            total_rewards = stage2_rewards.top_k_cumulative_reward(question, completions, answer)
-        reward_per_col = {c:{} for c in valid_cols}
-        for idx,c in enumerate(valid_cols):
-            #First hash column name for tiebreaker. Note: Only needed in experimental setting since we don't have a consistent numerical ID per model output.
-            hash_fxn = hashlib.md5()
-            hash_fxn.update(str.encode(c))
-            reward_per_col[c]['tiebreaker'] = int(hash_fxn.hexdigest(),16)
-            #Add reward for this answer
-            reward_per_col[c]['reward'] = total_rewards[idx]
-        #Pick top k and resolve ties deterministically using the hashed tiebreakers
-        to_sort = [(reward_per_col[c]['reward'], reward_per_col[c]['tiebreaker'], c) for c in reward_per_col]
-        to_sort.sort(key=lambda x: (x[0], x[1], x[2]))
-        _, _, valid_cols = zip(*to_sort)
-        subsampled_cols = valid_cols[-k:]
+    elif method == 'top_k':
+        #Find total reward per answer and resolve ties deterministically using hashed column names
+        rewards = column_rewards(datum, valid_cols, current_stage)
+        tiebreakers = column_tiebreakers(tuple(valid_cols))
+        top = heapq.nlargest(k, valid_cols, key=lambda c: (rewards[c], tiebreakers[c], c))
+        subsampled_cols = tuple(reversed(top))
     return subsampled_cols
 
-def generate_stage2_user_prompt(datum, cols):
+# Set by the runner to fit stage 2/3 prompts into the trainer's prompt length.
+prompt_packer = None
+
+# Markup around each packed answer/opinion, with a two-digit ID, for the packer's budget.
+STAGE2_ITEM_MARKUP = "<therapist>Therapist #00</therapist> said \n" + "\n\n\n"
+STAGE3_ITEM_MARKUP = "<supervisor>Supervisor #00</supervisor> provided \n" + "\n\n\n" + "<content></content>\n"
+
+
+def set_prompt_packer(packer):
+    global prompt_packer
+    prompt_packer = packer
+
+
+def pack_cols(packer, fixed, cols, datum, current_stage, weights=None, budget=None):
+    """
+    Lets `packer` choose and truncate previous-stage columns instead of a
+    fixed k. Returns {column: text to show}, for columns in `cols` best first.
+    """
+    ranked = tuple(reversed(pick_k_cols(cols, datum, current_stage, default_k=len(cols))))
+    markup = STAGE2_ITEM_MARKUP if current_stage == 2 else STAGE3_ITEM_MARKUP
+    return packer.pack(
+        fixed,
+        [(c, datum[c]) for c in ranked],
+        markup,
+        [weights(datum[c]) for c in ranked] if weights else None,
+        budget,
+    )
+
+
+def generate_stage2_user_prompt(datum, cols, packer=None, budget=None):
+    question = datum['question']
+    if packer is not None:
+        # A long concern is cut to its share of the budget, leaving room for answers
+        intro = packer.count(f"The client concern we received is:   \n\nThe following therapeutic responses were provided: \n")
+        question = packer.truncate(question, packer.fixed_budget(budget) - intro)
     sp = []
-    sp.append(f"The client concern we received is: {datum['question']}" + "  \n\n")
+    sp.append(f"The client concern we received is: {question}" + "  \n\n")
     sp.append(f"The following therapeutic responses were provided:" + " \n")
-    subsampled_cols = pick_k_cols(cols, datum, 2) #Subsample columns to stop prompt bloating
+    if packer is None:
+        subsampled_cols = pick_k_cols(cols, datum, 2) #Subsample columns to stop prompt bloating
+        texts = datum
+    else:
+        texts = pack_cols(packer, "".join(sp), cols, datum, 2, budget=budget) #Fit as many as the token budget allows
+        subsampled_cols = tuple(texts)
     agentID_to_therapistID = get_unique_student_ids(subsampled_cols)
     for agentID in agentID_to_therapistID:
         feature = f"agent_answers_{agentID}"
-        if feature in datum:
+        if feature in texts:
             sp.append(
                 f"<therapist>Therapist #{agentID_to_therapistID[agentID]}</therapist> said \n"
             )
-            sp.append(datum[feature])
+            sp.append(texts[feature])
             sp.append("\n\n\n")
     return "".join(sp)
 
 
+# Session records returned by the stage 3 prompt map, one JSON string per record.
+SESSION_RECORDS_COLUMN = "session_records"
+
+
+def supervisor_content(text):
+    """
+    Extract the content after a heading with ** in supervisor feedback.
+    Has no side effects.
+    """
+    pattern = r'\*\*(.*?)\*\*\s*([\s\S]*?)(?=\n\n|\Z)'
+    match = re.search(pattern, text)
+    if match:
+        content = match.group(2).strip()
+        return f"<content>{content}</content>"
+    
+    return ""
+
+
 def extract_supervisor_content(text, record_raw_response=True):
     """
     Extract the content after a heading with ** in supervisor feedback.
@@ -215,57 +300,55 @@ def extract_supervisor_content(text, record_raw_response=True):
     - text: The text to extract content from
     - record_raw_response: If True, record the entire raw response instead of just the extracted content
     """
-    pattern = r'\*\*(.*?)\*\*\s*([\s\S]*?)(?=\n\n|\Z)'
-    match = re.search(pattern, text)
-    
-    # Create the log file path
-    log_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "supervisor_content.txt")
-    
     if record_raw_response:
-        # Get the current feedback number by counting existing feedback entries
-        feedback_num = 1
-        try:
-            with open(log_file_path, "r") as f:
-                content = f.read()
-                feedback_num = content.count("<supervisor_feedback>") + 1
-        except:
-            # If file doesn't exist or can't be read, start with feedback 1
-            pass
-            
-        # Record the entire raw supervisor feedback with numbering
-        with open(log_file_path, "a") as f:
-            # Extract just the useful part of the response (not the template text)
-            clean_text = text.strip()
-            f.write(f"<supervisor_feedback #{feedback_num}>\n{clean_text}\n</supervisor_feedback>\n\n")
+        # Record the entire raw supervisor feedback; the store numbers it
+        session_store.append("supervisor_feedback", text.strip())
             
     # Still extract the content for the original functionality
-    if match:
-        content = match.group(2).strip()
-        return f"<content>{content}</content>"
-    
-    return ""
+    return supervisor_content(text)
 
 
-def generate_stage3_user_prompt(datum, cols):
+def build_stage3_user_prompt(datum, cols, packer=None):
+    """
+    Build the stage 3 user prompt for `datum` without side effects.
+    
+    Returns the prompt and the session records it should leave, as
+    {"kind", "text", **fields} dicts for SessionStore.append_many.
+    """
+    stage2_prompt = datum['stage2_prompt']
+    intro = f"After comparing these therapeutic responses, the following supervision feedback was provided:" + " \n"
+    if packer is not None:
+        # Repack stage 2 into the fixed share of the budget, leaving the rest for opinions
+        stage2_budget = packer.fixed_budget() - packer.count("  \n" + intro + "\n\n\n\n\n")
+        if packer.count(stage2_prompt) > stage2_budget:
+            stage2_cols = [c for c in cols if c.startswith('agent_answers')]
+            repacked = generate_stage2_user_prompt(datum, stage2_cols, packer, stage2_budget) if stage2_cols else None
+            if repacked is not None and packer.count(repacked) <= stage2_budget:
+                stage2_prompt = repacked
+            else:
+                # Too tight for answers; keep the start of the concern
+                stage2_prompt = packer.truncate(stage2_prompt, stage2_budget)
     sp = []
-    sp.append(f"{datum['stage2_prompt']}" + "  \n")
-    sp.append(
-        f"After comparing these therapeutic responses, the following supervision feedback was provided:"
-        + " \n"
-    )
-    subsampled_cols = pick_k_cols(cols, datum, 3) #Subsample columns to stop prompt bloating
+    sp.append(f"{stage2_prompt}" + "  \n")
+    sp.append(intro)
+    if packer is None:
+        subsampled_cols = pick_k_cols(cols, datum, 3) #Subsample columns to stop prompt bloating
+        texts = datum
+    else:
+        # Opinions with ** content show up twice, so cost twice per token
+        texts = pack_cols(
+            packer, "".join(sp) + "\n\n\n\n\n", cols, datum, 3,
+            weights=lambda text: 2 if supervisor_content(text) else 1,
+        )
+        subsampled_cols = tuple(texts)
     # TODO: Why is this different from shared_fs_experiments?
     agentID_to_supervisorID = get_unique_critic_ids(subsampled_cols)
     
     # Store extracted contents
     supervisor_contents = []
     
-    # Create the log file path 
-    log_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "supervisor_content.txt")
-    
     # Record all therapist responses if not already recorded
-    with open(log_file_path, "a") as f:
-        f.write("# All Therapist Responses from Full Stage\n\n")
+    records = [{"kind": "text", "text": "# All Therapist Responses from Full Stage\n\n"}]
     
     # Record the therapist answers from the stage2_prompt
     if 'stage2_prompt' in datum:
@@ -274,37 +357,22 @@ def generate_stage3_user_prompt(datum, cols):
         matches = re.finditer(therapist_pattern, datum['stage2_prompt'])
         
         for match in matches:
-            therapist_id = match.group(1)
-            therapist_text = match.group(2).strip()
             # Record each therapist answer
-            record_therapist_answer(therapist_id, therapist_text)
+            records.append({"kind": "therapist_answer", "text": match.group(2).strip(), "id": match.group(1)})
     
     # Record all supervisor feedback with their IDs
-    with open(log_file_path, "a") as f:
-        f.write("# All Supervisor Feedback\n\n")
-    
-    # Get the current supervisor entry number
-    supervisor_entry_num = 1
-    try:
-        with open(log_file_path, "r") as f:
-            content = f.read()
-            supervisor_entry_num = content.count("<supervisor id=") + 1
-    except:
-        pass
+    records.append({"kind": "text", "text": "# All Supervisor Feedback\n\n"})
     
     for agentID in agentID_to_supervisorID:
         feature = f"agent_opinion_{agentID}"
-        if feature in datum:
-            feedback_text = datum[feature]
+        if feature in texts:
+            feedback_text = texts[feature]
             
-            # Record the supervisor feedback with ID and entry number
-            with open(log_file_path, "a") as f:
-                supervisor_id = agentID_to_supervisorID[agentID]
-                f.write(f"<supervisor id=\"{supervisor_id}\" entry=\"{supervisor_entry_num}\">\n{feedback_text}\n</supervisor>\n\n")
-                supervisor_entry_num += 1
+            # Record the full supervisor feedback with ID; the store numbers it
+            records.append({"kind": "supervisor", "text": datum[feature], "id": agentID_to_supervisorID[agentID]})
             
             # Extract content after ** marker
-            extracted_content = extract_supervisor_content(feedback_text, record_raw_response=False)
+            extracted_content = supervisor_content(feedback_text)
             if extracted_content:
                 supervisor_contents.append(extracted_content)
                 
@@ -321,7 +389,26 @@ def generate_stage3_user_prompt(datum, cols):
             sp.append(content)
             sp.append("\n")
         
-    return "".join(sp)
+    return "".join(sp), records
+
+
+def generate_stage3_user_prompt(datum, cols, packer=None):
+    prompt, records = build_stage3_user_prompt(datum, cols, packer)
+    session_store.append_many(records)
+    return prompt
+
+
+def write_session_records(data, store=None) -> Dataset:
+    """
+    Write the session records a prompt map returned in SESSION_RECORDS_COLUMN
+    to the session store in one batch, and drop the column.
+    """
+    if SESSION_RECORDS_COLUMN not in data.column_names:
+        return data
+    (store or session_store).append_many(
+        json.loads(record) for row in data[SESSION_RECORDS_COLUMN] for record in row
+    )
+    return data.remove_columns(SESSION_RECORDS_COLUMN)
 
 
 def get_gsm8k_questions(data) -> Dataset:
@@ -339,34 +426,56 @@ def get_gsm8k_questions(data) -> Dataset:
     return data
 
 
-def get_gsm8k_questions_with_stage1_answers(data) -> Dataset:
-    sys_prompt = generate_system_prompt(STAGE2_SYSTEM_PROMPT)
-    cols = data.column_names
-    data = data.map(
-        lambda x: {  # type: ignore
-            "prompt": [
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": generate_stage2_user_prompt(x, cols)},
-            ],
-            "answer": x["answer"],
-        }
+def _stage_prompts(examples, sys_prompt, cols, stage, batched, packer, agents):
+    # Module level, with everything it reads in fn_kwargs, so map can fingerprint it.
+    rows = [dict(zip(examples, values)) for values in zip(*examples.values())] if batched else [examples]
+    if agents:
+        rows = [wide_row(row, agents) for row in rows]
+    out = {"prompt": [], "answer": [], SESSION_RECORDS_COLUMN: []}
+    for row in rows:
+        if stage == 2:
+            user_prompt, records = generate_stage2_user_prompt(row, cols, packer), []
+        else:
+            user_prompt, records = build_stage3_user_prompt(row, cols, packer)
+        out["prompt"].append([
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_prompt},
+        ])
+        out["answer"].append(row["answer"])
+        out[SESSION_RECORDS_COLUMN].append([json.dumps(r) for r in records])
+    if stage == 2:
+        del out[SESSION_RECORDS_COLUMN]
+    return out if batched else {k: v[0] for k, v in out.items()}
+
+
+def _map_stage_prompts(data, sys_prompt, stage, batched, num_proc, packer):
+    # Long format datasets keep agents nested; rows are widened as prompts are built.
+    agents = agent_ids(data)
+    cols = wide_cols(data.column_names, agents) if agents else data.column_names
+    return data.map(
+        _stage_prompts,
+        batched=batched,
+        num_proc=num_proc,
+        fn_kwargs={"sys_prompt": sys_prompt, "cols": cols, "stage": stage, "batched": batched, "packer": packer, "agents": agents},
     )
-    return data
 
 
-def get_gsm8k_questions_with_stage1and2_answers(data) -> Dataset:
+def get_gsm8k_questions_with_stage1_answers(data, batched=True, num_proc=None, packer=None) -> Dataset:
+    sys_prompt = generate_system_prompt(STAGE2_SYSTEM_PROMPT)
+    return _map_stage_prompts(data, sys_prompt, 2, batched, num_proc, packer)
+
+
+def get_gsm8k_questions_with_stage1and2_answers(data, batched=True, num_proc=None, packer=None, write_records=True) -> Dataset:
+    """
+    Builds stage 3 prompts. The map is side-effect free, so it can run with
+    `num_proc` workers and be reused from the datasets cache; the session
+    records it returns are written afterwards in one batch, unless
+    `write_records` is False and they are left in SESSION_RECORDS_COLUMN.
+    With a PromptPacker, answers are fit to its token budget, not a fixed k.
+    """
     sys_prompt = generate_system_prompt(STAGE3_SYSTEM_PROMPT)
-    cols = data.column_names
-    data = data.map(
-        lambda x: {  # type: ignore
-            "prompt": [
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": generate_stage3_user_prompt(x, cols)},
-            ],
-            "answer": x["answer"],
-        }
-    )
-    return data
+    data = _map_stage_prompts(data, sys_prompt, 3, batched, num_proc, packer)
+    return write_session_records(data) if write_records else data
 
 
 def get_stage1_samples():
@@ -402,33 +511,34 @@ def get_stage1_samples():
     return train_dataset, test_dataset
 
 
-def get_user_input_samples():
+def read_chat_questions():
     """
-    Creates a dataset with a single sample based on user input from chat.json file.
-    This is used instead of loading from a predefined dataset.
+    User messages added to chat.json since the last run, via the shared
+    incremental loader. Falls back to a default question if there are none.
+    The loader's cursor is saved by train_single_gpu once training finishes,
+    so a crashed run reads the same messages again.
     """
-    from datasets import Dataset
-    import json
-    import os
-    
-    # Read from chat.json file instead of using input()
-    chat_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "data/msg/chat.json")
     try:
-        with open(chat_file_path, "r") as f:
-            chat_data = json.load(f)
-        
-        # Extract user messages from chat.json
-        user_questions = []
-        for message in chat_data:
-            if "user" in message and message["user"] and message["user"].strip():
-                user_questions.append(message["user"])
+        user_questions = chat_ingest.new_messages(commit=False)
         
         if not user_questions:
-            print("No user messages found in chat.json. Using default question.")
+            print("No new user messages found in chat.json. Using default question.")
             user_questions = ["How can I manage my anxiety?"]
     except Exception as e:
         print(f"Error reading chat.json: {e}. Using default question.")
         user_questions = ["How can I manage my anxiety?"]
+    return user_questions
+
+
+def get_user_input_samples():
+    """
+    Creates a dataset with a single sample based on user input from chat.json file.
+    This is used instead of loading from a predefined dataset.
+    """
+    from datasets import Dataset
+    
+    # Read new messages from chat.json instead of using input()
+    user_questions = read_chat_questions()
     
     # Create a dataset with all user questions
     data = {
@@ -448,7 +558,11 @@ def get_user_input_samples():
     
     # Add a dummy field to ensure the supervisor content extraction works
     # This won't affect the actual functionality but ensures the extraction method is called
-    dataset = dataset.map(lambda x: {"mock_supervisor_feedback": extract_supervisor_content(mock_feedback)})
+    mock_content = supervisor_content(mock_feedback)
+    dataset = dataset.map(lambda x: {"mock_supervisor_feedback": mock_content})
+    session_store.append_many(
+        {"kind": "supervisor_feedback", "text": mock_feedback.strip()} for _ in range(len(dataset))
+    )
     
     print(f"Processed {len(user_questions)} questions from chat.json")
     
@@ -477,27 +591,35 @@ def fill_unknown_answers_opinions(values):
                     val[field].update({agent: "No answer received..."})
 
 
-def get_stage2_samples(values, test_size=0.1):
-    fill_unknown_answers_opinions(values)
-    dataset = Dataset.from_generator(stage2_generator, gen_kwargs={"values": values})
+def get_stage2_samples(values, test_size=0.1, num_proc=None, long_format=False):
+    if long_format:
+        # In memory, with agents nested and unpadded; see long_format.py
+        dataset = long_format_dataset(values)
+    else:
+        fill_unknown_answers_opinions(values)
+        dataset = Dataset.from_generator(stage2_generator, gen_kwargs={"values": values})
     # #TODO: Add ability to select a random subset of num_samples samples if desired
     # if num_samples != -1:
     #   dataset = dataset.shuffle(seed=42).select(range(num_samples))
 
     # convert our dataset to the r1 prompt
-    dataset = get_gsm8k_questions_with_stage1_answers(dataset)
+    dataset = get_gsm8k_questions_with_stage1_answers(dataset, num_proc=num_proc, packer=prompt_packer)
     return dataset, dataset
 
 
-def get_stage3_samples(values, test_size=0.1):
-    fill_unknown_answers_opinions(values)
-    dataset = Dataset.from_generator(stage3_generator, gen_kwargs={"values": values})
+def get_stage3_samples(values, test_size=0.1, num_proc=None, long_format=False):
+    if long_format:
+        # In memory, with agents nested and unpadded; see long_format.py
+        dataset = long_format_dataset(values)
+    else:
+        fill_unknown_answers_opinions(values)
+        dataset = Dataset.from_generator(stage3_generator, gen_kwargs={"values": values})
     # #TODO: Add ability to select a random subset of num_samples samples if desired
     # if num_samples != -1:
     #   dataset = dataset.shuffle(seed=42).select(range(num_samples))
 
     # convert our dataset to the r1 prompt
-    dataset = get_gsm8k_questions_with_stage1and2_answers(dataset)
+    dataset = get_gsm8k_questions_with_stage1and2_answers(dataset, num_proc=num_proc, packer=prompt_packer)
     return dataset, dataset
 
 
@@ -506,27 +628,9 @@ def get_user_input_with_supervisor_simulation():
     Creates a dataset with samples based on user chat history from chat.json.
     """
     from datasets import Dataset
-    import json
-    import os
     
-    # Read from chat.json file instead of using input()
-    chat_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "data/msg/chat.json")
-    try:
-        with open(chat_file_path, "r") as f:
-            chat_data = json.load(f)
-        
-        # Extract user messages from chat.json
-        user_questions = []
-        for message in chat_data:
-            if "user" in message and message["user"] and message["user"].strip():
-                user_questions.append(message["user"])
-        
-        if not user_questions:
-            print("No user messages found in chat.json. Using default question.")
-            user_questions = ["How can I manage my anxiety?"]
-    except Exception as e:
-        print(f"Error reading chat.json: {e}. Using default question.")
-        user_questions = ["How can I manage my anxiety?"]
+    # Read new messages from chat.json instead of using input()
+    user_questions = read_chat_questions()
     
     # Create a dataset with all user questions
     data = {
@@ -560,27 +664,24 @@ def get_user_input_with_supervisor_simulation():
         prompt = f"The client concern we received is: {x['question']}\n\n"
         prompt += "The following therapeutic responses were provided:\n"
         
-        # Create the log file path
-        log_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "supervisor_content.txt")
-        
         # Add a header for therapist answers
-        with open(log_file_path, "a") as f:
-            f.write("# All Therapist Responses\n\n")
+        records = [{"kind": "text", "text": "# All Therapist Responses\n\n"}]
         
         for i, agent_id in enumerate(agent_ids):
             col = f"agent_answers_{agent_id}"
             if col in x:
                 # Record the therapist answer
-                record_therapist_answer(i, x[col])
+                records.append({"kind": "therapist_answer", "text": x[col], "id": str(i)})
                 
                 prompt += f"<therapist>Therapist #{i}</therapist> said\n"
                 prompt += x[col]
                 prompt += "\n\n\n"
         
-        return prompt
+        return {"stage2_prompt": prompt, SESSION_RECORDS_COLUMN: [json.dumps(r) for r in records]}
     
-    # Generate stage2 prompt without using pick_k_cols
-    dataset = dataset.map(lambda x: {"stage2_prompt": simple_stage2_prompt(x)})
+    # Generate stage2 prompt without using pick_k_cols, then record in one batch
+    dataset = dataset.map(simple_stage2_prompt)
+    dataset = write_session_records(dataset)
     
     print(f"Processed {len(user_questions)} questions from chat.json with simulated supervision")
     
@@ -588,46 +689,63 @@ def get_user_input_with_supervisor_simulation():
     return dataset, dataset
 
 
+def _valuable_legacy_feedback(content):
+    """
+    Supervisor feedback entries numbered as multiples of 3 in the text of a
+    supervisor_content.txt written before the session store.
+    """
+    valuable_feedback = []
+    
+    # Look for patterns like <supervisor id="X" entry="3"> or <supervisor_feedback #3>
+    id_pattern = r'<supervisor id="[^"]*" entry="(\d+)">\n([\s\S]*?)\n</supervisor>'
+    feedback_pattern = r'<supervisor_feedback #(\d+)>\n([\s\S]*?)\n</supervisor_feedback>'
+    
+    # Extract feedback with ID entries
+    id_matches = re.finditer(id_pattern, content)
+    for match in id_matches:
+        entry_num = int(match.group(1))
+        if entry_num % 3 == 0:  # Only take entries that are multiples of 3
+            feedback_text = match.group(2).strip()
+            valuable_feedback.append({
+                "entry": entry_num,
+                "text": feedback_text
+            })
+    
+    # Extract feedback with numbered entries
+    feedback_matches = re.finditer(feedback_pattern, content)
+    for match in feedback_matches:
+        entry_num = int(match.group(1))
+        if entry_num % 3 == 0:  # Only take entries that are multiples of 3
+            feedback_text = match.group(2).strip()
+            valuable_feedback.append({
+                "entry": entry_num,
+                "text": feedback_text
+            })
+    
+    return valuable_feedback
+
+
 def extract_valuable_supervisor_feedback():
     """
     Extract supervisor feedback from entries numbered as multiples of 3
     to use for improving model responses.
     """
-    log_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "supervisor_content.txt")
-    
     try:
-        with open(log_file_path, "r") as f:
-            content = f.read()
-        
         # Extract supervisor feedback from entries that are multiples of 3
         valuable_feedback = []
         
-        # Look for patterns like <supervisor id="X" entry="3"> or <supervisor_feedback #3>
-        id_pattern = r'<supervisor id="[^"]*" entry="(\d+)">\n([\s\S]*?)\n</supervisor>'
-        feedback_pattern = r'<supervisor_feedback #(\d+)>\n([\s\S]*?)\n</supervisor_feedback>'
+        # A supervisor_content.txt from older runs is the store's first record
+        imported = next(session_store.entries("text", [1]), None)
+        if imported is not None and "legacy_counters" in imported:
+            valuable_feedback.extend(_valuable_legacy_feedback(imported["text"]))
         
-        # Extract feedback with ID entries
-        id_matches = re.finditer(id_pattern, content)
-        for match in id_matches:
-            entry_num = int(match.group(1))
-            if entry_num % 3 == 0:  # Only take entries that are multiples of 3
-                feedback_text = match.group(2).strip()
+        # Seek to the store's own entries through its entry index
+        for kind in ("supervisor", "supervisor_feedback"):
+            for record in session_store.entries(kind, range(3, session_store.next_id(kind), 3)):
                 valuable_feedback.append({
-                    "entry": entry_num,
-                    "text": feedback_text
+                    "entry": record["entry"],
+                    "text": record["text"].strip()
                 })
-        
-        # Extract feedback with numbered entries
-        feedback_matches = re.finditer(feedback_pattern, content)
-        for match in feedback_matches:
-            entry_num = int(match.group(1))
-            if entry_num % 3 == 0:  # Only take entries that are multiples of 3
-                feedback_text = match.group(2).strip()
-                valuable_feedback.append({
-                    "entry": entry_num,
-                    "text": feedback_text
-                })
-        
         return valuable_feedback
     except Exception as e:
         print(f"Error extracting supervisor feedback: {e}")
@@ -640,30 +758,12 @@ def get_user_input_with_continuous_conversation():
     continuous conversation using valuable supervisor feedback.
     """
     from datasets import Dataset
-    import json
-    import os
     
     # First, extract valuable supervisor feedback from previous sessions
     valuable_feedback = extract_valuable_supervisor_feedback()
     
-    # Read from chat.json file instead of using input()
-    chat_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "data/msg/chat.json")
-    try:
-        with open(chat_file_path, "r") as f:
-            chat_data = json.load(f)
-        
-        # Extract user messages from chat.json
-        user_questions = []
-        for message in chat_data:
-            if "user" in message and message["user"] and message["user"].strip():
-                user_questions.append(message["user"])
-        
-        if not user_questions:
-            print("No user messages found in chat.json. Using default question.")
-            user_questions = ["How can I manage my anxiety?"]
-    except Exception as e:
-        print(f"Error reading chat.json: {e}. Using default question.")
-        user_questions = ["How can I manage my anxiety?"]
+    # Read new messages from chat.json instead of using input()
+    user_questions = read_chat_questions()
     
     print(f"\n--- Processing {len(user_questions)} messages from chat history ---")
     if valuable_feedback:
@@ -720,29 +820,15 @@ def get_user_input_with_continuous_conversation():
 
 def record_therapist_answer(therapist_id, therapist_text):
     """
-    Record a therapist's answer to the supervisor_content.txt file.
+    Record a therapist's answer to the supervisor session store.
     
     Parameters:
     - therapist_id: The ID of the therapist
     - therapist_text: The text of the therapist's answer
     """
-    # Create the log file path
-    log_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "supervisor_content.txt")
-    
-    # Get the current therapist entry number
-    therapist_entry_num = 1
-    try:
-        with open(log_file_path, "r") as f:
-            content = f.read()
-            therapist_entry_num = content.count("<therapist_answer") + 1
-    except:
-        # If file doesn't exist or can't be read, start with entry 1
-        pass
-        
-    # Record the therapist answer with ID and entry number
-    with open(log_file_path, "a") as f:
-        f.write(f"<therapist_answer id=\"{therapist_id}\" entry=\"{therapist_entry_num}\">\n{therapist_text}\n</therapist_answer>\n\n")
-        # Add a separator line for readability
-        f.write("-" * 80 + "\n\n")
+    # Record the therapist answer; the store numbers it and adds the separator
+    therapist_entry_num = session_store.append(
+        "therapist_answer", therapist_text, id=str(therapist_id)
+    )
         
-    print(f"Therapist answer (ID: {therapist_id}, Entry: {therapist_entry_num}) recorded to {log_file_path}")
+    print(f"Therapist answer (ID: {therapist_id}, Entry: {therapist_entry_num}) recorded to {session_store.root}")
@@ -0,0 +1,69 @@
+from typing import Any, Sequence
+
+import pyarrow as pa
+from datasets import Dataset
+from datasets.table import InMemoryTable
+
+# Per-agent fields of merged questions, as in fill_unknown_answers_opinions.
+AGENT_FIELDS = ("agent_answers", "agent_opinion")
+PLACEHOLDER = "No answer received..."
+AGENT_STRUCT = pa.struct([("agent_id", pa.string()), ("text", pa.string())])
+
+# {agent field: agent IDs across the dataset, in first-seen order}
+AgentIDs = dict[str, list[str]]
+
+
+def long_format_table(values: Sequence[dict[str, Any]]) -> pa.Table:
+    """
+    Merged questions as an Arrow table, one row per question. Agent fields
+    become list<struct<agent_id, text>> columns holding only the agents that
+    answered; missing agents aren't padded.
+    """
+    names = list(dict.fromkeys(name for val in values for name in val))
+    columns = {}
+    for name in names:
+        if name in AGENT_FIELDS:
+            columns[name] = pa.array(
+                [
+                    [{"agent_id": a, "text": t} for a, t in (val.get(name) or {}).items()]
+                    for val in values
+                ],
+                type=pa.list_(AGENT_STRUCT),
+            )
+        else:
+            columns[name] = pa.array([val.get(name) for val in values])
+    return pa.table(columns)
+
+
+def long_format_dataset(values: Sequence[dict[str, Any]]) -> Dataset:
+    """Dataset over long_format_table, kept in memory rather than the HF cache."""
+    return Dataset(InMemoryTable(long_format_table(values)))
+
+
+def agent_ids(data: Dataset) -> AgentIDs:
+    ids = {}
+    for field in AGENT_FIELDS:
+        if field in data.column_names:
+            column = data.data.column(field).combine_chunks().flatten().field("agent_id")
+            ids[field] = list(dict.fromkeys(column.to_pylist()))
+    return ids
+
+
+def wide_cols(column_names: Sequence[str], agents: AgentIDs) -> list[str]:
+    """The column names stage2/3_generator would have produced."""
+    return [c for c in column_names if c not in agents] + [
+        f"{field}_{a}" for field, ids in agents.items() for a in ids
+    ]
+
+
+def wide_row(row: dict[str, Any], agents: AgentIDs) -> dict[str, Any]:
+    """
+    A long-format row as the padded wide row the prompt builders expect;
+    placeholders for missing agents are only created here.
+    """
+    wide = {k: v for k, v in row.items() if k not in agents}
+    for field, ids in agents.items():
+        texts = {a["agent_id"]: a["text"] for a in row[field] or ()}
+        for a in ids:
+            wide[f"{field}_{a}"] = texts.get(a, PLACEHOLDER)
+    return wide
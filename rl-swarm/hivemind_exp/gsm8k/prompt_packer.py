@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Sequence
+
+from hivemind_exp.gsm8k.similarity import text_hash
+
+# Tokenized answers kept; the same answers are packed for every row of a
+# stage and again in the next stage's prompt.
+TOKEN_CACHE_SIZE = 4096
+# Below this many tokens an answer isn't worth including.
+MIN_ITEM_TOKENS = 32
+# Tokens the chat template adds around the user prompt. TRL keeps the last
+# max_prompt_length tokens, so the system prompt is what gets cut.
+PROMPT_TEMPLATE_TOKENS = 16
+# Most of the budget the fixed text (question, stage 2 prompt) may take, so
+# the packed answers always get the rest.
+MAX_FIXED_SHARE = 0.5
+
+
+@dataclass
+class PromptPackerStats:
+    hits: int = 0
+    misses: int = 0
+    packed: int = 0  # Items included.
+    dropped: int = 0  # Items left out for lack of budget.
+    truncated: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+def fair_shares(lengths: Sequence[int], weights: Sequence[int], budget: int) -> list[int]:
+    """
+    Max-min fair token allocation: every item gets min(length, cap), with
+    the cap as large as `budget` allows when item i costs weights[i] tokens
+    per token kept. Short items keep everything; long ones share the rest.
+    """
+    shares = [0] * len(lengths)
+    remaining = max(budget, 0)
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    weight_left = sum(weights)
+    for n, i in enumerate(order):
+        cap = remaining // weight_left if weight_left else 0
+        if lengths[i] <= cap:
+            shares[i] = lengths[i]
+        else:
+            # Every longer item is capped too; hand out the remainder in order.
+            for j in order[n:]:
+                shares[j] = min(lengths[j], cap)
+            extra = remaining - sum(shares[j] * weights[j] for j in order[n:])
+            for j in order[n:]:
+                if extra >= weights[j] and shares[j] < lengths[j]:
+                    shares[j] += 1
+                    extra -= weights[j]
+            return shares
+        remaining -= lengths[i] * weights[i]
+        weight_left -= weights[i]
+    return shares
+
+
+class PromptPacker:
+    """
+    Fits ranked answers into a prompt of at most `budget` tokens.
+
+    `pack` takes candidates best first, includes as many as can each keep
+    `min_tokens` next to the fixed text and per-item markup, then truncates
+    them with fair_shares. Token ids are cached by content hash, keeping the
+    last `cache_size` texts. Pickles as its settings, so it can be passed to
+    Dataset.map and fingerprinted.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        budget: int,
+        min_tokens: int = MIN_ITEM_TOKENS,
+        cache_size: int = TOKEN_CACHE_SIZE,
+    ):
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self.min_tokens = min_tokens
+        self.cache_size = cache_size
+        self.stats = PromptPackerStats()
+
+        self._cache: OrderedDict[bytes, tuple[int, ...]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {
+            "tokenizer": self.tokenizer,
+            "budget": self.budget,
+            "min_tokens": self.min_tokens,
+            "cache_size": self.cache_size,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def token_ids(self, text: str) -> tuple[int, ...]:
+        key = text_hash(text)
+        with self._lock:
+            if key in self._cache:
+                self.stats.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.stats.misses += 1
+
+        ids = tuple(self.tokenizer.encode(text, add_special_tokens=False))
+        with self._lock:
+            self._cache[key] = ids
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return ids
+
+    def count(self, text: str) -> int:
+        return len(self.token_ids(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        ids = self.token_ids(text)
+        if len(ids) <= max_tokens:
+            return text
+        # Decoded text can retokenize longer; keep fewer ids until it fits.
+        kept = max(max_tokens, 0)
+        truncated = self.tokenizer.decode(ids[:kept])
+        while kept and self.count(truncated) > max_tokens:
+            kept -= 1
+            truncated = self.tokenizer.decode(ids[:kept])
+        return truncated
+
+    def fixed_budget(self, budget: int | None = None) -> int:
+        """Tokens the fixed text of a prompt packed into `budget` may take."""
+        return int((self.budget if budget is None else budget) * MAX_FIXED_SHARE)
+
+    def pack(
+        self,
+        fixed: str,
+        items: Sequence[tuple[str, str]],
+        markup: str = "",
+        weights: Sequence[int] | None = None,
+        budget: int | None = None,
+    ) -> dict[str, str]:
+        """
+        Packs `items`, (key, text) pairs best first, into what `fixed` leaves
+        of the budget, or of `budget` if given, each costing `markup` tokens
+        plus `weights[i]` per kept token. Returns {key: possibly truncated
+        text} of those included, in rank order.
+        """
+        weights = weights or [1] * len(items)
+        available = (self.budget if budget is None else budget) - self.count(fixed)
+        markup_tokens = self.count(markup)
+
+        chosen, lengths, floor = [], [], 0
+        for i, (key, text) in enumerate(items):
+            length = self.count(text)
+            cost = markup_tokens + min(length, self.min_tokens) * weights[i]
+            # Always include the best item, however tight the budget.
+            if chosen and floor + cost > available:
+                break
+            floor += cost
+            chosen.append(i)
+            lengths.append(length)
+
+        with self._lock:
+            self.stats.packed += len(chosen)
+            self.stats.dropped += len(items) - len(chosen)
+
+        budget = available - markup_tokens * len(chosen)
+        shares = fair_shares(lengths, [weights[i] for i in chosen], budget)
+        packed = {}
+        for i, length, share in zip(chosen, lengths, shares):
+            key, text = items[i]
+            share = max(share, 1)
+            if share < length:
+                with self._lock:
+                    self.stats.truncated += 1
+            packed[key] = self.truncate(text, share)
+        return packed
@@ -0,0 +1,266 @@
+import importlib
+import inspect
+import logging
+import multiprocessing
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from functools import wraps
+from types import ModuleType
+from typing import Callable, Hashable, Sequence
+
+import numpy as np
+
+from hivemind_exp.gsm8k.similarity import Similarity
+from hivemind_exp.sample_logger import sample_logger
+
+logger = logging.getLogger(__name__)
+
+# Prompt, completions and answers; all a reward function's value depends on.
+BatchKey = Hashable
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def set_reward_workers(num_workers: int):
+    """
+    Runs heavy reward functions on a pool of `num_workers` processes, shared
+    by all engines. 0 evaluates them inline, in the calling thread.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if num_workers == _pool_workers:
+            return
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+        _pool_workers = num_workers
+        if num_workers > 0:
+            try:
+                # Not forked: the trainer process has CUDA and DHT threads.
+                _pool = ProcessPoolExecutor(
+                    num_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, ValueError) as e:
+                logger.warning(f"Reward process pool unavailable, running inline: {e}")
+                _pool_workers = 0
+
+
+def _submit(fn: Callable, kwargs: dict) -> Future | None:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            return None
+        try:
+            return _pool.submit(_call_reward, fn.__module__, fn.__name__, kwargs)
+        except RuntimeError as e:  # Broken or shut down.
+            logger.warning(f"Reward process pool failed, running inline: {e}")
+            _pool, _pool_workers = None, 0
+            return None
+
+
+@dataclass
+class PooledReward:
+    values: list[float]
+    samples: list[tuple[str, str]]  # Sample log writes, left to the parent.
+    # New ratios of each module-level Similarity, merged into the parent's.
+    ratios: dict[str, list[tuple[tuple[bytes, bytes], float]]]
+
+
+def _similarities(module: ModuleType) -> dict[str, Similarity]:
+    return {name: obj for name, obj in vars(module).items() if isinstance(obj, Similarity)}
+
+
+def _call_reward(module_name: str, name: str, kwargs: dict) -> PooledReward:
+    # Looked up by name in the worker; the undecorated function skips its
+    # engine there. The worker's sample logger and caches die with it, so
+    # what the function writes to them goes back to the parent.
+    module = importlib.import_module(module_name)
+    with ExitStack() as stack:
+        samples = stack.enter_context(sample_logger.capture())
+        ratios = {
+            attr: stack.enter_context(similarity.record())
+            for attr, similarity in _similarities(module).items()
+        }
+        values = getattr(module, name).__wrapped__(**kwargs)
+    return PooledReward(values, samples, ratios)
+
+
+def _merge_pooled(fn: Callable, result: PooledReward) -> list[float]:
+    module = sys.modules[fn.__module__]
+    for attr, entries in result.ratios.items():
+        getattr(module, attr).update(entries)
+    for name, text in result.samples:
+        sample_logger.write(name, text)
+    return result.values
+
+
+def batch_key(prompts, completions, answer=None) -> BatchKey:
+    return (
+        prompts[0][-1]["content"],
+        tuple(completion[0]["content"] for completion in completions),
+        None if answer is None else tuple(answer),
+    )
+
+
+@dataclass
+class RewardMatrix:
+    names: tuple[str, ...]
+    values: np.ndarray  # (completions, reward functions); NaN until computed.
+    pending: dict[int, Future] = field(default_factory=dict, repr=False)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.values[:, self.names.index(name)]
+
+    def row(self, i: int) -> dict[str, float]:
+        return dict(zip(self.names, self.values[i].tolist()))
+
+    def total(self, weights: Sequence[float] | None = None) -> np.ndarray:
+        """Per-completion sum of all rewards, optionally weighted per function."""
+        if weights is None:
+            return self.values.sum(axis=1)
+        return self.values @ np.asarray(weights, dtype=self.values.dtype)
+
+
+@dataclass
+class RewardEngineStats:
+    hits: int = 0  # Column read from the matrix.
+    misses: int = 0  # Column computed.
+    uncached: int = 0  # Called with an explicit weighting or without a prompt.
+    offloaded: int = 0  # Column computed on the process pool.
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class RewardEngine:
+    """
+    Evaluates a stage's reward functions at most once per batch.
+
+    Functions registered with `reward` fill their column of an N×F matrix for
+    a batch when first called; later calls for the same batch, and `matrix`,
+    read it back. The last `max_batches` batches are kept. Calls that pass
+    their own `weighting` bypass the matrix.
+
+    Functions registered with `heavy=True` run on the process pool set up by
+    `set_reward_workers`: the first call for a batch submits all of them, and
+    each is gathered when its column is read. Their sample log writes and the
+    ratios they add to module-level Similarity caches are replayed here.
+    """
+
+    def __init__(self, max_batches: int = 16):
+        self.max_batches = max_batches
+        self.funcs: list[Callable] = []
+        self.names: list[str] = []
+        self.heavy: list[bool] = []
+        self.stats = RewardEngineStats()
+
+        self._batches: OrderedDict[BatchKey, RewardMatrix] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def reward(self, fn: Callable | None = None, *, heavy: bool = False) -> Callable:
+        """
+        Registers `fn` as the next column. Use as a decorator, bare or as
+        `reward(heavy=True)` for functions worth running in another process.
+        """
+        if fn is None:
+            return lambda fn: self.reward(fn, heavy=heavy)
+
+        index = len(self.funcs)
+        self.funcs.append(fn)
+        self.names.append(fn.__name__)
+        self.heavy.append(heavy)
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def cached_fn(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs).arguments
+            extra = bound.get("kwargs", {})
+            prompts = bound.get("prompts", extra.get("prompts"))
+            if "weighting" in bound or prompts is None:
+                with self._lock:
+                    self.stats.uncached += 1
+                return fn(*args, **kwargs)
+
+            completions = bound["completions"]
+            answer = bound.get("answer", extra.get("answer"))
+            shared = {k: v for k, v in bound.items() if k != "kwargs"} | extra
+            self._offload(prompts, completions, answer, shared)
+            return self._column(index, prompts, completions, answer, args, kwargs)
+
+        return cached_fn
+
+    def _batch(self, prompts, completions, answer) -> RewardMatrix:
+        key = batch_key(prompts, completions, answer)
+        with self._lock:
+            matrix = self._batches.get(key)
+            if matrix is None or matrix.values.shape[1] != len(self.funcs):
+                matrix = RewardMatrix(
+                    tuple(self.names),
+                    np.full((len(completions), len(self.funcs)), np.nan),
+                )
+                self._batches[key] = matrix
+            self._batches.move_to_end(key)
+            while len(self._batches) > self.max_batches:
+                self._batches.popitem(last=False)
+            return matrix
+
+    def _offload(self, prompts, completions, answer, kwargs: dict):
+        # Starts every heavy column of the batch not yet computed or started.
+        if not any(self.heavy):
+            return
+        matrix = self._batch(prompts, completions, answer)
+        with self._lock:
+            for index, fn in enumerate(self.funcs):
+                if not self.heavy[index] or index in matrix.pending:
+                    continue
+                if not np.isnan(matrix.values[:, index]).any():
+                    continue
+                future = _submit(fn, kwargs)
+                if future is None:
+                    return
+                matrix.pending[index] = future
+
+    def _compute(self, matrix: RewardMatrix, index: int, args, kwargs) -> list[float]:
+        with self._lock:
+            future = matrix.pending.pop(index, None)
+        if future is not None:
+            try:
+                values = _merge_pooled(self.funcs[index], future.result())
+                with self._lock:
+                    self.stats.offloaded += 1
+                return values
+            except Exception as e:
+                # Reward errors surface again inline; pool errors fall back.
+                logger.warning(f"{self.names[index]} failed on the process pool: {e!r}")
+        return self.funcs[index](*args, **kwargs)
+
+    def _column(self, index, prompts, completions, answer, args, kwargs) -> list[float]:
+        matrix = self._batch(prompts, completions, answer)
+        column = matrix.values[:, index]
+        if np.isnan(column).any():
+            with self._lock:
+                self.stats.misses += 1
+            column[:] = self._compute(matrix, index, args, kwargs)
+        else:
+            with self._lock:
+                self.stats.hits += 1
+        return column.tolist()
+
+    def clear(self):
+        with self._lock:
+            self._batches.clear()
+
+    def matrix(self, prompts, completions, answer=None, **kwargs) -> RewardMatrix:
+        """All registered rewards for a batch; missing columns are computed with `kwargs`."""
+        matrix = self._batch(prompts, completions, answer)
+        kwargs = dict(prompts=prompts, completions=completions, answer=answer, **kwargs)
+        self._offload(prompts, completions, answer, kwargs)
+        for index in range(len(self.funcs)):
+            self._column(index, prompts, completions, answer, (), kwargs)
+        return matrix
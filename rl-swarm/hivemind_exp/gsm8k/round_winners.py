@@ -0,0 +1,129 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Sequence
+
+import hivemind_exp.gsm8k.stage3_rewards as stage3_rewards
+from hivemind_exp.gsm8k.reward_engine import RewardEngine
+
+logger = logging.getLogger(__name__)
+
+ScoreKey = tuple[int, str, str]  # Round, node key, question hash.
+
+
+def output_q_hash(output: dict) -> str:
+    # As published by the trainer.
+    return hashlib.md5(output["question"].encode()).hexdigest()
+
+
+def _fingerprint(output: dict) -> tuple:
+    return (
+        output["stage3_prompt"],
+        tuple(output["final_agent_decision"].values()),
+        output["answer"],
+    )
+
+
+def scoring_engine() -> RewardEngine:
+    """
+    The stage 3 reward functions on an engine of their own, evaluated inline,
+    so scoring threads don't share batch matrices with training. The
+    question_similarity cache they read is shared, and locked.
+    """
+    engine = RewardEngine()
+    for fn in stage3_rewards.reward_engine.funcs:
+        engine.reward(fn)
+    return engine
+
+
+# Used by score_output unless given another.
+reward_engine = scoring_engine()
+
+
+def score_output(output: dict, engine: RewardEngine | None = None) -> float:
+    """Total stage-3 reward of a final-stage output's decision. Pure."""
+    prompts = [
+        [
+            {"role": "system", "content": output["question"]},
+            {"role": "system", "content": output["stage3_prompt"]},
+        ],
+    ]
+    final_answer = next(iter(output["final_agent_decision"].values()))
+    completions = [[{"role": "assistant", "content": final_answer}]]
+    matrix = (engine or reward_engine).matrix(
+        prompts, completions, output["answer"], logging=False
+    )
+    return float(matrix.total().sum())
+
+
+class RoundWinnerScorer:
+    """
+    Scores nodes' final-stage outputs to pick round winners.
+
+    Scores are cached per (round, node key, question hash) with a fingerprint
+    of the output, so only new or changed outputs are scored. `submit` starts
+    scoring on a thread pool as outputs arrive, e.g. from the final stage
+    prefetch; `scores` and `winners` submit what they're given and wait for
+    it. The pool threads share the scorer's own engine, whose batch lookups
+    are locked; at worst two of them compute the same column twice. Node
+    state is never touched.
+    """
+
+    def __init__(self, max_workers: int = 4, log: logging.Logger | None = None):
+        self.logger = log or logger
+        self.engine = scoring_engine()
+        self.scored = 0
+
+        self._scores: dict[ScoreKey, tuple[tuple, Future]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="round-winners")
+
+    def submit(self, round_num: int, node_key: str, output: dict) -> Future:
+        key = (round_num, node_key, output_q_hash(output))
+        fingerprint = _fingerprint(output)
+        with self._lock:
+            cached = self._scores.get(key)
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            future = self._executor.submit(self._score, output)
+            self._scores[key] = (fingerprint, future)
+            return future
+
+    def _score(self, output: dict) -> float:
+        score = score_output(output, self.engine)
+        with self._lock:
+            self.scored += 1
+        return score
+
+    def scores(
+        self, round_num: int, outputs: Iterable[dict[str, dict]]
+    ) -> dict[str, float]:
+        """Per-node total over `outputs`, one {node key: output} dict per question."""
+        futures = [
+            (node_key, self.submit(round_num, node_key, output))
+            for keyed_outputs in outputs
+            for node_key, output in keyed_outputs.items()
+        ]
+        totals: dict[str, float] = {}
+        for node_key, future in futures:
+            try:
+                score = future.result()
+            except Exception as e:
+                self.logger.warning(f"Could not score round {round_num} output of {node_key}: {e}")
+                score = 0.0
+            totals[node_key] = totals.get(node_key, 0.0) + score
+        return totals
+
+    def winners(
+        self, round_num: int, outputs: Iterable[dict[str, dict]], limit: int = 10
+    ) -> Sequence[str]:
+        totals = self.scores(round_num, outputs)
+        ranked = sorted(totals.items(), key=lambda x: x[1], reverse=True)
+        return [n for n, _ in ranked][:limit]
+
+    def forget(self, before_round: int):
+        """Drops cached scores of rounds before `before_round`."""
+        with self._lock:
+            for key in [k for k in self._scores if k[0] < before_round]:
+                del self._scores[key]
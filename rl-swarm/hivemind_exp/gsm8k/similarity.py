@@ -0,0 +1,136 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Iterable, Iterator
+
+# Scored (question, completion) pairs kept; a batch is rescored by the
+# cumulative reward and again by round winners.
+SIMILARITY_CACHE_SIZE = 4096
+
+
+def sequence_matcher_ratio(a: str, b: str) -> float:
+    """Exactly difflib.SequenceMatcher(None, a, b).ratio(); worst case quadratic."""
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def lcs_length(a: str, b: str) -> int:
+    """
+    Length of the longest common subsequence of `a` and `b`.
+
+    Bit-parallel (Allison-Dix / Hyyrö): one pass over the shorter string with
+    a few big-int operations on a bit vector as long as the longer one, so
+    O(len(a) * len(b) / w) for machine word size w.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return 0
+
+    masks: dict[str, int] = {}
+    for i, ch in enumerate(a):
+        masks[ch] = masks.get(ch, 0) | (1 << i)
+
+    full = (1 << len(a)) - 1
+    v = full
+    for ch in b:
+        u = v & masks.get(ch, 0)
+        v = ((v + u) | (v - u)) & full
+    return len(a) - v.bit_count()
+
+
+def lcs_ratio(a: str, b: str) -> float:
+    """
+    2 * LCS / (len(a) + len(b)), on the same scale as SequenceMatcher.ratio().
+
+    Never lower than the SequenceMatcher ratio, whose matching blocks form one
+    common subsequence; the two agree unless SequenceMatcher's greedy longest
+    block choice skips a better alignment.
+    """
+    total = len(a) + len(b)
+    return 2.0 * lcs_length(a, b) / total if total else 1.0
+
+
+BACKENDS = {
+    "lcs": lcs_ratio,
+    "exact": sequence_matcher_ratio,
+}
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+@dataclass
+class SimilarityStats:
+    hits: int = 0
+    misses: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class Similarity:
+    """
+    Similarity ratio in [0, 1] between a completion and a reference text.
+
+    `backend` names an entry of BACKENDS: "lcs" is bit-parallel with a bounded
+    cost, "exact" is SequenceMatcher for parity checks. Results are cached by
+    (reference hash, completion hash), keeping the last `cache_size`; ratios
+    computed under `record` can be merged into another instance's cache with
+    `update`.
+    """
+
+    def __init__(self, backend: str = "lcs", cache_size: int = SIMILARITY_CACHE_SIZE):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown similarity backend: {backend}")
+        self.backend = backend
+        self.cache_size = cache_size
+        self.stats = SimilarityStats()
+
+        self._ratio = BACKENDS[backend]
+        self._cache: OrderedDict[tuple[bytes, bytes], float] = OrderedDict()
+        self._recorded: list[tuple[tuple[bytes, bytes], float]] | None = None
+        self._lock = threading.Lock()
+
+    def ratio(self, completion: str, reference: str) -> float:
+        key = (text_hash(reference), text_hash(completion))
+        with self._lock:
+            if key in self._cache:
+                self.stats.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.stats.misses += 1
+
+        ratio = self._ratio(completion, reference)
+        with self._lock:
+            if self._recorded is not None:
+                self._recorded.append((key, ratio))
+        self.update([(key, ratio)])
+        return ratio
+
+    def update(self, entries: Iterable[tuple[tuple[bytes, bytes], float]]):
+        """Caches (key, ratio) entries, as collected by `record`."""
+        with self._lock:
+            for key, ratio in entries:
+                self._cache[key] = ratio
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    @contextmanager
+    def record(self) -> Iterator[list[tuple[tuple[bytes, bytes], float]]]:
+        """Collects the (key, ratio) of every ratio computed meanwhile."""
+        recorded: list[tuple[tuple[bytes, bytes], float]] = []
+        with self._lock:
+            self._recorded = recorded
+        try:
+            yield recorded
+        finally:
+            with self._lock:
+                self._recorded = None
+
+    def ratios(self, completions: list[str], reference: str) -> list[float]:
+        return [self.ratio(c, reference) for c in completions]
@@ -1,81 +1,78 @@
 import os
-import random
-import re
 
 import numpy as np
 
+from hivemind_exp.gsm8k.completion_parse import parse_completion, parse_completions
+from hivemind_exp.gsm8k.reward_engine import RewardEngine
 from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.sample_logger import sample_dir, sample_logger
+
+# Reward functions below are evaluated once per batch; see RewardEngine.
+reward_engine = RewardEngine()
+
+# In order. Strict: r"^<think>\n.*?\n</think>\n<answer>\n.*?\n</answer>\n$",
+# soft: r"<think>.*?</think>\s*<answer>.*?</answer>".
+FORMAT_TAGS = ("think", "answer")
 
 
 def extract_xml_answer(text: str) -> str:
-    answer = text.split("<answer>")[-1]
-    answer = answer.split("</answer>")[0]
-    return answer.strip()
+    return parse_completion(text).extract("answer")
 
 
 def count_xml(text) -> float:
+    parsed = parse_completion(text)
     count = 0.0
-    if text.count("<think>\n") == 1:
+    if parsed.count("<think>\n") == 1:
         count += 0.125
-    if text.count("\n</think>\n") == 1:
+    if parsed.count("\n</think>\n") == 1:
         count += 0.125
-    if text.count("\n<answer>\n") == 1:
+    if parsed.count("\n<answer>\n") == 1:
         count += 0.125
-        count -= len(text.split("\n</answer>\n")[-1]) * 0.001
-    if text.count("\n</answer>") == 1:
+        count -= parsed.trailing("\n</answer>\n") * 0.001
+    if parsed.count("\n</answer>") == 1:
         count += 0.125
-        count -= (len(text.split("\n</answer>")[-1]) - 1) * 0.001
+        count -= (parsed.trailing("\n</answer>") - 1) * 0.001
     return count
 
 
 # Reward functions
+@reward_engine.reward
 def correctness_reward_func(
     prompts, completions, answer, weighting=2.0, logging=False, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     q = prompts[0][-1]["content"]
-    extracted_responses = [extract_xml_answer(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "correctness_samples.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"Question:\n{q}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}"
-            f.write(out_line)
+    extracted_responses = [c.extract("answer") for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir("gsm8k"), "correctness_samples.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"Question:\n{q}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [
         1.0 * weighting if r == a else 0.0 for r, a in zip(extracted_responses, answer)
     ]
 
 
+@reward_engine.reward
 def int_reward_func(completions, weighting=0.5, **kwargs) -> list[float]:
-    responses = [completion[0]["content"] for completion in completions]
-    extracted_responses = [extract_xml_answer(r) for r in responses]
+    extracted_responses = [c.extract("answer") for c in parse_completions(completions)]
     return [1.0 * weighting if r.isdigit() else 0.0 for r in extracted_responses]
 
 
+@reward_engine.reward
 def strict_format_reward_func(completions, weighting=0.5, **kwargs) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
-    pattern = r"^<think>\n.*?\n</think>\n<answer>\n.*?\n</answer>\n$"
-    responses = [completion[0]["content"] for completion in completions]
-    matches = [re.match(pattern, r) for r in responses]
+    matches = [c.strict_format(FORMAT_TAGS) for c in parse_completions(completions)]
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
+@reward_engine.reward
 def soft_format_reward_func(completions, weighting=0.5, **kwargs) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
-    pattern = r"<think>.*?</think>\s*<answer>.*?</answer>"
-    responses = [completion[0]["content"] for completion in completions]
-    matches = [re.match(pattern, r) for r in responses]
+    matches = [c.soft_format(FORMAT_TAGS) for c in parse_completions(completions)]
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
+@reward_engine.reward
 def xmlcount_reward_func(completions, weighting=1.0, **kwargs) -> list[float]:
     contents = [completion[0]["content"] for completion in completions]
     return [count_xml(c) * weighting for c in contents]
@@ -90,23 +87,11 @@ def top_k_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one for prompt generation's top_k selector
     """
-    correctness_reward = correctness_reward_func(
-        prompts, completions, answer, logging=logging
+    total_reward = (
+        reward_engine.matrix(prompts, completions, answer, logging=logging)
+        .total()
+        .tolist()
     )
-    int_reward = int_reward_func(completions)
-    strict_format_reward = strict_format_reward_func(completions)
-    soft_format_reward = soft_format_reward_func(completions)
-    xmlcount_reward = xmlcount_reward_func(completions)
-    total_reward = [
-        sum(tup)
-        for tup in zip(
-            correctness_reward,
-            int_reward,
-            strict_format_reward,
-            soft_format_reward,
-            xmlcount_reward,
-        )
-    ]
     return total_reward
 
 
@@ -122,23 +107,11 @@ def hivemind_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one + saves JSON to node.outputs
     """
-    correctness_reward = correctness_reward_func(
-        prompts, completions, answer, logging=logging
+    total_reward = (
+        reward_engine.matrix(prompts, completions, answer, logging=logging)
+        .total()
+        .tolist()
     )
-    int_reward = int_reward_func(completions)
-    strict_format_reward = strict_format_reward_func(completions)
-    soft_format_reward = soft_format_reward_func(completions)
-    xmlcount_reward = xmlcount_reward_func(completions)
-    total_reward = [
-        sum(tup)
-        for tup in zip(
-            correctness_reward,
-            int_reward,
-            strict_format_reward,
-            soft_format_reward,
-            xmlcount_reward,
-        )
-    ]
 
     if output_signal_selector == "max":
         # Generate output line
@@ -1,17 +1,22 @@
 import os
-import random
-import re
 
 import numpy as np
 
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+from hivemind_exp.gsm8k.completion_parse import parse_completion, parse_completions
+from hivemind_exp.gsm8k.reward_engine import RewardEngine
 from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.sample_logger import sample_dir, sample_logger
+
+# Reward functions below are evaluated once per batch; see RewardEngine.
+reward_engine = RewardEngine()
+
+# In order; see stage1_rewards.FORMAT_TAGS.
+FORMAT_TAGS = ("compare", "explain", "identify")
 
 
 def extract_xml_identity(text: str) -> str:
-    id = text.split("<identify>")[-1]
-    id = id.split("</identify>")[0]
-    return id.strip()
+    return parse_completion(text).extract("identify")
 
 
 def extract_xml_ids(text: str) -> str:
@@ -39,69 +44,61 @@ def extract_answers(text: str) -> str:
 
 
 def count_xml(text) -> float:
+    parsed = parse_completion(text)
     count = 0.0
-    if text.count("<compare>\n") == 1:
+    if parsed.count("<compare>\n") == 1:
         count += 0.125
-    if text.count("\n</compare>\n") == 1:
+    if parsed.count("\n</compare>\n") == 1:
         count += 0.125
-    if text.count("<explain>\n") == 1:
+    if parsed.count("<explain>\n") == 1:
         count += 0.125
-    if text.count("\n</explain>\n") == 1:
+    if parsed.count("\n</explain>\n") == 1:
         count += 0.125
-    if text.count("\n<identify>\n") == 1:
+    if parsed.count("\n<identify>\n") == 1:
         count += 0.125
-        count -= len(text.split("\n</identify>\n")[-1]) * 0.001
-    if text.count("\n</identify>") == 1:
+        count -= parsed.trailing("\n</identify>\n") * 0.001
+    if parsed.count("\n</identify>") == 1:
         count += 0.125
-        count -= (len(text.split("\n</identify>")[-1]) - 1) * 0.001
+        count -= (parsed.trailing("\n</identify>") - 1) * 0.001
     return count
 
 
 # Reward functions
+@reward_engine.reward
 def proper_id_reward_func(
     prompts, completions, answer, weighting=2.0, logging=True, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
     agent_ids = extract_xml_ids(p)
-    extracted_responses = [extract_xml_identity(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "id_extact_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nValid IDs:\n{agent_ids}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in agent_ids}"
-            f.write(out_line)
+    extracted_responses = [c.extract("identify") for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir(), "id_extact_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nValid IDs:\n{agent_ids}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in agent_ids}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [1.0 * weighting if r in agent_ids else 0.0 for r in extracted_responses]
 
 
+@reward_engine.reward(heavy=True)
 def correctness_reward_func(
     prompts, completions, answer, weighting=2.0, logging=True, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
     agent_answers = extract_answers(p)
-    extracted_responses = [extract_xml_identity(r) for r in responses]
+    extracted_responses = [c.extract("identify") for c in parse_completions(completions)]
     chosen_rewards = []
     for r in extracted_responses:
         cur_reward = 0
         if r in agent_answers:
-            if stage1_rewards.extract_xml_answer(agent_answers[r]) == answer[0]:
+            agent_answer = parse_completion(agent_answers[r])
+            if agent_answer.extract("answer") == answer[0]:
                 cur_reward += 1.0
-            if stage1_rewards.extract_xml_answer(agent_answers[r]).isdigit():
+            if agent_answer.extract("answer").isdigit():
                 cur_reward += 0.5
-            pattern = r"^<think>\n.*?\n</think>\n<answer>\n.*?\n</answer>\n$"
-            if re.match(pattern, agent_answers[r]):
+            if agent_answer.strict_format(stage1_rewards.FORMAT_TAGS):
                 cur_reward += 0.5
-            pattern = r"<think>.*?</think>\s*<answer>.*?</answer>"
-            if re.match(pattern, agent_answers[r]):
+            if agent_answer.soft_format(stage1_rewards.FORMAT_TAGS):
                 cur_reward += 0.5
             cur_reward += stage1_rewards.count_xml(agent_answers[r])
         elif r in [
@@ -125,94 +122,56 @@ def correctness_reward_func(
             if all(check_submissions):
                 cur_reward += 10
         chosen_rewards += [cur_reward]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        if extracted_responses[0] in agent_answers:
-            os.makedirs(
-                f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-                exist_ok=True,
-            )
-            log_file = os.path.join(
-                "model_output_samples",
-                f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-                "correctness_samps.txt",
-            )
-            with open(log_file, "a") as f:
-                f.write("-" * 20)
-                out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]]}\n\nReward for choice: {chosen_rewards[0]}"
-                f.write(out_line)
+    log_file = os.path.join(sample_dir(), "correctness_samps.txt")
+    if (
+        logging
+        and extracted_responses[0] in agent_answers
+        and sample_logger.sampled(log_file, completions[0][0]["content"])
+    ):
+        out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]]}\n\nReward for choice: {chosen_rewards[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [r * weighting for r in chosen_rewards]
 
 
+@reward_engine.reward
 def strict_format_reward_func(
     completions, weighting=0.5, logging=True, **kwargs
 ) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
-    pattern = r"^<compare>\n.*?\n</compare>\n<explain>\n.*?\n</explain>\n<identify>\n.*?\n</identify>\n$"
     responses = [completion[0]["content"] for completion in completions]
-    matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "s2_strict_format_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
+    matches = [c.strict_format(FORMAT_TAGS) for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir(), "s2_strict_format_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
+@reward_engine.reward
 def soft_format_reward_func(
     completions, weighting=0.5, logging=True, **kwargs
 ) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
-    pattern = (
-        r"<compare>.*?</compare>\s*<explain>.*?</explain>\s*<identify>.*?</identify>"
-    )
     responses = [completion[0]["content"] for completion in completions]
-    matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "s2_soft_format_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
+    matches = [c.soft_format(FORMAT_TAGS) for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir(), "s2_soft_format_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
+@reward_engine.reward
 def xmlcount_reward_func(
     completions, weighting=1.0, logging=True, **kwargs
 ) -> list[float]:
     contents = [completion[0]["content"] for completion in completions]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
+    log_file = os.path.join(sample_dir(), "strict_format_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = (
+            f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}"
         )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "strict_format_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = (
-                f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}"
-            )
-            f.write(out_line)
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [count_xml(c) * weighting for c in contents]
 
 def top_k_cumulative_reward(
@@ -225,25 +184,11 @@ def top_k_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one for prompt generation's top_k selector
     """
-    proper_id_reward = proper_id_reward_func(
-        prompts, completions, answer, logging=logging
-    )
-    correctness_reward = correctness_reward_func(
-        prompts, completions, answer, logging=logging
+    total_reward = (
+        reward_engine.matrix(prompts, completions, answer, logging=logging)
+        .total()
+        .tolist()
     )
-    strict_format_reward = strict_format_reward_func(completions, logging=logging)
-    soft_format_reward = soft_format_reward_func(completions, logging=logging)
-    xmlcount_reward = xmlcount_reward_func(completions, logging=logging)
-    total_reward = [
-        sum(tup)
-        for tup in zip(
-            proper_id_reward,
-            correctness_reward,
-            strict_format_reward,
-            soft_format_reward,
-            xmlcount_reward,
-        )
-    ]
     return total_reward
 
 
@@ -259,25 +204,11 @@ def hivemind_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one + saves JSON to node.outputs
     """
-    proper_id_reward = proper_id_reward_func(
-        prompts, completions, answer, logging=logging
-    )
-    correctness_reward = correctness_reward_func(
-        prompts, completions, answer, logging=logging
+    total_reward = (
+        reward_engine.matrix(prompts, completions, answer, logging=logging)
+        .total()
+        .tolist()
     )
-    strict_format_reward = strict_format_reward_func(completions, logging=logging)
-    soft_format_reward = soft_format_reward_func(completions, logging=logging)
-    xmlcount_reward = xmlcount_reward_func(completions, logging=logging)
-    total_reward = [
-        sum(tup)
-        for tup in zip(
-            proper_id_reward,
-            correctness_reward,
-            strict_format_reward,
-            soft_format_reward,
-            xmlcount_reward,
-        )
-    ]
 
     question = extract_original_question(prompts[0][-1]["content"])
     if output_signal_selector == "max":
@@ -1,30 +1,37 @@
 import os
-import random
-import re
-from difflib import SequenceMatcher
+from dataclasses import dataclass
+from functools import lru_cache
 
 import numpy as np
 
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+from hivemind_exp.gsm8k.completion_parse import parse_completion, parse_completions
+from hivemind_exp.gsm8k.reward_engine import RewardEngine
+from hivemind_exp.gsm8k.similarity import Similarity
 from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.sample_logger import sample_dir, sample_logger
+from hivemind_exp.session_store import session_store
+
+# Reward functions below are evaluated once per batch; see RewardEngine.
+reward_engine = RewardEngine()
+
+# Scores recreated questions; Similarity("exact") restores SequenceMatcher.
+question_similarity = Similarity()
+
+# In order; see stage1_rewards.FORMAT_TAGS.
+FORMAT_TAGS = ("summarize_feedback", "majority", "question", "think", "answer")
 
 
 def extract_xml_identity(text: str) -> str:
-    id = text.split("<majority>")[-1]
-    id = id.split("</majority>")[0]
-    return id.strip()
+    return parse_completion(text).extract("majority")
 
 
 def extract_xml_final_answer(text: str) -> str:
-    answer = text.split("<answer>")[-1]
-    answer = answer.split("</answer>")[0]
-    return answer.strip()
+    return parse_completion(text).extract("answer")
 
 
 def extract_xml_question(text: str) -> str:
-    question = text.split("<question>")[-1]
-    question = question.split("</question>")[0]
-    return question.strip()
+    return parse_completion(text).extract("question")
 
 
 def extract_xml_ids(text: str) -> str:
@@ -63,29 +70,30 @@ def extract_answers(text: str) -> str:
 
 
 def count_xml(text) -> float:
+    parsed = parse_completion(text)
     count = 0.0
-    if text.count("<summarize_feedback>\n") == 1:
+    if parsed.count("<summarize_feedback>\n") == 1:
         count += 0.125
-    if text.count("\n</summarize_feedback>\n") == 1:
+    if parsed.count("\n</summarize_feedback>\n") == 1:
         count += 0.125
-    if text.count("<majority>\n") == 1:
+    if parsed.count("<majority>\n") == 1:
         count += 0.125
-    if text.count("\n</majority>\n") == 1:
+    if parsed.count("\n</majority>\n") == 1:
         count += 0.125
-    if text.count("<question>\n") == 1:
+    if parsed.count("<question>\n") == 1:
         count += 0.125
-    if text.count("\n</question>\n") == 1:
+    if parsed.count("\n</question>\n") == 1:
         count += 0.125
-    if text.count("<think>\n") == 1:
+    if parsed.count("<think>\n") == 1:
         count += 0.125
-    if text.count("\n</think>\n") == 1:
+    if parsed.count("\n</think>\n") == 1:
         count += 0.125
-    if text.count("\n<answer>\n") == 1:
+    if parsed.count("\n<answer>\n") == 1:
         count += 0.125
-        count -= len(text.split("\n</answer>\n")[-1]) * 0.001
-    if text.count("\n</answer>") == 1:
+        count -= parsed.trailing("\n</answer>\n") * 0.001
+    if parsed.count("\n</answer>") == 1:
         count += 0.125
-        count -= (len(text.split("\n</answer>")[-1]) - 1) * 0.001
+        count -= (parsed.trailing("\n</answer>") - 1) * 0.001
     return count
 
 
@@ -106,80 +114,107 @@ def swarm_majority(choices):
     return majority
 
 
+# Every completion of a batch shares its prompt; a few batches are in flight.
+PROMPT_PARSE_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class AgentAnswer:
+    text: str
+    answer: str
+    strict_format: bool
+    soft_format: bool
+    xml_count: float
+
+
+@dataclass(frozen=True)
+class ParsedPrompt:
+    question: str
+    choices: list[str]  # Critics' <identify> picks, in order.
+    majority: frozenset[str]
+    agent_answers: dict[str, AgentAnswer]
+
+
+@lru_cache(maxsize=PROMPT_PARSE_CACHE_SIZE)
+def parse_prompt(prompt: str) -> ParsedPrompt:
+    """The parts of a stage-3 prompt reward functions use; don't mutate."""
+    choices = extract_xml_choices(prompt)
+    agent_answers = {}
+    for id, text in extract_answers(prompt).items():
+        parsed = parse_completion(text)
+        agent_answers[id] = AgentAnswer(
+            text=text,
+            answer=parsed.extract("answer"),
+            strict_format=parsed.strict_format(stage1_rewards.FORMAT_TAGS),
+            soft_format=parsed.soft_format(stage1_rewards.FORMAT_TAGS),
+            xml_count=stage1_rewards.count_xml(text),
+        )
+    return ParsedPrompt(
+        question=extract_original_question(prompt),
+        choices=choices,
+        majority=frozenset(swarm_majority(choices)),
+        agent_answers=agent_answers,
+    )
+
+
 # Reward functions
+@reward_engine.reward
 def consensus_reward_func(
     prompts, completions, weighting=2.0, logging=False, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
-    critic_choices = extract_xml_choices(p)
-    majority_choices = swarm_majority(critic_choices)
-    extracted_responses = [extract_xml_identity(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "consensus_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nCritic Choice Distribution:\n{critic_choices}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in majority_choices}"
-            f.write(out_line)
+    parsed_prompt = parse_prompt(p)
+    critic_choices = parsed_prompt.choices
+    majority_choices = parsed_prompt.majority
+    extracted_responses = [c.extract("majority") for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir(), "consensus_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nCritic Choice Distribution:\n{critic_choices}\n\nExtracted:\n{extracted_responses[0]}\n\nGot reward? {extracted_responses[0] in majority_choices}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [
         1.0 * weighting if r in majority_choices else 0.0 for r in extracted_responses
     ]
 
 
+@reward_engine.reward(heavy=True)
 def question_recreation_reward_func(
     prompts, completions, weighting=1.0, logging=False, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
-    q = extract_original_question(p)
-    recreated_qs = [extract_xml_question(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "question_recreation_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nOriginal Question:\n{q}\n\nExtracted recreation:\n{recreated_qs[0]}\n\nGot reward? {SequenceMatcher(None, recreated_qs[0], q).ratio()}"
-            f.write(out_line)
-    return [SequenceMatcher(None, r, q).ratio() * weighting for r in recreated_qs]
+    q = parse_prompt(p).question
+    recreated_qs = [c.extract("question") for c in parse_completions(completions)]
+    ratios = question_similarity.ratios(recreated_qs, q)
+    log_file = os.path.join(sample_dir(), "question_recreation_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nOriginal Question:\n{q}\n\nExtracted recreation:\n{recreated_qs[0]}\n\nGot reward? {ratios[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
+    return [ratio * weighting for ratio in ratios]
 
 
+@reward_engine.reward(heavy=True)
 def concensus_correctness_reward_func(
     prompts, completions, answer, weighting=2.0, logging=False, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
-    agent_answers = extract_answers(p)
-    extracted_responses = [extract_xml_identity(r) for r in responses]
+    agent_answers = parse_prompt(p).agent_answers
+    extracted_responses = [c.extract("majority") for c in parse_completions(completions)]
     chosen_rewards = []
     for r in extracted_responses:
         cur_reward = 0
         if r in agent_answers:
-            if stage1_rewards.extract_xml_answer(agent_answers[r]) == answer[0]:
+            agent_answer = agent_answers[r]
+            if agent_answer.answer == answer[0]:
                 cur_reward += 1.0
-            if stage1_rewards.extract_xml_answer(agent_answers[r]).isdigit():
+            if agent_answer.answer.isdigit():
                 cur_reward += 0.5
-            pattern = r"^<think>\n.*?\n</think>\n<answer>\n.*?\n</answer>\n$"
-            if re.match(pattern, agent_answers[r]):
+            if agent_answer.strict_format:
                 cur_reward += 0.5
-            pattern = r"<think>.*?</think>\s*<answer>.*?</answer>"
-            if re.match(pattern, agent_answers[r]):
+            if agent_answer.soft_format:
                 cur_reward += 0.5
-            cur_reward += stage1_rewards.count_xml(agent_answers[r])
+            cur_reward += agent_answer.xml_count
         elif r in [
             "None",
             "No one",
@@ -191,127 +226,79 @@ def concensus_correctness_reward_func(
             "None were correct",
             "No one is correct",
         ]:
-            agent_as = [
-                stage1_rewards.extract_xml_answer(agent_answers[id])
-                for id in agent_answers
-            ]
+            agent_as = [a.answer for a in agent_answers.values()]
             check_submissions = [
                 True if r == a else False for r, a in zip(agent_as, answer)
             ]
             if all(check_submissions):
                 cur_reward += 10
         chosen_rewards += [cur_reward]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        if extracted_responses[0] in agent_answers:
-            os.makedirs(
-                f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-                exist_ok=True,
-            )
-            log_file = os.path.join(
-                "model_output_samples",
-                f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-                "correctness_samps.txt",
-            )
-            with open(log_file, "a") as f:
-                f.write("-" * 20)
-                out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]]}\n\nReward for choice: {chosen_rewards[0]}"
-                f.write(out_line)
+    log_file = os.path.join(sample_dir(), "correctness_samps.txt")
+    if (
+        logging
+        and extracted_responses[0] in agent_answers
+        and sample_logger.sampled(log_file, completions[0][0]["content"])
+    ):
+        out_line = f"\nPrompt:\n{p}\n\nResponse:\n{responses[0]}\n\nChosen answer ID:\n{extracted_responses[0]}\n\nExtracted:\n{agent_answers[extracted_responses[0]].text}\n\nReward for choice: {chosen_rewards[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [r * weighting for r in chosen_rewards]
 
 
+@reward_engine.reward
 def final_correctness_reward_func(
     prompts, completions, answer, weighting=2.0, logging=False, **kwargs
 ) -> list[float]:
     responses = [completion[0]["content"] for completion in completions]
     p = prompts[0][-1]["content"]
-    extracted_responses = [extract_xml_final_answer(r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "final_answer_correctness_samples.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"Prompt:\n{p}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}"
-            f.write(out_line)
+    extracted_responses = [c.extract("answer") for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir(), "final_answer_correctness_samples.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"Prompt:\n{p}\n\nAnswer:\n{answer[0]}\n\nResponse:\n{responses[0]}\n\nExtracted:\n{extracted_responses[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [
         1.0 * weighting if r == a else 0.0 for r, a in zip(extracted_responses, answer)
     ]
 
 
+@reward_engine.reward
 def strict_format_reward_func(
     completions, weighting=0.5, logging=False, **kwargs
 ) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
-    pattern = r"^<summarize_feedback>\n.*?\n</summarize_feedback>\n<majority>\n.*?\n</majority>\n<question>\n.*?\n</question>\n<think>\n.*?\n</think>\n<answer>\n.*?\n</answer>\n$"
     responses = [completion[0]["content"] for completion in completions]
-    matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "s3_strict_format_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
+    matches = [c.strict_format(FORMAT_TAGS) for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir(), "s3_strict_format_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
+@reward_engine.reward
 def soft_format_reward_func(
     completions, weighting=0.5, logging=False, **kwargs
 ) -> list[float]:
     """Reward function that checks if the completion has a specific format."""
-    pattern = r"<summarize_feedback>.*?</summarize_feedback>\s*<majority>.*?</majority>\s*<question>.*?</question>\s*<think>.*?</think>\s*<answer>.*?</answer>"
     responses = [completion[0]["content"] for completion in completions]
-    matches = [re.match(pattern, r) for r in responses]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
-        )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "s3_soft_format_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
-            f.write(out_line)
+    matches = [c.soft_format(FORMAT_TAGS) for c in parse_completions(completions)]
+    log_file = os.path.join(sample_dir(), "s3_soft_format_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = f"\nResponse:\n{responses[0]}\n\nMatches? {matches[0]}"
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [1.0 * weighting if match else 0.0 for match in matches]
 
 
+@reward_engine.reward
 def xmlcount_reward_func(
     completions, weighting=1.0, logging=False, **kwargs
 ) -> list[float]:
     contents = [completion[0]["content"] for completion in completions]
-    if (random.random() < 0.01) and logging:  # 1% chance to write samples into a file
-        os.makedirs(
-            f"model_output_samples/multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            exist_ok=True,
+    log_file = os.path.join(sample_dir(), "count_xml_samps.txt")
+    if logging and sample_logger.sampled(log_file, completions[0][0]["content"]):
+        out_line = (
+            f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}"
         )
-        log_file = os.path.join(
-            "model_output_samples",
-            f"multi_stage_gsm8k_samples_from_{os.getenv('HOSTNAME')}",
-            "count_xml_samps.txt",
-        )
-        with open(log_file, "a") as f:
-            f.write("-" * 20)
-            out_line = (
-                f"\nResponse:\n{contents[0]}\n\nCount reward: {count_xml(contents[0])}"
-            )
-            f.write(out_line)
+        sample_logger.write(log_file, "-" * 20 + out_line)
     return [count_xml(c) * weighting for c in contents]
 
 
@@ -327,34 +314,14 @@ def hivemind_cumulative_reward(
     """
     Dummy reward function that accumulates all rewards into one + saves JSON to node.outputs
     """
-    consensus_reward = consensus_reward_func(prompts, completions, logging=logging)
-    concensus_correctness = concensus_correctness_reward_func(
-        prompts, completions, answer, logging=logging
-    )
-    question_recreation_reward = question_recreation_reward_func(
-        prompts, completions, logging=logging
-    )
-    final_correctness = final_correctness_reward_func(
-        prompts, completions, answer, logging=logging
+    total_reward = (
+        reward_engine.matrix(prompts, completions, answer, logging=logging)
+        .total()
+        .tolist()
     )
-    strict_format_reward = strict_format_reward_func(completions, logging=logging)
-    soft_format_reward = soft_format_reward_func(completions, logging=logging)
-    xmlcount_reward = xmlcount_reward_func(completions, logging=logging)
-    total_reward = [
-        sum(tup)
-        for tup in zip(
-            consensus_reward,
-            concensus_correctness,
-            question_recreation_reward,
-            final_correctness,
-            strict_format_reward,
-            soft_format_reward,
-            xmlcount_reward,
-        )
-    ]
 
     prompt = prompts[0][-1]["content"]
-    question = extract_original_question(prompt)
+    question = parse_prompt(prompt).question
     if output_signal_selector == "max":
         # Generate output line
         maximal_reward_idx, responses = (
@@ -386,17 +353,13 @@ def print_training_summary(node: HivemindNode):
     if not all([(0, 0) in node.round_cache, (0, 1) in node.round_cache, (0, 2) in node.round_cache]):
         return
     
-    # Get path to supervisor_content.txt file for direct writing
-    import os
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    root_dir = os.path.dirname(os.path.dirname(current_dir))
-    file_path = os.path.join(root_dir, "supervisor_content.txt")
+    # Collected here and recorded to the session store as one entry
+    summary = []
     
     # Begin writing summary
-    with open(file_path, "a") as f:
-        f.write("\n\n" + "=" * 80 + "\n")
-        f.write("FINAL SUMMARY OF ALL STAGES\n")
-        f.write("=" * 80 + "\n")
+    summary.append("\n\n" + "=" * 80 + "\n")
+    summary.append("FINAL SUMMARY OF ALL STAGES\n")
+    summary.append("=" * 80 + "\n")
     
     print("\n\n" + "=" * 80)
     print("FINAL SUMMARY OF ALL STAGES")
@@ -461,9 +424,8 @@ def print_training_summary(node: HivemindNode):
         stage_num = stage_data["stage"]
         outputs = stage_data["outputs"]
         
-        # Write to file
-        with open(file_path, "a") as f:
-            f.write(f"\n\n{'*' * 30} STAGE {stage_num} OUTPUT {'*' * 30}\n\n")
+        # Write to the summary
+        summary.append(f"\n\n{'*' * 30} STAGE {stage_num} OUTPUT {'*' * 30}\n\n")
         
         # Also print to console
         print(f"\n\n{'*' * 30} STAGE {stage_num} OUTPUT {'*' * 30}\n")
@@ -473,17 +435,15 @@ def print_training_summary(node: HivemindNode):
             question_text = outputs.get('question', 'N/A')
             print(f"CLIENT QUESTION:\n{question_text}\n")
             
-            # Write to file
-            with open(file_path, "a") as f:
-                f.write(f"CLIENT QUESTION:\n{question_text}\n\n")
+            # Write to the summary
+            summary.append(f"CLIENT QUESTION:\n{question_text}\n\n")
             
             if "responses" in outputs and outputs["responses"]:
                 response_text = outputs['responses'][0]
                 print(f"THERAPIST RESPONSE:\n{response_text}\n")
                 
-                # Write to file
-                with open(file_path, "a") as f:
-                    f.write(f"THERAPIST RESPONSE:\n{response_text}\n\n")
+                # Write to the summary
+                summary.append(f"THERAPIST RESPONSE:\n{response_text}\n\n")
         
         # Stage 1: Comparing Therapeutic Responses
         elif stage_num == 1:
@@ -491,9 +451,8 @@ def print_training_summary(node: HivemindNode):
                 supervisor_text = outputs['responses'][0]
                 print(f"SUPERVISOR EVALUATION:\n{supervisor_text}\n")
                 
-                # Write to file
-                with open(file_path, "a") as f:
-                    f.write(f"SUPERVISOR EVALUATION:\n{supervisor_text}\n\n")
+                # Write to the summary
+                summary.append(f"SUPERVISOR EVALUATION:\n{supervisor_text}\n\n")
         
         # Stage 2: Final Integration
         elif stage_num == 2:
@@ -501,17 +460,16 @@ def print_training_summary(node: HivemindNode):
                 synthesis_text = outputs['responses'][0]
                 print(f"CLINICAL DIRECTOR SYNTHESIS:\n{synthesis_text}\n")
                 
-                # Write to file
-                with open(file_path, "a") as f:
-                    f.write(f"CLINICAL DIRECTOR SYNTHESIS:\n{synthesis_text}\n\n")
+                # Write to the summary
+                summary.append(f"CLINICAL DIRECTOR SYNTHESIS:\n{synthesis_text}\n\n")
     
     # End of summary
     print("=" * 80)
     print("END OF TRAINING SUMMARY")
     print("=" * 80)
     
-    # Write end of summary to file
-    with open(file_path, "a") as f:
-        f.write("=" * 80 + "\n")
-        f.write("END OF TRAINING SUMMARY\n")
-        f.write("=" * 80 + "\n")
+    # Write end of summary to the session store
+    summary.append("=" * 80 + "\n")
+    summary.append("END OF TRAINING SUMMARY\n")
+    summary.append("=" * 80 + "\n")
+    session_store.append("text", "".join(summary))
@@ -1,6 +1,7 @@
 import logging
 import time
 from collections import defaultdict
+from functools import partial
 from typing import Sequence
 
 import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
@@ -11,9 +12,11 @@ from hivemind_exp.dht_utils import (
     HivemindNode,
     get_dht_value,
     get_outputs,
+    get_outputs_batch,
     rewards_key,
 )
 from hivemind_exp.gsm8k.generate_prompts import get_stage2_samples, get_stage3_samples
+from hivemind_exp.gsm8k.round_winners import RoundWinnerScorer
 from hivemind_exp.gsm8k.stage_merger import (
     Any,
     merge_stage1_question,
@@ -23,6 +26,14 @@ from hivemind_exp.hivemind_utils import SingleStageData, StageData
 
 
 def merged_prev_stage_datasets(
+    dht: DHT, node: HivemindNode, r: int, s: int, merge_fn, samples_fn, **kwargs
+):
+    return prev_stage_datasets_builder(
+        dht, node, r, s, merge_fn, samples_fn, **kwargs
+    )()
+
+
+def prev_stage_datasets_builder(
     dht: DHT,
     node: HivemindNode,
     r: int,
@@ -32,6 +43,9 @@ def merged_prev_stage_datasets(
     dht_sample_limit = 200,
     check_interval: float = 5,
     wait_timeout: float = 10,
+    fetch_concurrency: int = 32,
+    fetch_timeout: float = 10,
+    fetch_deadline: float = 30,
     log_tag=None,
 ):
     if not log_tag:
@@ -39,6 +53,8 @@ def merged_prev_stage_datasets(
 
     logger = logging.getLogger(f"{__name__}:{log_tag}")
 
+    # Collects and merges samples now; datasets are built when the returned
+    # function is called, so collection can be repeated ahead of time.
     merged_qs = []
 
     # Retrieves and merges last stage samples locally and from DHT.
@@ -68,28 +84,51 @@ def merged_prev_stage_datasets(
 
     # Add other nodes' samples iff rewards are available.
     if prev_rewards:
-        node_keys = prev_rewards.keys()
+        # Peers are asked in batches of as many as could still be needed;
+        # some have rewards but no outputs or don't answer in time.
+        node_keys = [k for k in prev_rewards.keys() if k != node.key]
+        end_time = time.monotonic() + fetch_deadline
         dht_sample_count = 0
-        for node_key in node_keys:
-            if dht_sample_count > dht_sample_limit:
+        timed_out = 0
+        while node_keys and dht_sample_count <= dht_sample_limit:
+            remaining = end_time - time.monotonic()
+            if remaining <= 0:
                 break
+            wanted = dht_sample_limit + 1 - dht_sample_count
+            batch_keys, node_keys = node_keys[:wanted], node_keys[wanted:]
+            batch = get_outputs_batch(
+                dht,
+                batch_keys,
+                r,
+                s - 1,
+                max_concurrency=fetch_concurrency,
+                request_timeout=fetch_timeout,
+                deadline=remaining,
+            )
+            timed_out += len(batch.timed_out)
 
-            if node_key == node.key:
-                continue
-            try:
-                prev_node_outputs = get_outputs(dht, node_key, r, s - 1)
-                for item in prev_node_outputs.items():
+            for node_key in batch_keys:
+                if dht_sample_count > dht_sample_limit:
+                    break
+
+                if node_key not in batch.outputs:
+                    # Skip this node's answers for the current round and stage.
+                    logger.debug(
+                        f"Found rewards published for node: {node_key} but no outputs!"
+                    )
+                    continue
+
+                for item in batch.outputs[node_key].items():
                     prev_items[node_key].append(item)
 
                     dht_sample_count += 1
                     if dht_sample_count > dht_sample_limit:
                         break
 
-            except ValueError:
-                # Skip this node's answers for the current round and stage.
-                logger.debug(
-                    f"Found rewards published for node: {node_key} but no outputs!"
-                )
+        if timed_out:
+            logger.info(
+                f"Timed out fetching round {r} stage {s - 1} outputs from {timed_out} peers"
+            )
 
     # Group samples by question hash.
     q_to_keyed_items: dict[str, dict[str, Any]] = defaultdict(dict)
@@ -103,7 +142,7 @@ def merged_prev_stage_datasets(
         merged = merge_fn(outputs)
         merged_qs.append(merged)
 
-    return samples_fn(merged_qs)
+    return partial(samples_fn, merged_qs)
 
 
 def gsm8k_stage_data(
@@ -113,6 +152,7 @@ def gsm8k_stage_data(
     initial_test_dataset,
     check_interval: float = 5,
     log_tag=None,
+    long_format: bool = False,
 ):
     def cumulative_reward_0(**kwargs):
         return stage1_rewards.hivemind_cumulative_reward(node, **kwargs)
@@ -120,63 +160,67 @@ def gsm8k_stage_data(
     def cumulative_reward_1(**kwargs):
         return stage2_rewards.hivemind_cumulative_reward(node, **kwargs)
 
+    winner_scorer = RoundWinnerScorer()
+
     def cumulative_reward_2(**kwargs):
-        return stage3_rewards.hivemind_cumulative_reward(node, **kwargs)
+        rewards = stage3_rewards.hivemind_cumulative_reward(node, **kwargs)
+        # Score our own outputs for round winners while the stage runs.
+        winner_scorer.submit(node.round_num, node.key, node.outputs)
+        return rewards
 
-    def stage2_datasets_fn(r, s):
-        return merged_prev_stage_datasets(
+    def stage2_prefetch_fn(r, s):
+        return prev_stage_datasets_builder(
             dht,
             node,
             r,
             s,
             merge_stage1_question,
-            get_stage2_samples,
+            partial(get_stage2_samples, long_format=long_format),
             check_interval=check_interval,
             log_tag=log_tag,
         )
 
-    def stage3_datasets_fn(r, s):
-        return merged_prev_stage_datasets(
+    def stage3_prefetch_fn(r, s):
+        return prev_stage_datasets_builder(
             dht,
             node,
             r,
             s,
             merge_stage2_question,
-            get_stage3_samples,
+            partial(get_stage3_samples, long_format=long_format),
             check_interval=check_interval,
             log_tag=log_tag,
         )
 
-    def round_winners(limit=10) -> Sequence[str]:
-        final_stage_outputs, _ = merged_prev_stage_datasets(
+    def get_final_stage_outputs(r):
+        outputs, _ = merged_prev_stage_datasets(
             dht,
             node,
-            node.round_num,
+            r,
             3,
             lambda x: x,
             lambda v: (v, v),
             check_interval=check_interval,
             log_tag=log_tag,
         )
-        rewards = defaultdict(float)
-        for outputs in final_stage_outputs:
-            for node_key, output in outputs.items():
-                prompts = [
-                    [
-                        {"role": "system", "content": output["question"]},
-                        {"role": "system", "content": output["stage3_prompt"]},
-                    ],
-                ]
-                final_answer = next(iter(output["final_agent_decision"].items()))[1]
-                completions = [[{"role": "assistant", "content": final_answer}]]
-                cumulative_reward_2(prompts=prompts, completions=completions, **output)
-                rewards[node_key] += sum(node.rewards)
-
-        rewards = sorted(list(rewards.items()), key=lambda x: x[1], reverse=True)
-        return [n for n, _ in rewards][:limit]
+        return outputs
+
+    def round_winner_prefetch_fn(r, s):
+        # Score peers' final-stage outputs as they're published, not all at round end.
+        outputs = get_final_stage_outputs(r)
+        for keyed_outputs in outputs:
+            for node_key, output in keyed_outputs.items():
+                winner_scorer.submit(r, node_key, output)
+        return lambda: outputs
+
+    def round_winners(limit=10) -> Sequence[str]:
+        final_stage_outputs = get_final_stage_outputs(node.round_num)
+        winner_scorer.forget(node.round_num)
+        return winner_scorer.winners(node.round_num, final_stage_outputs, limit)
 
     return StageData(
         round_winner_fn=round_winners,
+        round_winner_prefetch_fn=round_winner_prefetch_fn,
         stages=[
             SingleStageData(
                 name="0",
@@ -200,7 +244,8 @@ def gsm8k_stage_data(
                     stage2_rewards.xmlcount_reward_func,
                     cumulative_reward_1,
                 ],
-                datasets_fn=stage2_datasets_fn,  # type: ignore
+                datasets_fn=lambda r, s: stage2_prefetch_fn(r, s)(),  # type: ignore
+                prefetch_fn=stage2_prefetch_fn,
             ),
             SingleStageData(
                 name="2",
@@ -214,7 +259,8 @@ def gsm8k_stage_data(
                     stage3_rewards.xmlcount_reward_func,
                     cumulative_reward_2,
                 ],
-                datasets_fn=stage3_datasets_fn,  # type: ignore
+                datasets_fn=lambda r, s: stage3_prefetch_fn(r, s)(),  # type: ignore
+                prefetch_fn=stage3_prefetch_fn,
             ),
         ],
     )
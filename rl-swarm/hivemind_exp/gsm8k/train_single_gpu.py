@@ -1,5 +1,4 @@
 import logging
-import os
 import colorlog
 from trl import GRPOConfig, ModelConfig, TrlParser
 import time
@@ -11,6 +10,7 @@ from hivemind_exp.chain_utils import (
     WalletSwarmCoordinator,
     setup_web3,
 )
+from hivemind_exp.chat_ingest import chat_ingest
 from hivemind_exp.gsm8k.generate_prompts import get_stage1_samples, get_user_input_samples, get_user_input_with_supervisor_simulation, get_user_input_with_continuous_conversation, record_therapist_answer
 from hivemind_exp.runner.gensyn.testnet_grpo_runner import (
     TestnetGRPOArguments,
@@ -18,105 +18,83 @@ from hivemind_exp.runner.gensyn.testnet_grpo_runner import (
 )
 from hivemind_exp.runner.grpo_runner import GRPOArguments, GRPORunner
 from hivemind_exp.gsm8k.stage3_rewards import print_training_summary
+from hivemind_exp.session_store import session_store
 
 # Create a custom output recorder
-def record_model_output(output, file_path=None, conversation_mode=False):
+def record_model_output(output, store=None, conversation_mode=False):
     """
-    Record the model's output to a file.
+    Record the model's output to the supervisor session store.
     
     Parameters:
     - output: The output to record
-    - file_path: The path to the file to record to (defaults to supervisor_content.txt in root directory)
+    - store: The SessionStore to record to (defaults to the shared session store)
     - conversation_mode: If True, format output for continuous conversation
     """
-    if file_path is None:
-        # Get the path to the rl-swarm directory
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        root_dir = os.path.dirname(os.path.dirname(current_dir))
-        file_path = os.path.join(root_dir, "supervisor_content.txt")
+    store = store or session_store
     
-    # Get the current response number by counting existing responses in the file
-    response_num = 1
-    try:
-        with open(file_path, "r") as f:
-            content = f.read()
-            response_num = content.count("<model_response") + 1
-    except:
-        # If file doesn't exist or can't be read, start with response 1
-        pass
+    # The store numbers responses and adds the separator line when rendered
+    response_num = store.append("model_response", output, conversation=conversation_mode)
     
-    with open(file_path, "a") as f:
-        # Add a clear separator between entries with response number
-        if conversation_mode:
-            f.write(f"<model_response #{response_num} conversation=\"ongoing\">\n{output}\n</model_response>\n\n")
-        else:
-            f.write(f"<model_response #{response_num}>\n{output}\n</model_response>\n\n")
-        f.write("-" * 80 + "\n\n")  # Add a separator line for readability
-    
-    print(f"Model output (Response #{response_num}) recorded to {file_path}")
+    print(f"Model output (Response #{response_num}) recorded to {store.root}")
+    return response_num
 
-# Custom logging handler that writes to both console and file
+# Custom logging handler that writes to both console and the session store
 class DualHandler(logging.Handler):
-    def __init__(self, file_path):
+    def __init__(self, store):
         super().__init__()
-        self.file_path = file_path
+        self.store = store
         
     def emit(self, record):
         log_entry = self.format(record)
-        # Write to the file
-        with open(self.file_path, "a") as f:
-            f.write(log_entry + "\n")
+        # Write to the session store
+        self.store.append("text", log_entry + "\n")
 
 # Function to record all data from round_cache
-def record_complete_round_cache(node, file_path):
+def record_complete_round_cache(node, store):
     """
-    Record the complete round_cache data to the supervisor_content.txt file.
+    Record the complete round_cache data to the supervisor session store.
     
     Parameters:
     - node: The HivemindNode instance containing the round_cache
-    - file_path: Path to the supervisor_content.txt file
+    - store: The SessionStore to record to
     """
     if not hasattr(node, 'round_cache'):
         return
         
-    with open(file_path, "a") as f:
-        f.write("\n\n# Complete Round Cache Data\n\n")
+    lines = ["\n\n# Complete Round Cache Data\n\n"]
+    
+    for stage, cache_data in node.round_cache.items():
+        round_num, stage_num = stage
+        lines.append(f"## Round {round_num}, Stage {stage_num} Complete Data\n\n")
         
-        for stage, cache_data in node.round_cache.items():
-            round_num, stage_num = stage
-            f.write(f"## Round {round_num}, Stage {stage_num} Complete Data\n\n")
+        for q_hash, (timestamp, outputs) in cache_data.items():
+            lines.append(f"### Hash: {q_hash}\n")
+            lines.append(f"Timestamp: {timestamp}\n\n")
+            
+            # Write all outputs
+            for key, value in outputs.items():
+                if isinstance(value, (list, dict)):
+                    try:
+                        # Try to format as JSON for better readability
+                        value_str = json.dumps(value, indent=2)
+                        lines.append(f"#### {key}:\n```\n{value_str}\n```\n\n")
+                    except:
+                        # Fallback if not JSON serializable
+                        lines.append(f"#### {key}:\n{str(value)}\n\n")
+                else:
+                    # Handle string values with nice formatting
+                    lines.append(f"#### {key}:\n{str(value)}\n\n")
             
-            for q_hash, (timestamp, outputs) in cache_data.items():
-                f.write(f"### Hash: {q_hash}\n")
-                f.write(f"Timestamp: {timestamp}\n\n")
-                
-                # Write all outputs
-                for key, value in outputs.items():
-                    if isinstance(value, (list, dict)):
-                        try:
-                            # Try to format as JSON for better readability
-                            value_str = json.dumps(value, indent=2)
-                            f.write(f"#### {key}:\n```\n{value_str}\n```\n\n")
-                        except:
-                            # Fallback if not JSON serializable
-                            f.write(f"#### {key}:\n{str(value)}\n\n")
-                    else:
-                        # Handle string values with nice formatting
-                        f.write(f"#### {key}:\n{str(value)}\n\n")
-                
-                f.write("-" * 80 + "\n\n")
+            lines.append("-" * 80 + "\n\n")
+    
+    # One record for the whole dump
+    store.append("text", "".join(lines))
 
 def main():
-    # Get path to supervisor_content.txt file
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    root_dir = os.path.dirname(os.path.dirname(current_dir))
-    file_path = os.path.join(root_dir, "supervisor_content.txt")
-    
-    # Append a session marker instead of clearing the file
-    with open(file_path, "a") as f:
-        f.write("\n\n# New Session " + time.strftime("%Y-%m-%d %H:%M:%S") + "\n\n")
+    # Append a session marker instead of clearing the session log
+    session_store.append("text", "\n\n# New Session " + time.strftime("%Y-%m-%d %H:%M:%S") + "\n\n")
     
-    print(f"Added new session marker to {file_path}")
+    print(f"Added new session marker to {session_store.root}")
     
     # Setup logging.
     root_logger = logging.getLogger()
@@ -129,13 +107,13 @@ def main():
     )
     root_logger.addHandler(console_handler)
     
-    # Add file handler to also log everything to supervisor_content.txt
-    file_handler = DualHandler(file_path)
+    # Add a handler to also log everything to the session store
+    file_handler = DualHandler(session_store)
     file_handler.setFormatter(logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
     root_logger.addHandler(file_handler)
     
     # Log the start of recording
-    root_logger.info("Starting complete log recording to supervisor_content.txt")
+    root_logger.info("Starting complete log recording to the session store")
 
     # Add command-line argument for continuous conversation mode
     parser = argparse.ArgumentParser(description="Run the training loop")
@@ -167,25 +145,25 @@ def main():
 
     # Run training
     trainer = runner.run(model_args, grpo_args, training_args, data_getter)
+    # The chat.json messages were trained on; don't read them again.
+    chat_ingest.commit()
     
     # Make sure the summary is printed
     if trainer and hasattr(trainer, 'node'):
         print_training_summary(trainer.node)
         
         # Record all data from round_cache for completeness
-        record_complete_round_cache(trainer.node, file_path)
+        record_complete_round_cache(trainer.node, session_store)
         
-        # Record the model's outputs to supervisor_content.txt
+        # Record the model's outputs to the session store
         if hasattr(trainer.node, 'round_cache'):
             # Add a section header for model responses
-            with open(file_path, "a") as f:
-                f.write("\n# Detailed Model Responses\n\n")
+            session_store.append("text", "\n# Detailed Model Responses\n\n")
             
             # Record each stage's responses
             for stage in [(0, 0), (0, 1), (0, 2)]:
                 if stage in trainer.node.round_cache:
-                    with open(file_path, "a") as f:
-                        f.write(f"\n## Stage {stage[1]} Responses\n\n")
+                    session_store.append("text", f"\n## Stage {stage[1]} Responses\n\n")
                     
                     for q_hash, (timestamp, outputs) in trainer.node.round_cache[stage].items():
                         if 'responses' in outputs and outputs['responses']:
@@ -209,8 +187,7 @@ def main():
                     follow_up = input("\nYour follow-up message: ")
                     
                     # Record the user's follow-up
-                    with open(file_path, "a") as f:
-                        f.write(f"\n<user_message>\n{follow_up}\n</user_message>\n\n")
+                    session_store.append("text", f"\n<user_message>\n{follow_up}\n</user_message>\n\n")
                     
                     # Run the model again with this follow-up
                     # This is a simplified re-run to demonstrate the concept
@@ -221,7 +198,7 @@ def main():
                     therapist_response = f"Thank you for sharing more. I understand your concerns about '{follow_up[:30]}...' Let me help you further with this situation."
                     
                     # Record as both a model response and a therapist answer
-                    record_model_output(
+                    response_num = record_model_output(
                         f"FOLLOW-UP RESPONSE:\n{therapist_response}",
                         conversation_mode=True
                     )
@@ -234,5 +211,8 @@ def main():
                     
                     continue_conversation = input("\nWould you like to continue the conversation? (y/n): ")
 
+    # The store appends each record's rendered text as it goes
+    print(f"Session log recorded to {session_store.content_path}")
+
 if __name__ == "__main__":
     main()
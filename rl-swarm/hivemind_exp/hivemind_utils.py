@@ -36,7 +36,8 @@ class HivemindNode:
     def get_stage_outputs(self, r, s) -> dict[str, tuple[float, dict]] | None:
         key = (r, s)
         if key in self.round_cache:
-            return self.round_cache[key]
+            # Copy; may be read from a prefetch thread while training adds to it.
+            return dict(self.round_cache[key])
 
     def put_stage_outputs(self, r, s, question, value: tuple[float, dict]):
         self.round_cache[(r, s)][question] = value
@@ -50,6 +51,13 @@ DatasetsFn = Callable[
     [int, int], tuple[torch.utils.data.Dataset, torch.utils.data.Dataset]
 ]
 
+# Takes round + stage. Collects what the stage needs now and returns a function
+# that builds the train / test datasets from it.
+PrefetchFn = Callable[
+    [int, int],
+    Callable[[], tuple[torch.utils.data.Dataset, torch.utils.data.Dataset]],
+]
+
 MergeFn = Callable[[list], dict[str, dict]]
 LossFn = Callable[[list], dict[str, float]]
 
@@ -59,6 +67,7 @@ class SingleStageData:
     name: str
     reward_funcs: list[Callable]
     datasets_fn: DatasetsFn  # For train / test datasets.
+    prefetch_fn: PrefetchFn | None = None  # Used instead when prefetching.
 
 
 @dataclass
@@ -70,6 +79,14 @@ class StageData:
     train_timeout: int = 60 * 60 * 24 * 4  # days
     round_timeout: int = 60 * 60 * 4  # hours
 
+    # Collect the next stage's datasets in the background while training.
+    prefetch: bool = False
+    prefetch_interval: float = 30.0  # seconds between refreshes
+    prefetch_max_age: float = 120.0  # seconds; older prefetches aren't used
+    # Collects the final stage's outputs in the background while it trains,
+    # e.g. to score them for round winners as they arrive.
+    round_winner_prefetch_fn: PrefetchFn | None = None
+
     def __len__(self):
         return len(self.stages)
 
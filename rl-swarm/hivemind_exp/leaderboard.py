@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, NamedTuple
+
+from hivemind.dht import DHT
+from hivemind.utils import get_dht_time
+
+from hivemind_exp.dht_publisher import DHTPublisher
+from hivemind_exp.dht_utils import (
+    get_dht_value,
+    leaderboard_delta_key,
+    leaderboard_key,
+    rewards_key,
+)
+from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.stage_timeline import timeline_span
+
+logger = logging.getLogger(__name__)
+
+
+def sorted_leaderboard(rewards: dict[str, Any]) -> list[tuple[str, Any]]:
+    # Sorted list of (node_key, reward) pairs.
+    return list(sorted(rewards.items(), key=lambda t: (t[1], t[0]), reverse=True))
+
+
+def rewards_digest(rewards: dict[str, Any]) -> str:
+    encoded = json.dumps(sorted(rewards.items()), default=str).encode()
+    return hashlib.md5(encoded).hexdigest()
+
+
+class LeaderboardDelta(NamedTuple):
+    # Stored as a plain tuple; a dict value would read back as DHT subkeys.
+    version: int
+    base_version: int
+    digest: str
+    upserts: list[tuple[str, Any]]
+    removed: list[str]
+
+
+def leaderboard_delta(
+    prev: dict[str, Any], curr: dict[str, Any], version: int
+) -> LeaderboardDelta:
+    """Compact diff between two rewards dicts; applies on top of `version - 1`."""
+    return LeaderboardDelta(
+        version=version,
+        base_version=version - 1,
+        digest=rewards_digest(curr),
+        upserts=[(k, v) for k, v in curr.items() if prev.get(k) != v],
+        removed=[k for k in prev if k not in curr],
+    )
+
+
+@dataclass
+class LeaderboardView:
+    """Reader-side leaderboard state that is kept current by applying deltas."""
+
+    round_num: int = -1
+    stage: int = -1
+    version: int = 0
+    rewards: dict[str, Any] = field(default_factory=dict)
+
+    def reset(self, round_num, stage, rewards: dict[str, Any], version: int = 0):
+        self.round_num, self.stage = round_num, stage
+        self.rewards = dict(rewards)
+        self.version = version
+
+    def apply(self, round_num, stage, delta: tuple) -> bool:
+        """Returns False if the delta doesn't chain onto this view; resync instead."""
+        delta = LeaderboardDelta(*delta)
+        if (round_num, stage) != (self.round_num, self.stage):
+            return False
+        if delta.version == self.version:
+            return True
+        if delta.base_version != self.version:
+            return False
+
+        rewards = dict(self.rewards)
+        rewards.update(delta.upserts)
+        for k in delta.removed:
+            rewards.pop(k, None)
+        if rewards_digest(rewards) != delta.digest:
+            return False
+
+        self.rewards = rewards
+        self.version = delta.version
+        return True
+
+    def leaderboard(self) -> list[tuple[str, Any]]:
+        return sorted_leaderboard(self.rewards)
+
+
+class LeaderboardAggregator:
+    """
+    Coordinator-side leaderboard publisher.
+
+    Polls the current round/stage rewards on its own timer and only re-sorts
+    and republishes when their content changed. Every change bumps a version
+    and publishes a delta next to the full leaderboard.
+    """
+
+    def __init__(
+        self,
+        dht: DHT,
+        node: HivemindNode,
+        publisher: DHTPublisher,
+        interval: float = 10.0,
+        log: logging.Logger | None = None,
+    ):
+        self.dht = dht
+        self.node = node
+        self.publisher = publisher
+        self.interval = interval
+        self.logger = log or logger
+
+        self.view = LeaderboardView()
+        self._digest = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self, r: int, s: int) -> bool:
+        """Publishes the leaderboard for (r, s) if rewards changed since the last call."""
+        with timeline_span(self.dht, "publish_leaderboard", round_num=r, stage=s):
+            return self._refresh(r, s)
+
+    def _refresh(self, r: int, s: int) -> bool:
+        curr_rewards: dict[str, Any] | None = get_dht_value(
+            self.dht, key=rewards_key(r, s), latest=True
+        )
+        if not curr_rewards:
+            self.logger.info(f"Can't retrieve round {r} stage {s} rewards")
+            return False
+
+        with self._lock:
+            if (r, s) != (self.view.round_num, self.view.stage):
+                self.view.reset(r, s, {})
+                self._digest = None
+
+            digest = rewards_digest(curr_rewards)
+            if digest == self._digest:
+                return False
+
+            version = self.view.version + 1
+            delta = leaderboard_delta(self.view.rewards, curr_rewards, version)
+            self.view.reset(r, s, curr_rewards, version)
+            self._digest = digest
+            leaderboard = self.view.leaderboard()
+
+        expiration_time = get_dht_time() + self.node.out_expiration
+        self.publisher.store(
+            key=leaderboard_key(r, s),
+            value=leaderboard,
+            expiration_time=expiration_time,
+        )
+        self.publisher.store(
+            key=leaderboard_delta_key(r, s),
+            value=tuple(delta),
+            expiration_time=expiration_time,
+        )
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh(self.node.round_num, self.node.stage_num)
+            except Exception as e:
+                self.logger.warning(f"Leaderboard refresh failed: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="leaderboard-aggregator", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+# Marks a (node_key, round, stage) that had no outputs in the DHT.
+_MISSING = object()
+
+
+@dataclass
+class OutputsCacheStats:
+    hits: int = 0
+    negative_hits: int = 0  # Served a cached "no outputs" answer.
+    misses: int = 0
+    evictions: int = 0  # Dropped because the cache was full.
+    expirations: int = 0
+    invalidations: int = 0
+    unsettled: int = 0  # Open stage outputs not yet seen unchanged; asked again.
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class OutputsCache:
+    """
+    Bounded TTL cache for peer stage outputs, keyed by (node_key, round, stage).
+
+    Found outputs live for `ttl` seconds so peers that published partial
+    outputs early are eventually re-read. Peers with no outputs are remembered
+    for the shorter `negative_ttl`. Peers may still be publishing outputs of
+    the open (round, stage), the one being trained, so those are only served
+    once settled: fetched again and found unchanged, e.g. by a later prefetch
+    refresh. Until then lookups miss, and peers still publishing are asked
+    every time. Entries for a round can be dropped explicitly once it ends.
+    """
+
+    def __init__(
+        self, ttl: float = 60.0, negative_ttl: float = 5.0, max_entries: int = 1024
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.stats = OutputsCacheStats()
+        self.open_stage: tuple[int, int] | None = None
+
+        # (expires at, outputs, settled)
+        self._entries: OrderedDict[tuple[str, int, int], tuple[float, Any, bool]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def lookup(self, node_key: str, r, s) -> tuple[bool, Any]:
+        """
+        Returns (found, outputs). A cached miss is returned as (True, None);
+        (False, None) means the DHT has to be asked.
+        """
+        key = (node_key, r, s)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return False, None
+
+            expires_at, value, settled = entry
+            if time.monotonic() >= expires_at:
+                if (r, s) == self.open_stage and value is not _MISSING:
+                    # Kept to compare with the next fetch.
+                    self._entries[key] = (expires_at, value, False)
+                else:
+                    del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return False, None
+            if not settled:
+                self.stats.unsettled += 1
+                self.stats.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            if value is _MISSING:
+                self.stats.negative_hits += 1
+                return True, None
+
+            self.stats.hits += 1
+            return True, value
+
+    def put(self, node_key: str, r, s, outputs: dict[str, tuple[float, dict]]):
+        key = (node_key, r, s)
+        with self._lock:
+            settled = True
+            if (r, s) == self.open_stage:
+                entry = self._entries.get(key)
+                settled = entry is not None and entry[1] == outputs
+            self._put(key, outputs, self.ttl, settled)
+
+    def put_missing(self, node_key: str, r, s):
+        with self._lock:
+            self._put((node_key, r, s), _MISSING, self.negative_ttl)
+
+    def _put(self, key, value, ttl: float, settled: bool = True):
+        # Caller holds the lock.
+        self._entries[key] = (time.monotonic() + ttl, value, settled)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def set_open_stage(self, r, s):
+        with self._lock:
+            self.open_stage = (r, s)
+            for key in [k for k in self._entries if k[1:] == (r, s)]:
+                del self._entries[key]
+                self.stats.invalidations += 1
+
+    def invalidate_round(self, r):
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == r]:
+                del self._entries[key]
+                self.stats.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
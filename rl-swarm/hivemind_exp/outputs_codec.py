@@ -0,0 +1,117 @@
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable
+
+# Wire format for values stored under outputs keys.
+#
+# v0 (legacy): (timestamp, outputs dict)
+# v1: (timestamp, (OUTPUTS_MAGIC, 1, compressed, payload))
+#     payload is JSON {"o": outputs, "r": {field: digest}}, zlib-compressed
+#     when larger than COMPRESS_MIN_BYTES. Fields listed in "r" were replaced
+#     by a digest; their text is stored once under blob_key(digest).
+OUTPUTS_MAGIC = "rlso"
+OUTPUTS_FORMAT_VERSION = 1
+
+# Strings every peer answering the same question repeats.
+SHARED_FIELDS = ("question", "answer", "stage2_prompt", "stage3_prompt")
+BLOB_MIN_CHARS = 256
+COMPRESS_MIN_BYTES = 512
+
+BlobFn = Callable[[str], str | None]  # Digest -> text.
+
+
+def blob_digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _pack(data: bytes) -> tuple[bool, bytes]:
+    if len(data) > COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return True, compressed
+    return False, data
+
+
+def _unpack(compressed: bool, data: bytes) -> bytes:
+    return zlib.decompress(data) if compressed else data
+
+
+def encode_blob(text: str) -> tuple[bool, bytes]:
+    return _pack(text.encode())
+
+
+def decode_blob(value) -> str:
+    compressed, data = value
+    return _unpack(compressed, data).decode()
+
+
+def encode_outputs(outputs: dict[str, Any]) -> tuple[tuple, dict[str, str]]:
+    """
+    Encodes one outputs dict. Returns the value to store plus the shared
+    strings (by digest) that must be published as blobs next to it.
+    """
+    outputs = dict(outputs)
+    refs, blobs = {}, {}
+    for name in SHARED_FIELDS:
+        text = outputs.get(name)
+        if isinstance(text, str) and len(text) >= BLOB_MIN_CHARS:
+            digest = blob_digest(text)
+            outputs[name] = digest
+            refs[name] = digest
+            blobs[digest] = text
+
+    payload = json.dumps({"o": outputs, "r": refs}, separators=(",", ":")).encode()
+    compressed, data = _pack(payload)
+    return (OUTPUTS_MAGIC, OUTPUTS_FORMAT_VERSION, compressed, data), blobs
+
+
+def is_encoded(outputs) -> bool:
+    return (
+        isinstance(outputs, (tuple, list))
+        and len(outputs) == 4
+        and outputs[0] == OUTPUTS_MAGIC
+    )
+
+
+def decode_outputs(outputs, get_blob: BlobFn | None = None) -> dict[str, Any]:
+    """Decodes either wire format back into a plain outputs dict."""
+    if not is_encoded(outputs):
+        return outputs
+
+    _, version, compressed, data = outputs
+    if version != OUTPUTS_FORMAT_VERSION:
+        raise ValueError(f"unsupported outputs format version: {version}")
+
+    payload = json.loads(_unpack(compressed, data))
+    decoded = payload["o"]
+    for name, digest in payload["r"].items():
+        text = get_blob(digest) if get_blob else None
+        if text is None:
+            raise ValueError(f"could not retrieve shared {name} blob {digest}")
+        decoded[name] = text
+    return decoded
+
+
+class BlobCache:
+    """Bounded LRU of blob texts. Blobs are content-addressed, so never stale."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> str | None:
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+            return self._entries.get(digest)
+
+    def put(self, digest: str, text: str):
+        with self._lock:
+            self._entries[digest] = text
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,250 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+import numpy as np
+import torch
+from transformers import BatchEncoding
+from trl.data_utils import maybe_apply_chat_template
+
+from hivemind_exp.checkpoint import tokenizer_fingerprint
+from hivemind_exp.session_store import ROOT_DIR
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CACHE_DIR = os.path.join(ROOT_DIR, "prompt_cache")
+TOKEN_DTYPE = np.dtype("<i4")
+# Entry records: system prompt hash, question hash, token offset and count,
+# template text offset and length.
+ENTRY = struct.Struct("<16s16sQIQI")
+
+TOKENS_FILE = "tokens.bin"
+TEXTS_FILE = "texts.bin"
+ENTRIES_FILE = "entries.bin"
+META_FILE = "meta.json"
+
+
+def _hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def prompt_key(prompt: Any) -> bytes | None:
+    """(system prompt hash, question hash) of a conversational prompt."""
+    if not isinstance(prompt, list):
+        return None
+    system = "".join(m["content"] for m in prompt if m["role"] == "system")
+    question = json.dumps([m for m in prompt if m["role"] != "system"], sort_keys=True)
+    return _hash(system) + _hash(question)
+
+
+def cache_namespace(tokenizer, revision: str | None) -> dict[str, str]:
+    return {
+        "tokenizer": tokenizer.name_or_path,
+        "revision": revision or "main",
+        "chat_template": _hash(getattr(tokenizer, "chat_template", None) or "").hex(),
+        "fingerprint": tokenizer_fingerprint(tokenizer),
+    }
+
+
+@dataclass
+class PromptCacheStats:
+    hits: int = 0  # Batches served from the cache.
+    misses: int = 0  # Batches with an uncached prompt, left to the tokenizer.
+    added: int = 0  # Prompts templated and tokenized into the cache.
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class CachedPromptTokenizer:
+    """
+    Stands in for the tokenizer while TRL prepares a batch of cached
+    prompts: their chat template text and token ids come from the cache,
+    everything else goes to `tokenizer`.
+    """
+
+    def __init__(self, tokenizer, entries: dict[bytes, tuple[str, np.ndarray]]):
+        self.tokenizer = tokenizer
+        self._texts = {key: text for key, (text, _) in entries.items()}
+        self._ids = {text: ids for text, ids in entries.values()}
+
+    def __getattr__(self, name):
+        return getattr(self.tokenizer, name)
+
+    def apply_chat_template(self, conversation, *args, **kwargs):
+        text = self._texts.get(prompt_key(conversation))
+        if text is None or kwargs.get("tokenize", True):
+            return self.tokenizer.apply_chat_template(conversation, *args, **kwargs)
+        return text
+
+    def __call__(self, text, *args, **kwargs):
+        if (
+            args
+            or not isinstance(text, list)
+            or kwargs.get("return_tensors") != "pt"
+            or not all(t in self._ids for t in text)
+        ):
+            return self.tokenizer(text, *args, **kwargs)
+
+        ids = [self._ids[t] for t in text]
+        width = max(len(i) for i in ids)
+        left = kwargs.get("padding_side", self.tokenizer.padding_side) == "left"
+        input_ids = torch.full((len(ids), width), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(ids), width), dtype=torch.long)
+        for row, i in enumerate(ids):
+            cols = slice(width - len(i), width) if left else slice(0, len(i))
+            input_ids[row, cols] = torch.from_numpy(i.astype(np.int64))
+            attention_mask[row, cols] = 1
+        return BatchEncoding({"input_ids": input_ids, "attention_mask": attention_mask})
+
+
+class PromptCache:
+    """
+    Persistent cache of chat-templated, tokenized prompts.
+
+    Stage 0 prompts are the same every round, so they're templated and
+    tokenized once and kept under `<root>/<namespace>/`, where the namespace
+    digests the tokenizer name, revision, chat template and vocabulary.
+    Token ids are appended to a memory-mapped int32 file and template texts
+    to a byte file; fixed-size ENTRY records keyed by system prompt and
+    question hash hold their offsets. Data is written before its entry, so
+    a crash leaves at most unreferenced bytes, which later appends skip.
+    Appends from other processes sharing the directory are serialized with
+    a file lock and picked up by the next `add`.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        root: str = PROMPT_CACHE_DIR,
+        revision: str | None = None,
+        log: logging.Logger | None = None,
+    ):
+        self.tokenizer = tokenizer
+        self.namespace = cache_namespace(tokenizer, revision)
+        digest = hashlib.blake2b(
+            json.dumps(self.namespace, sort_keys=True).encode(), digest_size=8
+        ).hexdigest()
+        self.path = os.path.join(root, digest)
+        self.logger = log or logger
+        self.stats = PromptCacheStats()
+
+        self._entries: dict[bytes, tuple[int, int, int, int]] = {}
+        self._entries_size = 0
+        self._tokens = np.empty(0, dtype=TOKEN_DTYPE)
+        self._texts = np.empty(0, dtype=np.uint8)
+        self._lock = threading.Lock()
+
+        os.makedirs(self.path, exist_ok=True)
+        meta = os.path.join(self.path, META_FILE)
+        if not os.path.exists(meta):
+            with open(meta, "w") as f:
+                json.dump(self.namespace, f, indent=2)
+        with self._locked():
+            self._read_entries()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _locked(self):
+        lock = open(self._file(ENTRIES_FILE), "ab")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock  # Closing the file releases the lock.
+
+    def _map(self, name: str, dtype) -> np.ndarray:
+        path = self._file(name)
+        count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+    def _read_entries(self):
+        """Reads entries appended since the last call. Caller holds the file lock."""
+        self._tokens = self._map(TOKENS_FILE, TOKEN_DTYPE)
+        self._texts = self._map(TEXTS_FILE, np.dtype(np.uint8))
+        with open(self._file(ENTRIES_FILE), "rb") as f:
+            f.seek(self._entries_size)
+            data = f.read()
+
+        valid = 0
+        for (system, question, start, count, text_start, text_len) in ENTRY.iter_unpack(
+            data[: len(data) - len(data) % ENTRY.size]
+        ):
+            if start + count > len(self._tokens) or text_start + text_len > len(self._texts):
+                break
+            self._entries[system + question] = (start, count, text_start, text_len)
+            valid += ENTRY.size
+
+        if valid < len(data):
+            self.logger.warning(f"Dropping {len(data) - valid} bytes of torn prompt cache entries")
+            os.truncate(self._file(ENTRIES_FILE), self._entries_size + valid)
+        self._entries_size += valid
+
+    def lookup(self, prompt: Any) -> tuple[str, np.ndarray] | None:
+        """(Chat template text, token ids) of `prompt`, if cached."""
+        entry = self._entries.get(prompt_key(prompt))
+        if entry is None:
+            return None
+        start, count, text_start, text_len = entry
+        text = bytes(self._texts[text_start : text_start + text_len]).decode()
+        return text, np.array(self._tokens[start : start + count])
+
+    def add(self, prompts: Iterable[Any]) -> int:
+        """Templates and tokenizes the uncached prompts. Returns how many were added."""
+        with self._lock, self._locked():
+            self._read_entries()
+            missing = {}
+            for prompt in prompts:
+                key = prompt_key(prompt)
+                if key is not None and key not in self._entries:
+                    missing[key] = prompt
+            if not missing:
+                return 0
+
+            texts = [
+                maybe_apply_chat_template({"prompt": p}, self.tokenizer)["prompt"]
+                for p in missing.values()
+            ]
+            ids = self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+            entries = []
+            tokens_path = self._file(TOKENS_FILE)
+            # A torn id would misalign every offset after it.
+            if os.path.exists(tokens_path) and (torn := os.path.getsize(tokens_path) % TOKEN_DTYPE.itemsize):
+                os.truncate(tokens_path, os.path.getsize(tokens_path) - torn)
+            with open(tokens_path, "ab") as tokens, open(self._file(TEXTS_FILE), "ab") as text_file:
+                start, text_start = tokens.tell() // TOKEN_DTYPE.itemsize, text_file.tell()
+                for key, text, token_ids in zip(missing, texts, ids):
+                    encoded = text.encode()
+                    tokens.write(np.asarray(token_ids, dtype=TOKEN_DTYPE).tobytes())
+                    text_file.write(encoded)
+                    entries.append(ENTRY.pack(key[:16], key[16:], start, len(token_ids), text_start, len(encoded)))
+                    start += len(token_ids)
+                    text_start += len(encoded)
+            with open(self._file(ENTRIES_FILE), "ab") as f:
+                f.write(b"".join(entries))
+            self._read_entries()
+
+        self.stats.added += len(missing)
+        return len(missing)
+
+    def tokenizer_for(self, prompts: list[Any]) -> CachedPromptTokenizer | None:
+        """A CachedPromptTokenizer for `prompts` if all are cached, else None."""
+        entries = {}
+        for prompt in prompts:
+            cached = self.lookup(prompt)
+            if cached is None:
+                self.stats.misses += 1
+                return None
+            entries[prompt_key(prompt)] = cached
+        self.stats.hits += 1
+        return CachedPromptTokenizer(self.tokenizer, entries)
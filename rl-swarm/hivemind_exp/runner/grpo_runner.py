@@ -9,9 +9,13 @@ from huggingface_hub import login
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from trl import GRPOConfig, ModelConfig
 
+from hivemind_exp.gsm8k.generate_prompts import set_prompt_packer
+from hivemind_exp.gsm8k.prompt_packer import PROMPT_TEMPLATE_TOKENS, PromptPacker
+from hivemind_exp.gsm8k.reward_engine import set_reward_workers
 from hivemind_exp.gsm8k.stage_utils import gsm8k_stage_data
 from hivemind_exp.hivemind_utils import HivemindNode
 from hivemind_exp.name_utils import get_name_from_peer_id
+from hivemind_exp.prompt_cache import PromptCache
 from hivemind_exp.trainer.hivemind_grpo_trainer import HivemindGRPOTrainer
 
 logger = logging.getLogger(__name__)
@@ -24,6 +28,21 @@ class GRPOArguments:
     host_maddr: str | None = None
     identity_path: str | None = None
     max_rounds: int = 100
+    # Collect the next stage's inputs in the background while training, so
+    # building its datasets afterwards mostly hits warm caches.
+    prefetch_stage_datasets: bool = False
+    # Serve the per-phase timeline as Prometheus text on this port.
+    metrics_port: int | None = None
+    # Processes for heavy reward functions; 0 runs them in the training thread.
+    reward_workers: int = 0
+    # Fit stage 2/3 prompts into max_prompt_length tokens instead of a fixed
+    # number of answers.
+    pack_prompts: bool = True
+    # Build stage 2/3 datasets in memory with agents as nested columns,
+    # instead of one padded column per agent.
+    long_format_merge: bool = False
+    # Keep templated, tokenized stage 0 prompts on disk across rounds and restarts.
+    cache_prompts: bool = True
 
     # Model arguments
     dataset_id_or_path: str = "openai/gsm8k"
@@ -147,8 +166,16 @@ class GRPORunner:
         else:
             node = HivemindNode.coordinator(model_name_or_path, str(dht.peer_id))
 
-        stage_data = gsm8k_stage_data(dht, node, train_dataset, test_dataset)
+        stage_data = gsm8k_stage_data(
+            dht, node, train_dataset, test_dataset, long_format=grpo_args.long_format_merge
+        )
         stage_data.max_rounds = grpo_args.max_rounds
+        stage_data.prefetch = grpo_args.prefetch_stage_datasets
+        set_reward_workers(grpo_args.reward_workers)
+        if grpo_args.pack_prompts and training_args.max_prompt_length:
+            set_prompt_packer(
+                PromptPacker(tokenizer, training_args.max_prompt_length - PROMPT_TEMPLATE_TOKENS)
+            )
         trainer = trainer_factory_fn(
             dht=dht,
             node=node,
@@ -157,6 +184,12 @@ class GRPORunner:
             config=training_args,
             stage_data=stage_data,
             log_tag=self.name,
+            metrics_port=grpo_args.metrics_port,
+            prompt_cache=(
+                PromptCache(tokenizer, revision=model_args.model_revision)
+                if grpo_args.cache_prompts
+                else None
+            ),
         )
 
         ###############
@@ -0,0 +1,187 @@
+import atexit
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_DIR = "model_output_samples"
+SAMPLE_RATE = 0.01
+# At most one sample per file this often, however many are drawn.
+SAMPLE_INTERVAL = 10.0
+MAX_FILE_BYTES = 10 * 2**20
+BACKUP_COUNT = 3
+MAX_QUEUED = 1024
+# How long exiting waits for queued samples to be written.
+EXIT_FLUSH_TIMEOUT = 10.0  # seconds
+
+
+def sample_dir(prefix: str = "multi_stage_gsm8k") -> str:
+    return f"{prefix}_samples_from_{os.getenv('HOSTNAME')}"
+
+
+@dataclass
+class SampleLoggerStats:
+    sampled: int = 0
+    rate_limited: int = 0  # Drawn, but the file had a recent sample.
+    dropped: int = 0  # Queue full.
+    written: int = 0
+    rotated: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+class SampleLogger:
+    """
+    Writes sampled model outputs under `root` on a background thread.
+
+    `sampled(name, key)` decides whether to log: the same key and file always
+    get the same answer, a `rate` fraction of keys are drawn, and each file
+    takes at most one sample per `min_interval` seconds. `write` only queues
+    the text, or, under `capture`, collects it for another process to write.
+    Files above `max_bytes` are rotated to `<name>.1` ..
+    `<name>.<backup_count>`, gzipped if `compress`. The writer is a daemon
+    thread, so `flush` before exiting; the shared logger flushes at exit.
+    """
+
+    def __init__(
+        self,
+        root: str = SAMPLE_DIR,
+        rate: float = SAMPLE_RATE,
+        min_interval: float = SAMPLE_INTERVAL,
+        max_bytes: int = MAX_FILE_BYTES,
+        backup_count: int = BACKUP_COUNT,
+        compress: bool = False,
+        max_queued: int = MAX_QUEUED,
+        log: logging.Logger | None = None,
+    ):
+        self.root = root
+        self.rate = rate
+        self.min_interval = min_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.compress = compress
+        self.max_queued = max_queued
+        self.logger = log or logger
+        self.stats = SampleLoggerStats()
+
+        self._last_sample: dict[str, float] = {}
+        self._queue: deque[tuple[str, str]] = deque()
+        self._writing = False
+        self._captured: list[tuple[str, str]] | None = None
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def sampled(self, name: str, key: str) -> bool:
+        """Whether to log the sample identified by `key` to file `name`."""
+        digest = hashlib.blake2b(f"{name}\0{key}".encode(), digest_size=8).digest()
+        if int.from_bytes(digest, "big") >= self.rate * 2**64:
+            return False
+
+        now = time.monotonic()
+        with self._cond:
+            last = self._last_sample.get(name)
+            if last is not None and now - last < self.min_interval:
+                self.stats.rate_limited += 1
+                return False
+            self._last_sample[name] = now
+            self.stats.sampled += 1
+            return True
+
+    def write(self, name: str, text: str):
+        """Queues `text` to be appended to `<root>/<name>`."""
+        with self._cond:
+            if self._captured is not None:
+                self._captured.append((name, text))
+                return
+            if len(self._queue) >= self.max_queued:
+                self.stats.dropped += 1
+                return
+            self._queue.append((name, text))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="sample-logger", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify_all()
+
+    @contextmanager
+    def capture(self) -> Iterator[list[tuple[str, str]]]:
+        """Collects the (name, text) of every `write` meanwhile, instead of queueing it."""
+        captured: list[tuple[str, str]] = []
+        with self._cond:
+            self._captured = captured
+        try:
+            yield captured
+        finally:
+            with self._cond:
+                self._captured = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                batch, self._queue = self._queue, deque()
+                self._writing = True
+
+            by_file: dict[str, list[str]] = {}
+            for name, text in batch:
+                by_file.setdefault(name, []).append(text)
+            for name, texts in by_file.items():
+                try:
+                    self._append(os.path.join(self.root, name), "".join(texts))
+                except OSError as e:
+                    self.logger.warning(f"Failed to write samples to {name}: {e}")
+
+            with self._cond:
+                self.stats.written += len(batch)
+                self._writing = False
+                self._cond.notify_all()
+
+    def _append(self, path: str, text: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) + len(text) > self.max_bytes:
+            self._rotate(path)
+        with open(path, "a") as f:
+            f.write(text)
+
+    def _backup(self, path: str, i: int) -> str:
+        return f"{path}.{i}.gz" if self.compress else f"{path}.{i}"
+
+    def _rotate(self, path: str):
+        if self.backup_count <= 0:
+            os.remove(path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(self._backup(path, i)):
+                os.replace(self._backup(path, i), self._backup(path, i + 1))
+        if self.compress:
+            with open(path, "rb") as src, gzip.open(self._backup(path, 1), "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+        else:
+            os.replace(path, self._backup(path, 1))
+        with self._cond:
+            self.stats.rotated += 1
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Blocks until queued samples are written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._queue and not self._writing, timeout
+            )
+
+
+# Shared by the reward functions of all stages.
+sample_logger = SampleLogger()
+atexit.register(sample_logger.flush, EXIT_FLUSH_TIMEOUT)
@@ -0,0 +1,422 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import re
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION_DIR = os.path.join(ROOT_DIR, "supervisor_session")
+SUPERVISOR_CONTENT = os.path.join(ROOT_DIR, "supervisor_content.txt")
+MAX_SEGMENT_BYTES = 64 * 2**20
+# Appends between index.json rewrites; unsaved records are recovered on open.
+SAVE_EVERY = 32
+SEPARATOR = "-" * 80 + "\n\n"
+# Per-kind entry index records: entry number, segment, byte offset, length.
+ENTRY = struct.Struct("<IIQI")
+
+
+def _render_supervisor_feedback(record: dict) -> str:
+    return f"<supervisor_feedback #{record['entry']}>\n{record['text']}\n</supervisor_feedback>\n\n"
+
+
+def _render_supervisor(record: dict) -> str:
+    return f"<supervisor id=\"{record['id']}\" entry=\"{record['entry']}\">\n{record['text']}\n</supervisor>\n\n"
+
+
+def _render_therapist_answer(record: dict) -> str:
+    return (
+        f"<therapist_answer id=\"{record['id']}\" entry=\"{record['entry']}\">\n{record['text']}\n</therapist_answer>\n\n"
+        + SEPARATOR
+    )
+
+
+def _render_model_response(record: dict) -> str:
+    attrs = ' conversation="ongoing"' if record.get("conversation") else ""
+    return (
+        f"<model_response #{record['entry']}{attrs}>\n{record['text']}\n</model_response>\n\n"
+        + SEPARATOR
+    )
+
+
+# How each record kind reads in supervisor_content.txt; "text" is verbatim.
+RENDERERS: dict[str, Callable[[dict], str]] = {
+    "text": lambda record: record["text"],
+    "supervisor_feedback": _render_supervisor_feedback,
+    "supervisor": _render_supervisor,
+    "therapist_answer": _render_therapist_answer,
+    "model_response": _render_model_response,
+}
+
+# Entry tags of each kind in a supervisor_content.txt written before the store.
+LEGACY_TAGS = {
+    "supervisor_feedback": re.compile(r"<supervisor_feedback #(\d+)>"),
+    "supervisor": re.compile(r'<supervisor id="[^"]*" entry="(\d+)">'),
+    "therapist_answer": re.compile(r'<therapist_answer id="[^"]*" entry="(\d+)">'),
+    "model_response": re.compile(r"<model_response #(\d+)"),
+}
+
+
+def legacy_counters(text: str) -> dict[str, int]:
+    """Highest entry number of each kind tagged in an old supervisor_content.txt."""
+    counters = {}
+    for kind, pattern in LEGACY_TAGS.items():
+        entries = [int(n) for n in pattern.findall(text)]
+        if entries:
+            counters[kind] = max(entries)
+    return counters
+
+
+class SessionStore:
+    """
+    Append-only store for the supervisor session log.
+
+    Records are JSON lines in `<root>/segment-NNNNN.jsonl`, starting a new
+    segment past `max_segment_bytes`. The sidecar `<root>/index.json` holds
+    per-kind entry counters and how far the last segment is indexed, so
+    `append` and `next_id` never read old records. It is rewritten every
+    `save_every` appends and on `flush` (at exit for the shared store). `<root>/<kind>.idx` holds
+    a fixed-size ENTRY per record of that kind, in entry order, so `entries`
+    reads any record with one seek. Records written past the index (e.g.
+    after a crash) are indexed on open, and a missing or short index is
+    rebuilt in one pass. `render` produces the supervisor_content.txt text.
+
+    With `content_path`, that text is kept there: a file already at the path
+    when the store is created is imported as its first "text" record, whose
+    tagged entries are numbered before the store's own (`base` in the index),
+    and every append adds its rendered records to the file. If the file and
+    the store fell out of step, e.g. in a crash, it is rendered again on open.
+
+    Messages about the store are logged after its lock is released, so a
+    logging handler may append to it.
+
+    Entry numbers are only consistent with a single writing process.
+    """
+
+    def __init__(
+        self,
+        root: str = SESSION_DIR,
+        max_segment_bytes: int = MAX_SEGMENT_BYTES,
+        content_path: str | None = None,
+        save_every: int = SAVE_EVERY,
+        log: logging.Logger | None = None,
+    ):
+        self.root = root
+        self.max_segment_bytes = max_segment_bytes
+        self.content_path = content_path
+        self.save_every = save_every
+        self.logger = log or logger
+
+        self._index: dict | None = None
+        self._unsaved = 0
+        self._notices: list[tuple[int, str]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            try:
+                yield
+            finally:
+                notices, self._notices = self._notices, []
+        for level, msg in notices:
+            self.logger.log(level, msg)
+
+    def _note(self, level: int, msg: str):
+        """Queues a message to log once the lock is released."""
+        self._notices.append((level, msg))
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.root, f"segment-{segment:05d}.jsonl")
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, "index.json")
+
+    def _entries_path(self, kind: str) -> str:
+        return os.path.join(self.root, f"{kind}.idx")
+
+    def _content_size(self) -> int | None:
+        if self.content_path is None or not os.path.exists(self.content_path):
+            return None
+        return os.path.getsize(self.content_path)
+
+    def _load(self) -> dict:
+        if self._index is not None:
+            return self._index
+
+        created = not os.path.exists(self._index_path()) and not os.path.exists(self._segment_path(0))
+        index = {"segment": 0, "offset": 0, "counters": {}, "base": {}}
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self._note(logging.WARNING, f"Rebuilding unreadable session index: {e}")
+        index.setdefault("base", {})
+
+        if not self._trim_entries(index):
+            self._note(logging.INFO, "Rebuilding the session entry index")
+            for kind in RENDERERS:
+                if os.path.exists(self._entries_path(kind)):
+                    os.remove(self._entries_path(kind))
+            index = {"segment": 0, "offset": 0, "counters": {}, "base": {}}
+
+        recovered = self._recover(index)
+        self._index = index
+        if created and self._content_size():
+            self._import_content()
+        elif self.content_path is not None and (recovered or self._content_size() != index.get("content_size")):
+            self._note(logging.INFO, f"Rendering the session store to {self.content_path} again")
+            self._render_content()
+            self._save()
+        elif recovered:
+            self._save()
+        if recovered:
+            self._note(logging.INFO, f"Indexed {recovered} session records past the index")
+        return index
+
+    def _import_content(self):
+        """Imports the supervisor_content.txt of runs before the store existed."""
+        with open(self.content_path) as f:
+            text = f.read()
+        counters = legacy_counters(text)
+        self._append_locked([{"kind": "text", "text": text, "legacy_counters": counters}])
+        self._index["content_size"] = self._content_size()
+        self._save()
+        self._note(logging.INFO, f"Imported {self.content_path} into the session store, entries after {counters}")
+
+    def _render_content(self):
+        index = self._index
+        tmp = self.content_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(RENDERERS[r["kind"]](r) for r in self._records(index["segment"], index["offset"]))
+        os.replace(tmp, self.content_path)
+        index["content_size"] = self._content_size()
+
+    @staticmethod
+    def _start_counters(index: dict, record: dict):
+        # Entries of an imported supervisor_content.txt come before the store's.
+        if "legacy_counters" in record:
+            index["base"] = dict(record["legacy_counters"])
+            index["counters"].update(record["legacy_counters"])
+
+    def _trim_entries(self, index: dict) -> bool:
+        """
+        Drops entry index records past the counters, e.g. from a crash before
+        the counters were saved. Returns False if any are missing instead.
+        """
+        counters, base = index["counters"], index["base"]
+        for kind in RENDERERS:
+            path = self._entries_path(kind)
+            expected = (counters.get(kind, 0) - base.get(kind, 0)) * ENTRY.size
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < expected:
+                return False
+            if size > expected:
+                os.truncate(path, expected)
+        return True
+
+    def _recover(self, index: dict) -> int:
+        """Indexes complete records past the index, dropping a torn last line."""
+        recovered = 0
+        entry_files = {}
+        try:
+            while True:
+                path = self._segment_path(index["segment"])
+                if not os.path.exists(path):
+                    return recovered
+                with open(path, "rb+") as f:
+                    f.seek(index["offset"])
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            f.truncate(index["offset"])
+                            break
+                        record = json.loads(line)
+                        self._start_counters(index, record)
+                        kind = record["kind"]
+                        entry = index["counters"][kind] = index["counters"].get(kind, 0) + 1
+                        self._write_entry(entry_files, kind, entry, index["segment"], index["offset"], len(line))
+                        index["offset"] += len(line)
+                        recovered += 1
+                if not os.path.exists(self._segment_path(index["segment"] + 1)):
+                    return recovered
+                index["segment"] += 1
+                index["offset"] = 0
+        finally:
+            for f in entry_files.values():
+                f.close()
+
+    def _write_entry(self, entry_files: dict, kind: str, entry: int, segment: int, offset: int, length: int):
+        if kind not in entry_files:
+            entry_files[kind] = open(self._entries_path(kind), "ab")
+        entry_files[kind].write(ENTRY.pack(entry, segment, offset, length))
+
+    def _save(self):
+        tmp = self._index_path() + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_path())
+        self._unsaved = 0
+
+    def flush(self):
+        """Saves the index if appends since the last save are pending."""
+        with self._locked():
+            if self._unsaved:
+                self._save()
+
+    def next_id(self, kind: str) -> int:
+        """Entry number the next `kind` record will get."""
+        with self._locked():
+            return self._load()["counters"].get(kind, 0) + 1
+
+    def append(self, kind: str, text: str, **fields) -> int:
+        """Appends a `kind` record and returns its entry number."""
+        return self.append_many([{"kind": kind, "text": text, **fields}])[0]
+
+    def append_many(self, records: Iterable[dict]) -> list[int]:
+        """
+        Appends records given as {"kind", "text", **fields} dicts with one
+        index update, and returns their entry numbers.
+        """
+        records = list(records)
+        for record in records:
+            if record["kind"] not in RENDERERS:
+                raise ValueError(f"Unknown session record kind: {record['kind']}")
+        if not records:
+            return []
+
+        with self._locked():
+            self._load()
+            try:
+                entries = self._append_locked(records)
+                if self.content_path is not None:
+                    with open(self.content_path, "a") as f:
+                        f.writelines(
+                            RENDERERS[r["kind"]]({**r, "entry": e}) for r, e in zip(records, entries)
+                        )
+                    self._index["content_size"] = self._content_size()
+            except BaseException:
+                self._save()
+                raise
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+        return entries
+
+    def _append_locked(self, records: list[dict]) -> list[int]:
+        """Writes records and their entry index. Caller holds the lock and saves the index."""
+        entries = []
+        os.makedirs(self.root, exist_ok=True)
+        index = self._index
+        f = None
+        entry_files = {}
+        try:
+            for record in records:
+                self._start_counters(index, record)
+                kind = record["kind"]
+                entry = index["counters"].get(kind, 0) + 1
+                line = json.dumps({**record, "entry": entry}) + "\n"
+                data = line.encode()
+
+                if index["offset"] and index["offset"] + len(data) > self.max_segment_bytes:
+                    if f is not None:
+                        f.close()
+                        f = None
+                    index["segment"] += 1
+                    index["offset"] = 0
+                if f is None:
+                    f = open(self._segment_path(index["segment"]), "ab")
+                f.write(data)
+                self._write_entry(entry_files, kind, entry, index["segment"], index["offset"], len(data))
+
+                index["counters"][kind] = entry
+                index["offset"] += len(data)
+                entries.append(entry)
+        finally:
+            if f is not None:
+                f.close()
+            for entry_file in entry_files.values():
+                entry_file.close()
+        return entries
+
+    def records(self, kinds: Iterable[str] | None = None) -> Iterator[dict]:
+        """Streams indexed records in append order, optionally of some kinds only."""
+        with self._locked():
+            index = self._load()
+            last, end = index["segment"], index["offset"]
+        return self._records(last, end, kinds)
+
+    def _records(self, last: int, end: int, kinds: Iterable[str] | None = None) -> Iterator[dict]:
+        kinds = set(kinds) if kinds is not None else None
+        for segment in range(last + 1):
+            try:
+                f = open(self._segment_path(segment), "rb")
+            except FileNotFoundError:
+                continue
+            with f:
+                read = 0
+                for line in f:
+                    read += len(line)
+                    if segment == last and read > end:
+                        break
+                    record = json.loads(line)
+                    if kinds is None or record["kind"] in kinds:
+                        yield record
+
+    def entries(self, kind: str, entries: Iterable[int]) -> Iterator[dict]:
+        """Reads `kind` records by entry number, one seek each, skipping unknown and imported ones."""
+        with self._locked():
+            index = self._load()
+            base, count = index["base"].get(kind, 0), index["counters"].get(kind, 0)
+        if count == base:
+            return
+
+        segments = {}
+        try:
+            with open(self._entries_path(kind), "rb") as idx:
+                for n in entries:
+                    if not base < n <= count:
+                        continue
+                    idx.seek((n - base - 1) * ENTRY.size)
+                    _, segment, offset, length = ENTRY.unpack(idx.read(ENTRY.size))
+                    if segment not in segments:
+                        segments[segment] = open(self._segment_path(segment), "rb")
+                    segments[segment].seek(offset)
+                    yield json.loads(segments[segment].read(length))
+        finally:
+            for f in segments.values():
+                f.close()
+
+    def render(self) -> Iterator[str]:
+        """Yields the human-readable supervisor_content.txt text, record by record."""
+        for record in self.records():
+            yield RENDERERS[record["kind"]](record)
+
+    def render_to(self, path: str = SUPERVISOR_CONTENT) -> str:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(self.render())
+        os.replace(tmp, path)
+        return path
+
+
+# Shared by the prompt builders and the trainer entry point.
+session_store = SessionStore(content_path=SUPERVISOR_CONTENT)
+atexit.register(session_store.flush)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render the supervisor session store as supervisor_content.txt"
+    )
+    parser.add_argument("--root", default=SESSION_DIR)
+    parser.add_argument("--out", default=SUPERVISOR_CONTENT)
+    args = parser.parse_args()
+    print(f"Rendered to {SessionStore(args.root).render_to(args.out)}")
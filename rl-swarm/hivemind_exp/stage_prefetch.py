@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from hivemind_exp.hivemind_utils import PrefetchFn
+
+logger = logging.getLogger(__name__)
+
+
+class StagePrefetcher:
+    """
+    Collects a stage's inputs in the background while the previous stage trains.
+
+    Once `ready_fn` returns True (e.g. this node published its own outputs),
+    `prefetch_fn(round, stage)` is called every `interval` seconds, which
+    keeps the DHT caches it reads through warm: blobs, and peers' outputs
+    that stopped changing between refreshes. `take` collects once more after
+    training, asking the DHT only for peers that were still publishing, so
+    the stage still sees everything published up to then.
+    """
+
+    def __init__(
+        self,
+        prefetch_fn: PrefetchFn,
+        round_num: int,
+        stage: int,
+        ready_fn: Callable[[], bool] = lambda: True,
+        interval: float = 30.0,
+        log: logging.Logger | None = None,
+    ):
+        self.prefetch_fn = prefetch_fn
+        self.round_num = round_num
+        self.stage = stage
+        self.ready_fn = ready_fn
+        self.interval = interval
+        self.logger = log or logger
+        self.refreshes = 0
+
+        self._result: Callable[[], Any] | None = None
+        self._result_time = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"prefetch-{round_num}-{stage}", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _refresh(self) -> bool:
+        try:
+            result = self.prefetch_fn(self.round_num, self.stage)
+        except Exception as e:
+            self.logger.warning(
+                f"Prefetching round {self.round_num} stage {self.stage} failed: {e}"
+            )
+            return False
+
+        with self._lock:
+            self._result = result
+            self._result_time = time.monotonic()
+            self.refreshes += 1
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.ready_fn():
+                self._refresh()
+                self._stop.wait(self.interval)
+            else:
+                self._stop.wait(min(self.interval, 1.0))
+
+    def take(self, max_age: float, wait_timeout: float = 60.0) -> Callable[[], Any] | None:
+        """
+        Stops refreshing, waiting up to `wait_timeout` for a refresh in
+        progress, then refreshes once more and returns that result. If the
+        final refresh fails, falls back to the latest earlier result unless
+        older than `max_age`.
+        """
+        self.stop(wait=False)
+        self._thread.join(wait_timeout)
+        if self._thread.is_alive():
+            self.logger.info(
+                f"Round {self.round_num} stage {self.stage} prefetch still running; not using it"
+            )
+            return None
+
+        if self.ready_fn() and self._refresh():
+            return self._result
+        if self._result is None:
+            return None
+
+        age = time.monotonic() - self._result_time
+        if age > max_age:
+            self.logger.info(
+                f"Discarding round {self.round_num} stage {self.stage} prefetch; {age:.0f}s old"
+            )
+            return None
+        return self._result
+
+    def stop(self, wait: bool = True):
+        # A refresh in progress isn't interrupted; its result is dropped.
+        self._stop.set()
+        if wait and self._thread.is_alive():
+            self._thread.join()
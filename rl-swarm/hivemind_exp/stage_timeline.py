@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+from hivemind.dht import DHT
+from hivemind.utils import MSGPackSerializer
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_FILE = "timeline.jsonl"
+PROMETHEUS_PREFIX = "rl_swarm"
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+    bytes: int = 0  # DHT payloads and checkpoint files.
+
+    def add(self, seconds: float, nbytes: int = 0):
+        self.calls += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes += nbytes
+
+    def as_dict(self) -> dict[str, float]:
+        return dict(self.__dict__)
+
+
+class StageTimeline:
+    """
+    Time spent per phase (datasets, generation, each reward function, DHT
+    traffic, saving, ...) aggregated per round and stage.
+
+    Records go to the current round/stage unless one is given. `flush` appends
+    a JSON line per round/stage with new records to `path`. Background work
+    (DHT writes, checkpoint writes) can finish after its stage was flushed, so
+    lines for the same round and stage add up.
+    """
+
+    def __init__(self, path: str | None = None, log: logging.Logger | None = None):
+        self.path = path
+        self.logger = log or logger
+        self.round_num = -1
+        self.stage = -1
+        self.totals: dict[str, PhaseStats] = defaultdict(PhaseStats)
+
+        self._pending: dict[tuple[int, int], dict[str, PhaseStats]] = {}
+        self._lock = threading.Lock()
+
+    def set_stage(self, round_num: int, stage: int):
+        with self._lock:
+            self.round_num, self.stage = round_num, stage
+
+    def record(
+        self,
+        phase: str,
+        seconds: float,
+        nbytes: int = 0,
+        round_num: int | None = None,
+        stage: int | None = None,
+    ):
+        with self._lock:
+            key = (
+                self.round_num if round_num is None else round_num,
+                self.stage if stage is None else stage,
+            )
+            phases = self._pending.setdefault(key, defaultdict(PhaseStats))
+            phases[phase].add(seconds, nbytes)
+            self.totals[phase].add(seconds, nbytes)
+
+    @contextmanager
+    def span(self, phase: str, nbytes: int = 0, round_num=None, stage=None):
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(phase, time.monotonic() - start_time, nbytes, round_num, stage)
+
+    def timed(self, phase: str, fn: Callable, nbytes: int = 0) -> Callable:
+        """Wraps `fn` to record under the round/stage current at wrapping time."""
+        with self._lock:
+            round_num, stage = self.round_num, self.stage
+
+        @wraps(fn)
+        def timed_fn(*args, **kwargs):
+            with self.span(phase, nbytes, round_num, stage):
+                return fn(*args, **kwargs)
+
+        return timed_fn
+
+    def flush(self) -> list[dict[str, Any]]:
+        """Writes and returns records added since the last flush."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        now = time.time()
+        records = [
+            {
+                "round": r,
+                "stage": s,
+                "time": now,
+                "phases": {name: stats.as_dict() for name, stats in phases.items()},
+            }
+            for (r, s), phases in sorted(pending.items())
+        ]
+        if self.path and records:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    for record in records:
+                        f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                self.logger.warning(f"Failed to write timeline to {self.path}: {e}")
+        return records
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            totals = {
+                name: PhaseStats(**stats.as_dict()) for name, stats in self.totals.items()
+            }
+            round_num, stage = self.round_num, self.stage
+
+        lines = []
+        for metric, attr, kind, help_text in (
+            ("phase_seconds_total", "seconds", "counter", "Time spent per phase."),
+            ("phase_calls_total", "calls", "counter", "Timed calls per phase."),
+            ("phase_bytes_total", "bytes", "counter", "Bytes moved per phase."),
+            ("phase_max_seconds", "max_seconds", "gauge", "Longest call per phase."),
+        ):
+            name = f"{PROMETHEUS_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for phase, stats in sorted(totals.items()):
+                lines.append(f'{name}{{phase="{phase}"}} {getattr(stats, attr)}')
+
+        for metric, value in (("round", round_num), ("stage", stage)):
+            name = f"{PROMETHEUS_PREFIX}_{metric}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def value_nbytes(value: Any) -> int:
+    # Size as hivemind would send it.
+    try:
+        return len(MSGPackSerializer.dumps(value))
+    except Exception:
+        return 0
+
+
+_timelines: "weakref.WeakKeyDictionary[DHT, StageTimeline]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def attach_timeline(dht: DHT, timeline: StageTimeline):
+    # DHT helpers record their calls into the timeline attached to their DHT.
+    _timelines[dht] = timeline
+
+
+def get_timeline(dht: DHT) -> StageTimeline | None:
+    try:
+        return _timelines.get(dht)
+    except TypeError:  # Not weak-referenceable.
+        return None
+
+
+def timeline_span(dht: DHT, phase: str, nbytes: int = 0, round_num=None, stage=None):
+    if timeline := get_timeline(dht):
+        return timeline.span(phase, nbytes, round_num, stage)
+    return nullcontext()
+
+
+def record_dht_get(dht: DHT, start_time: float, value: Any):
+    """Records a DHT get that started at `start_time` (monotonic) and returned `value`."""
+    if timeline := get_timeline(dht):
+        timeline.record("dht_get", time.monotonic() - start_time, value_nbytes(value))
+
+
+def serve_prometheus(
+    timeline: StageTimeline, port: int, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """Serves `timeline` as Prometheus text at /metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = timeline.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="timeline-metrics", daemon=True
+    ).start()
+    return server
@@ -0,0 +1,51 @@
+import json
+
+from hivemind_exp.chat_ingest import ChatIngest, iter_json_array
+
+
+def write_chat(path, users):
+    # As pages/api/chat.js saves it: the whole history, indented.
+    history = [{"timestamp": f"t{i}", "user": u, "assistant": "ok"} for i, u in enumerate(users)]
+    path.write_text(json.dumps(history, indent=2, ensure_ascii=False))
+
+
+def test_iter_json_array(tmp_path):
+    path = tmp_path / "chat.json"
+    users = ["héllo ✓", "", "a, b] {c}", "x" * 100]
+    write_chat(path, users)
+    items = list(iter_json_array(str(path), chunk_size=7))
+    assert [item["user"] for _, item in items] == users
+
+    # Resuming from a yielded offset gives the rest.
+    end, _ = items[1]
+    assert [item["user"] for _, item in iter_json_array(str(path), end)] == users[2:]
+    assert list(iter_json_array(str(path), items[-1][0])) == []
+
+
+def test_new_messages(tmp_path):
+    path = tmp_path / "chat.json"
+    cursor = str(tmp_path / "cursor.json")
+    write_chat(path, ["one", "two", " "])
+    assert ChatIngest(str(path), cursor).new_messages() == ["one", "two"]
+    assert ChatIngest(str(path), cursor).new_messages() == []
+
+    # Appended messages only; repeats of consumed text are dropped.
+    write_chat(path, ["one", "two", " ", "three", "one", "four", "five"])
+    ingest = ChatIngest(str(path), cursor, max_new=2)
+    assert ingest.new_messages() == ["three", "four"]
+    assert ingest.stats.as_dict() == {
+        "read": 3, "new": 2, "duplicates": 1, "deferred": 1, "rescans": 0
+    }
+    # Uncommitted messages are read again after a restart, not in the same run.
+    ingest = ChatIngest(str(path), cursor)
+    assert ingest.new_messages(commit=False) == ["five"]
+    assert ingest.new_messages(commit=False) == []
+    assert ChatIngest(str(path), cursor).new_messages(commit=False) == ["five"]
+    ingest.commit()
+    assert ChatIngest(str(path), cursor).new_messages() == []
+
+    # A rewritten history is read again from the start.
+    write_chat(path, ["five", "six"])
+    ingest = ChatIngest(str(path), cursor)
+    assert ingest.new_messages() == ["six"]
+    assert ingest.stats.rescans == 1
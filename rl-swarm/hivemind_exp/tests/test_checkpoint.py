@@ -0,0 +1,55 @@
+import torch
+from transformers import AutoTokenizer
+
+from hivemind_exp.checkpoint import CheckpointManager
+from hivemind_exp.tests.fake_data import QUESTION_HASH
+
+TEST_MODEL_NAME = "trl-internal-testing/tiny-Qwen2ForCausalLM-2.5"
+
+
+def test_checkpoint_save_and_load(tmp_path):
+    manager = CheckpointManager(str(tmp_path), keep_last=2)
+    model = torch.nn.Linear(4, 2)
+    round_cache = {(0, 0): {QUESTION_HASH: (1.0, {"question": "q"})}}
+
+    for stage in range(3):
+        manager.save(model, 0, stage, round_cache)
+        assert manager.wait(timeout=10)
+
+    meta = manager.latest()
+    assert meta and (meta.round_num, meta.stage) == (0, 2)
+    assert meta.next_stage() == (0, 3)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "round-0-stage-1",
+        "round-0-stage-2",
+    ]
+
+    restored = torch.nn.Linear(4, 2)
+    assert manager.load(meta, restored) == round_cache
+    assert torch.equal(restored.weight, model.weight)
+
+
+def test_checkpoint_snapshot_is_taken_on_save(tmp_path):
+    manager = CheckpointManager(str(tmp_path))
+    model = torch.nn.Linear(4, 2)
+    weight = model.weight.detach().clone()
+
+    manager.save(model, 0, 0, {})
+    with torch.no_grad():
+        model.weight.zero_()  # Training continues while the write is pending.
+    assert manager.wait(timeout=10)
+
+    restored = torch.nn.Linear(4, 2)
+    manager.load(manager.latest(), restored)  # type: ignore
+    assert torch.equal(restored.weight, weight)
+
+
+def test_checkpoint_tokenizer_saved_once(tmp_path):
+    manager = CheckpointManager(str(tmp_path / "checkpoints"))
+    tokenizer = AutoTokenizer.from_pretrained(TEST_MODEL_NAME)
+
+    assert manager.save_tokenizer(tokenizer, str(tmp_path))
+    assert not manager.save_tokenizer(tokenizer, str(tmp_path))
+
+    tokenizer.add_tokens(["<new>"])
+    assert manager.save_tokenizer(tokenizer, str(tmp_path))
@@ -0,0 +1,148 @@
+import random
+import re
+
+import pytest
+
+import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+import hivemind_exp.gsm8k.stage2_rewards as stage2_rewards
+import hivemind_exp.gsm8k.stage3_rewards as stage3_rewards
+from hivemind_exp.gsm8k.completion_parse import (
+    ParsedCompletion,
+    parse_completion,
+    parse_completions,
+)
+
+PIECES = [
+    "<think>",
+    "</think>",
+    "<answer>",
+    "</answer>",
+    "<question>",
+    "</question>",
+    "<think",
+    "\n",
+    "\n\n",
+    " ",
+    "\t",
+    "x",
+    "42",
+]
+PATTERNS = [
+    "<think>\n",
+    "\n</think>\n",
+    "\n<answer>\n",
+    "\n</answer>",
+    "\n</answer>\n",
+    "<question>\n",
+    "\n\n",  # Not a tag; falls back to str methods.
+]
+
+
+def regexes(tags):
+    strict = "^" + "".join(rf"<{t}>\n.*?\n</{t}>\n" for t in tags) + "$"
+    soft = r"\s*".join(rf"<{t}>.*?</{t}>" for t in tags)
+    return re.compile(strict), re.compile(soft)
+
+
+def random_texts(n, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 16)))
+
+
+def test_parsed_completion_matches_string_ops():
+    for text in random_texts(20000):
+        parsed = ParsedCompletion(text)
+        for pattern in PATTERNS:
+            assert parsed.count(pattern) == text.count(pattern), (text, pattern)
+            assert parsed.trailing(pattern) == len(text.split(pattern)[-1])
+        for name in ("think", "answer", "question"):
+            expected = text.split(f"<{name}>")[-1].split(f"</{name}>")[0].strip()
+            assert parsed.extract(name) == expected, (text, name)
+
+
+@pytest.mark.parametrize(
+    "tags", [("think",), ("think", "answer"), ("question", "think", "answer")]
+)
+def test_parsed_completion_format_flags(tags):
+    strict, soft = regexes(tags)
+    texts = list(random_texts(20000, seed=len(tags)))
+    # Well-formed completions, with and without a trailing newline.
+    body = "".join(f"<{t}>\nx {t}\n</{t}>\n" for t in tags)
+    texts += [body, body + "\n", body + "\n\n", body + "x", " " + body]
+    for text in texts:
+        parsed = ParsedCompletion(text)
+        assert parsed.strict_format(tags) == bool(strict.match(text)), text
+        assert parsed.soft_format(tags) == bool(soft.match(text)), text
+
+
+def test_stage_format_tags():
+    strict, soft = regexes(stage1_rewards.FORMAT_TAGS)
+    assert strict.pattern == r"^<think>\n.*?\n</think>\n<answer>\n.*?\n</answer>\n$"
+    assert soft.pattern == r"<think>.*?</think>\s*<answer>.*?</answer>"
+
+    completion = "<compare>\na\n</compare>\n<explain>\nb\n</explain>\n<identify>\nc\n</identify>\n"
+    completions = [[{"role": "assistant", "content": completion}]]
+    assert stage2_rewards.strict_format_reward_func(completions, logging=False) == [0.5]
+    # As before, the soft format's `.` doesn't match the newlines.
+    assert stage2_rewards.soft_format_reward_func(completions, logging=False) == [0.0]
+    assert stage2_rewards.count_xml(completion) == 0.75
+    assert stage3_rewards.strict_format_reward_func(completions) == [0.0]
+
+
+def test_parse_completions_shared():
+    completions = [[{"role": "assistant", "content": "<answer>\n4\n</answer>\n"}]] * 2
+    first, second = parse_completions(completions)
+    assert first is second
+    assert first is parse_completion("<answer>\n4\n</answer>\n")
+    assert stage1_rewards.int_reward_func(completions) == [0.5, 0.5]
+
+
+def test_stage3_parse_prompt():
+    students = {
+        "0": "<think>\nx\n</think>\n<answer>\n95\n</answer>\n",
+        "1": "<answer>90</answer>",
+    }
+    prompt = (
+        "The question we were given is: What grade?  \n\n"
+        "The following answers to this question were suggested:"
+        + "".join(f"<student>{k}</student> said \n{v}\n" for k, v in students.items())
+        + "  \nAfter comparing these answers, the following feedback was given about which answer is best: \n"
+        + "<identify>0</identify> <identify>1</identify> <identify>0</identify>"
+    )
+    stage3_rewards.parse_prompt.cache_clear()
+    parsed = stage3_rewards.parse_prompt(prompt)
+    assert parsed.question == stage3_rewards.extract_original_question(prompt) == "What grade?"
+    assert parsed.choices == ["0", "1", "0"]
+    assert parsed.majority == {"0"}
+    assert {k: a.text for k, a in parsed.agent_answers.items()} == {
+        k: v.strip() for k, v in students.items()
+    }
+    assert parsed.agent_answers["0"].answer == "95"
+    assert parsed.agent_answers["1"].answer == "90"
+
+    completions = [
+        [{"role": "assistant", "content": f"<majority>\n{m}\n</majority>\n"}]
+        for m in ("0", "1", "None", "2")
+    ]
+    prompts = [[{"role": "user", "content": prompt}]] * len(completions)
+    rewards = stage3_rewards.concensus_correctness_reward_func(
+        prompts, completions, ["95"] * len(completions), weighting=1.0
+    )
+    strict, soft = regexes(stage1_rewards.FORMAT_TAGS)
+
+    def expected(text, correct):
+        reward = 1.0 if correct else 0
+        reward += 0.5  # Digits.
+        reward += 0.5 if strict.match(text) else 0
+        reward += 0.5 if soft.match(text) else 0
+        return reward + stage1_rewards.count_xml(text)
+
+    assert rewards == [
+        expected(students["0"].strip(), True),
+        expected(students["1"].strip(), False),
+        0,
+        0,
+    ]
+    stage3_rewards.consensus_reward_func(prompts, completions, weighting=1.0)
+    assert stage3_rewards.parse_prompt.cache_info().misses == 1
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from hivemind_exp.dht_publisher import DHTPublisher
+
+
+class FakeDHT:
+    def __init__(self):
+        self.stored = {}
+        self.calls = 0
+        self.accept = True
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def store(self, key, value, expiration_time, subkey=None):
+        self.gate.wait()
+        self.calls += 1
+        if not self.accept:
+            return False
+        self.stored[(key, subkey)] = value
+        return True
+
+
+def test_publisher_flush():
+    dht = FakeDHT()
+    publisher = DHTPublisher(dht)  # type: ignore
+    for i in range(10):
+        publisher.store("k", i, expiration_time=0, subkey=str(i))
+
+    assert publisher.flush(timeout=5)
+    assert len(dht.stored) == 10
+    assert publisher.stats.published == 10
+    assert publisher.stats.queue_depth == 0
+    publisher.close()
+
+
+def test_publisher_merges_and_drops():
+    dht = FakeDHT()
+    dht.gate.clear()  # Block the worker so writes pile up.
+    publisher = DHTPublisher(dht, max_pending=2)  # type: ignore
+
+    publisher.store("block", 0, expiration_time=0)
+    while publisher._pending:  # Wait until the worker picks it up.
+        time.sleep(0.01)
+
+    publisher.store("k", 1, expiration_time=0, subkey="a")
+    publisher.store("k", 2, expiration_time=0, subkey="a")  # Merged.
+    publisher.store("k", 3, expiration_time=0, subkey="b")
+    publisher.store("k", 4, expiration_time=0, subkey="c")  # Drops "a".
+
+    dht.gate.set()
+    assert publisher.flush(timeout=5)
+    assert publisher.stats.merged == 1
+    assert publisher.stats.dropped == 1
+    assert ("k", "a") not in dht.stored
+    assert dht.stored[("k", "c")] == 4
+    publisher.close()
+
+
+def test_publisher_keeps_blob_writes():
+    dht = FakeDHT()
+    dht.gate.clear()
+    publisher = DHTPublisher(dht, max_pending=2)  # type: ignore
+
+    publisher.store("block", 0, expiration_time=0)
+    while publisher._pending:
+        time.sleep(0.01)
+
+    publisher.store("blob", 1, expiration_time=0, subkey="x", keep=True)
+    publisher.store("blob", 2, expiration_time=0, subkey="y", keep=True)
+    publisher.store("outputs", 3, expiration_time=0)  # Over the limit.
+    publisher.store("rewards", 4, expiration_time=0)  # Drops "outputs", not a blob.
+
+    dht.gate.set()
+    assert publisher.flush(timeout=5)
+    assert publisher.stats.dropped == 1
+    assert publisher.stats.max_queue_depth == 4
+    assert ("outputs", None) not in dht.stored
+    assert dht.stored[("blob", "x")] == 1
+    assert dht.stored[("blob", "y")] == 2
+    assert dht.stored[("rewards", None)] == 4
+    publisher.close()
+
+
+def test_publisher_counts_rejected_writes():
+    dht = FakeDHT()
+    dht.accept = False
+    publisher = DHTPublisher(dht)  # type: ignore
+    publisher.store("k", 1, expiration_time=0)
+    publisher.submit("task", lambda: None)
+
+    assert publisher.flush(timeout=5)
+    assert publisher.stats.failed == 1
+    assert publisher.stats.published == 1
+    assert not dht.stored
+    publisher.close()
+
+
+def test_publisher_submit():
+    dht = FakeDHT()
+    publisher = DHTPublisher(dht)  # type: ignore
+    done = []
+    publisher.submit("task", lambda: done.append(1))
+    assert publisher.flush(timeout=5)
+    assert done == [1]
+    publisher.close()
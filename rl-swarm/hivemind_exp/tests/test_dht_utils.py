@@ -0,0 +1,94 @@
+import hivemind
+import pytest
+from hivemind.utils import get_dht_time
+
+from hivemind_exp.dht_utils import (
+    blob_key,
+    get_outputs,
+    get_outputs_batch,
+    get_outputs_cache,
+    outputs_key,
+)
+from hivemind_exp.outputs_codec import encode_blob, encode_outputs
+from hivemind_exp.tests.fake_data import QUESTION, QUESTION_HASH
+
+
+def store_outputs(dht, node_key, r, s):
+    dht.store(
+        key=outputs_key(node_key, r, s),
+        subkey=QUESTION,
+        value=(0, {"question": QUESTION, "node": node_key}),
+        expiration_time=get_dht_time() + 60,
+    )
+
+
+def test_get_outputs_batch():
+    dht = hivemind.DHT(start=True)
+    node_keys = [str(i) for i in range(5)]
+    for node_key in node_keys[:3]:
+        store_outputs(dht, node_key, 0, 0)
+
+    batch = get_outputs_batch(dht, node_keys, 0, 0, max_concurrency=2)
+    assert batch.outputs.keys() == set(node_keys[:3])
+    for node_key, outputs in batch.outputs.items():
+        assert outputs[QUESTION_HASH][1]["node"] == node_key
+    assert sorted(batch.missing) == node_keys[3:]
+    assert not batch.timed_out
+
+    dht.shutdown()
+
+
+def test_get_outputs_batch_deadline():
+    dht = hivemind.DHT(start=True)
+    store_outputs(dht, "0", 0, 0)
+
+    batch = get_outputs_batch(dht, ["0", "1"], 0, 0, deadline=0)
+    assert not batch.outputs
+    assert batch.timed_out == ["0", "1"]
+
+    dht.shutdown()
+
+
+def test_get_outputs_cached():
+    dht = hivemind.DHT(start=True)
+    cache = get_outputs_cache(dht)
+
+    with pytest.raises(ValueError):
+        get_outputs(dht, "0", 0, 0)
+    store_outputs(dht, "0", 0, 0)
+    with pytest.raises(ValueError):
+        get_outputs(dht, "0", 0, 0)  # Negatively cached.
+    assert cache.stats.negative_hits == 1
+
+    cache.invalidate_round(0)
+    assert QUESTION_HASH in get_outputs(dht, "0", 0, 0)
+    assert QUESTION_HASH in get_outputs(dht, "0", 0, 0)
+    assert cache.stats.hits == 1
+
+    batch = get_outputs_batch(dht, ["0"], 0, 0, deadline=0)  # Served from cache.
+    assert batch.outputs.keys() == {"0"}
+
+    dht.shutdown()
+
+
+def test_get_outputs_encoded():
+    dht = hivemind.DHT(start=True)
+    prompt = "Summarize the agents' answers. " * 20
+    outputs = {"question": QUESTION, "answer": "42", "stage3_prompt": prompt}
+    encoded, blobs = encode_outputs(outputs)
+    for digest, text in blobs.items():
+        dht.store(
+            key=blob_key(digest),
+            value=encode_blob(text),
+            expiration_time=get_dht_time() + 60,
+        )
+    dht.store(
+        key=outputs_key("0", 0, 2),
+        subkey=QUESTION_HASH,
+        value=(0, encoded),
+        expiration_time=get_dht_time() + 60,
+    )
+
+    assert get_outputs(dht, "0", 0, 2)[QUESTION_HASH] == (0, outputs)
+
+    dht.shutdown()
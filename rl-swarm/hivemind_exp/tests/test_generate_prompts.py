@@ -2,7 +2,9 @@ import copy
 
 import pytest
 
+import hivemind_exp.gsm8k.generate_prompts as generate_prompts
 from hivemind_exp.gsm8k.generate_prompts import *
+from hivemind_exp.session_store import SessionStore
 from hivemind_exp.tests.fake_data import *
 
 
@@ -28,3 +30,75 @@ def test_get_stage3_samples_missing_agents():
     del s1["agent_opinion"][CK]
     del s2["agent_opinion"]["0"]
     get_stage3_samples([s1, s2])
+
+
+def _sorted_top_k(datum, valid_cols, k):
+    # pick_k_cols before the score cache: score everything, sort, take the tail.
+    question = [[{"content": datum["question"]}]]
+    completions = [[{"content": datum[c]}] for c in valid_cols]
+    answer = [datum["answer"] for _ in valid_cols]
+    rewards = stage1_rewards.top_k_cumulative_reward(question, completions, answer)
+    to_sort = [
+        (r, int(hashlib.md5(str.encode(c)).hexdigest(), 16), c)
+        for r, c in zip(rewards, valid_cols)
+    ]
+    to_sort.sort()
+    return tuple(c for _, _, c in to_sort[-k:])
+
+
+def test_pick_k_cols_top_k(monkeypatch):
+    answers = [
+        "<think>\nx\n</think>\n<answer>\n42\n</answer>\n",
+        "<think>x</think><answer>42</answer>",
+        "<answer>\n7\n</answer>",
+        "nothing",
+    ]
+    datum = {"question": "q", "answer": "42"}
+    for i in range(40):
+        datum[f"agent_answers_{i}"] = answers[i % len(answers)]
+    cols = list(datum)
+    valid_cols = cols[2:]
+
+    expected = _sorted_top_k(datum, valid_cols, 15)
+    assert pick_k_cols(cols, datum, 2) == expected
+
+    # Cached scores are reused; only new answers are scored.
+    scored = []
+    score = stage1_rewards.top_k_cumulative_reward
+    monkeypatch.setattr(
+        stage1_rewards,
+        "top_k_cumulative_reward",
+        lambda q, completions, a: scored.append(len(completions)) or score(q, completions, a),
+    )
+    assert pick_k_cols(cols, datum, 2) == expected
+    datum["agent_answers_40"] = answers[0]
+    pick_k_cols(list(datum), datum, 2)
+    assert scored == [1]
+
+
+def test_stage3_prompts_are_pure(tmp_path, monkeypatch):
+    store = SessionStore(str(tmp_path / "session"))
+    monkeypatch.setattr(generate_prompts, "session_store", store)
+    values = [copy.deepcopy(STAGE_2_MERGED) for _ in range(4)]
+    for i, v in enumerate(values):
+        v["question"] += f" {i}"
+    fill_unknown_answers_opinions(values)
+    data = Dataset.from_generator(stage3_generator, gen_kwargs={"values": values})
+
+    datum, cols = data[0], data.column_names
+    prompt, records = build_stage3_user_prompt(datum, cols)
+    assert store.next_id("supervisor") == 1
+    assert [r["kind"] for r in records].count("supervisor") == 2
+
+    batched = get_gsm8k_questions_with_stage1and2_answers(data, write_records=False)
+    rows = get_gsm8k_questions_with_stage1and2_answers(data, batched=False, num_proc=2, write_records=False)
+    assert batched["prompt"] == rows["prompt"]
+    assert batched[SESSION_RECORDS_COLUMN] == rows[SESSION_RECORDS_COLUMN]
+    assert batched["prompt"][0][1]["content"] == prompt
+    assert store.next_id("supervisor") == 1
+
+    written = get_gsm8k_questions_with_stage1and2_answers(data)
+    assert SESSION_RECORDS_COLUMN not in written.column_names
+    assert store.next_id("supervisor") == 9
+    assert generate_stage3_user_prompt(datum, cols) == prompt
+    assert store.next_id("supervisor") == 11
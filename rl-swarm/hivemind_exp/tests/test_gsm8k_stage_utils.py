@@ -12,7 +12,14 @@ from hivemind.utils import get_dht_time
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from trl import GRPOConfig
 
-from hivemind_exp.dht_utils import ROUND_STAGE_NUMBER_KEY, outputs_key
+import hivemind_exp.gsm8k.round_winners as round_winners
+import hivemind_exp.gsm8k.stage_utils as stage_utils
+from hivemind_exp.dht_utils import (
+    ROUND_STAGE_NUMBER_KEY,
+    OutputsBatch,
+    decode_values,
+    outputs_key,
+)
 from hivemind_exp.gsm8k.stage_utils import (
     HivemindNode,
     get_stage2_samples,
@@ -31,6 +38,7 @@ from hivemind_exp.tests.fake_data import (
     SAMPLES,
     STAGE_2_MERGED,
     STAGE_2_OUTPUTS,
+    STAGE_3_OUTPUTS,
     samples_with_key,
 )
 from hivemind_exp.trainer.hivemind_grpo_trainer import (
@@ -216,6 +224,55 @@ def test_merged_prev_stage_datasets(
     assert nf[f"{group_field}_{node.key}"] == node_expected
 
 
+def test_prev_stage_fetches_peers_until_limit(monkeypatch):
+    node = HivemindNode("test", "0")
+    outputs = {k: {f"q{k}": (0.0, {"answer": k})} for k in "cd"}
+    requested = []
+
+    def get_outputs(dht, node_key, r, s, get_cached_fn=None):
+        raise ValueError("no local outputs")
+
+    def get_outputs_batch(dht, node_keys, r, s, **kwargs):
+        requested.append(list(node_keys))
+        # a has rewards but no outputs, b doesn't answer.
+        return OutputsBatch(
+            outputs={k: outputs[k] for k in node_keys if k in outputs},
+            missing=[k for k in node_keys if k == "a"],
+            timed_out=[k for k in node_keys if k == "b"],
+        )
+
+    monkeypatch.setattr(stage_utils, "get_dht_value", lambda *a, **kw: dict.fromkeys("0abcde", 1))
+    monkeypatch.setattr(stage_utils, "get_outputs", get_outputs)
+    monkeypatch.setattr(stage_utils, "get_outputs_batch", get_outputs_batch)
+    build = stage_utils.prev_stage_datasets_builder(
+        None, node, 0, 1, lambda outputs: outputs, lambda qs: qs, dht_sample_limit=1
+    )
+    assert requested == [["a", "b"], ["c", "d"]]
+    assert build() == [{"c": {"answer": "c"}}, {"d": {"answer": "d"}}]
+
+
+def test_round_winner_prefetch_scores_peers(monkeypatch):
+    fetched = [{"peer": STAGE_3_OUTPUTS[CK], CK: STAGE_3_OUTPUTS[CK]}]
+    scored = []
+
+    def score_output(output, engine=None):
+        scored.append(output)
+        return 1.0
+
+    monkeypatch.setattr(stage_utils, "merged_prev_stage_datasets", lambda *a, **kw: (fetched, fetched))
+    monkeypatch.setattr(round_winners, "score_output", score_output)
+    stage_data = gsm8k_stage_data(None, HivemindNode("test", CK), None, None)
+
+    # Scored while the final stage trains; round end only waits for them.
+    assert stage_data.round_winner_prefetch_fn(0, 3)() == fetched
+    deadline = time.monotonic() + 10
+    while len(scored) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(scored) == 2
+    assert sorted(stage_data.round_winner_fn()) == sorted(fetched[0])
+    assert len(scored) == 2
+
+
 def test_gsm8k_stage_data(tmp_path):
     coord = HivemindNode.coordinator("test", CK)
     nodes = [HivemindNode("test", str(i)) for i in range(3)]
@@ -244,7 +301,7 @@ def test_gsm8k_stage_data(tmp_path):
 
     def check_outputs(outputs: dict[str, tuple] | None, output_checks={}):
         assert outputs
-        qo = outputs[QUESTION][1]
+        qo = decode_values(outputs)[QUESTION][1]
         assert qo["question"] == QUESTION
         assert qo["answer"] == "42"
         for k, check in output_checks.items():
@@ -1,4 +1,5 @@
 import itertools
+import json
 import math
 from collections import defaultdict
 from concurrent.futures import ThreadPoolExecutor
@@ -6,20 +7,29 @@ from pathlib import Path
 
 import hivemind
 import pytest
+from hivemind.utils import get_dht_time
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from trl import GRPOConfig
 
+from hivemind_exp.checkpoint import CheckpointMeta
 from hivemind_exp.dht_utils import (
     HivemindNode,
+    RoundStageRecord,
+    decode_values,
+    get_round_stage_record,
     leaderboard_key,
     outputs_key,
     rewards_key,
 )
 from hivemind_exp.hivemind_utils import SingleStageData, StageData
+from hivemind_exp.prompt_cache import PromptCache
 from hivemind_exp.tests.fake_data import CK, QUESTION, QUESTION_HASH, RSK, SAMPLES
 from hivemind_exp.trainer.hivemind_grpo_trainer import (
     HivemindGRPOTrainer,
+    blobs_to_publish,
+    checkpoint_matches_swarm,
     get_dht_value,
+    next_round_check_delay,
 )
 
 
@@ -48,7 +58,7 @@ def get_model_config(tmp_path, max_steps):
     return model, config
 
 
-def create_dht_and_trainer(tmp_path, node, stage_data, max_steps=1, initial_peers=[]):
+def create_dht_and_trainer(tmp_path, node, stage_data, max_steps=1, initial_peers=[], **kwargs):
     dht = hivemind.DHT(start=True, initial_peers=initial_peers, cache_nearest=2)
     model, config = get_model_config(tmp_path, max_steps=max_steps)
     tokenizer = AutoTokenizer.from_pretrained(TEST_MODEL_NAME)
@@ -59,6 +69,7 @@ def create_dht_and_trainer(tmp_path, node, stage_data, max_steps=1, initial_peer
         tokenizer=tokenizer,
         config=config,
         stage_data=stage_data,
+        **kwargs,
     )
     return dht, trainer
 
@@ -118,6 +129,36 @@ def test_single_node_single_stage(tmp_path):
         ),
     )
     trainer.train()
+    assert not trainer.leaderboard._thread
+    assert (Path(trainer.config.output_dir) / "model.safetensors").exists()
+
+
+def test_single_node_prompt_cache(tmp_path):
+    node = HivemindNode.coordinator("test", CK)
+
+    def reward_func(**kwargs):
+        return dummy_reward_func(node, **kwargs)
+
+    prompt_cache = PromptCache(AutoTokenizer.from_pretrained(TEST_MODEL_NAME), str(tmp_path / "cache"))
+    _, trainer = create_dht_and_trainer(
+        tmp_path,
+        node,
+        StageData(
+            max_rounds=1,
+            round_winner_fn=lambda: [CK],
+            stages=[
+                SingleStageData(
+                    name="0",
+                    reward_funcs=[reward_func],
+                    datasets_fn=lambda r, s: (SAMPLES, SAMPLES),  # type: ignore
+                ),
+            ],
+        ),
+        prompt_cache=prompt_cache,
+    )
+    trainer.train()
+    assert prompt_cache.stats.as_dict() == {"hits": 1, "misses": 0, "added": len(SAMPLES)}
+    assert node.outputs["question"] == SAMPLES[0]["prompt"][-1]["content"]
 
 
 def test_single_node_multi_stage(tmp_path):
@@ -157,6 +198,176 @@ def test_single_node_multi_stage(tmp_path):
 
     assert completions == {"merged_0": True}
 
+    record = get_round_stage_record(dht)
+    assert record
+    assert (record.version, record.round_num, record.stage) == (2, 0, 1)
+    assert record.next_round_at == 0.0  # Stage 1 hasn't been timed yet.
+    assert trainer.stage_durations.keys() == {0, 1}
+
+    timeline = [
+        json.loads(line)
+        for line in (Path(trainer.config.output_dir) / "timeline.jsonl").open()
+    ]
+    phases = defaultdict(set)
+    for record in timeline:
+        phases[(record["round"], record["stage"])].update(record["phases"])
+    assert phases.keys() == {(0, 0), (0, 1)}
+    for stage_phases in phases.values():
+        assert {
+            "datasets",
+            "train",
+            "generation",
+            "reward/reward_func",
+            "dht_store",
+            "publish_leaderboard",
+            "save_model",
+        } <= stage_phases
+    assert "cleanup" in phases[(0, 1)]
+
+
+def test_single_node_reuse_trainer(tmp_path):
+    calls = defaultdict(int)
+    node = HivemindNode.coordinator("test", CK)
+
+    def reward_func_0(**kwargs):
+        calls[0] += 1
+        return dummy_reward_func(node, **kwargs)
+
+    def reward_func_1(**kwargs):
+        calls[1] += 1
+        return dummy_reward_func(node, **kwargs)
+
+    stage_data = StageData(
+        max_rounds=1,
+        round_winner_fn=lambda: [CK],
+        stages=[
+            SingleStageData(
+                name=str(i),
+                reward_funcs=[reward_func],
+                datasets_fn=lambda r, s: (SAMPLES, SAMPLES),  # type: ignore
+            )
+            for i, reward_func in enumerate((reward_func_0, reward_func_1))
+        ],
+    )
+    dht, trainer = create_dht_and_trainer(tmp_path, node, stage_data)
+    trainer.train()
+
+    assert calls.keys() == {0, 1}
+    assert trainer.stage_trainer
+    assert trainer.stage_trainer.reward_funcs == [reward_func_1]
+    assert trainer.stage_trainer.model is trainer.model
+
+
+def test_single_node_resume(tmp_path):
+    trained = []
+    node = HivemindNode.coordinator("test", CK)
+
+    def reward_func(**kwargs):
+        return dummy_reward_func(node, **kwargs)
+
+    def datasets_fn(r, s):
+        trained.append((r, s))
+        return SAMPLES, SAMPLES
+
+    def create_stage_data(max_rounds):
+        return StageData(
+            max_rounds=max_rounds,
+            round_winner_fn=lambda: [CK],
+            stages=[
+                SingleStageData(
+                    name=str(i),
+                    reward_funcs=[reward_func],
+                    datasets_fn=datasets_fn,  # type: ignore
+                )
+                for i in range(2)
+            ],
+        )
+
+    _, trainer = create_dht_and_trainer(tmp_path, node, create_stage_data(1))
+    trainer.train()
+    assert trained == [(0, 0), (0, 1)]
+
+    # Restarting picks up after the last checkpointed stage.
+    trained.clear()
+    _, trainer = create_dht_and_trainer(tmp_path, node, create_stage_data(2))
+    trainer.train()
+    assert trained == [(1, 0), (1, 1)]
+
+
+def test_single_node_prefetch(tmp_path):
+    prefetched = []
+
+    def prefetch_fn(r, s):
+        prefetched.append((r, s))
+        return lambda: (SAMPLES, SAMPLES)
+
+    node = HivemindNode.coordinator("test", CK)
+
+    def reward_func(**kwargs):
+        return dummy_reward_func(node, **kwargs)
+
+    stage_data = StageData(
+        max_rounds=1,
+        round_winner_fn=lambda: [CK],
+        stages=[
+            SingleStageData(
+                name="0",
+                reward_funcs=[reward_func],
+                datasets_fn=lambda r, s: (SAMPLES, SAMPLES),  # type: ignore
+            ),
+            SingleStageData(
+                name="1",
+                reward_funcs=[reward_func],
+                datasets_fn=lambda r, s: pytest.fail("not prefetched"),  # type: ignore
+                prefetch_fn=prefetch_fn,  # type: ignore
+            ),
+        ],
+        prefetch=True,
+        prefetch_interval=0.1,
+    )
+    dht, trainer = create_dht_and_trainer(tmp_path, node, stage_data)
+    trainer.train()
+
+    assert prefetched and set(prefetched) == {(0, 1)}
+
+
+def test_blobs_to_publish():
+    published = {"fresh": 1000.0 + 3 * 3600, "stale": 1000.0 + 3600, "expired": 900.0}
+    digests = ["fresh", "stale", "expired", "new"]
+    assert blobs_to_publish(published, digests, 1000.0, 4 * 3600) == ["stale", "expired", "new"]
+
+
+def test_next_round_check_delay():
+    now = get_dht_time()
+    record = RoundStageRecord(3, 1, 2, now, now + 60, now + 60)
+    assert next_round_check_delay(None, 1, 5.0) is None
+    assert next_round_check_delay(record, 0, 5.0) is None
+
+    delay = next_round_check_delay(record, 1, 5.0, lead=2.0, jitter=1.0)
+    assert delay and 57.0 <= delay <= 59.0
+
+    # Unknown or overdue: poll at the check interval.
+    overdue = record._replace(next_round_at=now - 10)
+    assert 5.0 <= next_round_check_delay(overdue, 1, 5.0, jitter=1.0) <= 6.0  # type: ignore
+    unknown = record._replace(next_round_at=0.0)
+    assert 5.0 <= next_round_check_delay(unknown, 1, 5.0, jitter=1.0) <= 6.0  # type: ignore
+
+
+def test_checkpoint_matches_swarm():
+    now = get_dht_time()
+    meta = CheckpointMeta(round_num=2, stage=1, created_at=now)
+    assert checkpoint_matches_swarm(meta, 2, 1, None)
+    assert checkpoint_matches_swarm(meta, 5, 0, None)
+
+    # Past the swarm's position: the swarm was restarted.
+    assert not checkpoint_matches_swarm(meta, 2, 0, None)
+    assert not checkpoint_matches_swarm(meta, 0, 2, None)
+
+    # Written before the stage it completed started.
+    record = RoundStageRecord(8, 2, 1, now - 30, 0.0, 0.0)
+    assert checkpoint_matches_swarm(meta, 2, 1, record)
+    assert not checkpoint_matches_swarm(meta, 2, 1, record._replace(started_at=now + 600))
+
 
 ##############
 # MULTI NODE #
@@ -209,6 +420,7 @@ def test_multi_node_single_stage(tmp_path):
     for r, s in itertools.product([0], [0]):
         outputs = get_dht_value(dht0, key=outputs_key(node0.key, r, s), latest=True)
         assert outputs
+        outputs = decode_values(outputs)
         assert outputs[QUESTION_HASH][1] == {"question": QUESTION}
 
         rewards = get_dht_value(dht0, key=rewards_key(r, s), latest=True)
@@ -292,6 +504,7 @@ def test_multi_node_multi_stage(tmp_path):
     for r, s in itertools.product(range(1), range(3)):
         outputs = get_dht_value(dht0, key=outputs_key(node0.key, r, s), latest=False)
         assert outputs
+        outputs = decode_values(outputs)
         assert outputs[QUESTION_HASH][1] == {"question": QUESTION}
 
         rewards = get_dht_value(dht0, key=rewards_key(r, s), latest=False)
@@ -0,0 +1,75 @@
+import hivemind
+from hivemind.utils import get_dht_time
+
+from hivemind_exp.dht_publisher import DHTPublisher
+from hivemind_exp.dht_utils import (
+    get_dht_value,
+    leaderboard_delta_key,
+    leaderboard_key,
+    rewards_key,
+)
+from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.leaderboard import (
+    LeaderboardAggregator,
+    LeaderboardDelta,
+    LeaderboardView,
+    leaderboard_delta,
+)
+from hivemind_exp.tests.fake_data import CK
+
+
+def test_leaderboard_view_apply():
+    view = LeaderboardView()
+    view.reset(0, 0, {"a": 1.0}, version=1)
+
+    curr = {"a": 1.0, "b": 3.0}
+    assert view.apply(0, 0, leaderboard_delta({"a": 1.0}, curr, 2))
+    assert view.version == 2
+    assert view.leaderboard() == [("b", 3.0), ("a", 1.0)]
+
+    # Already applied.
+    assert view.apply(0, 0, leaderboard_delta({"a": 1.0}, curr, 2))
+
+    # Gap in versions or different stage needs a resync.
+    assert not view.apply(0, 0, leaderboard_delta(curr, {"a": 5.0}, 4))
+    assert not view.apply(0, 1, leaderboard_delta(curr, {"a": 5.0}, 3))
+
+    assert view.apply(0, 0, leaderboard_delta(curr, {"a": 5.0}, 3))
+    assert view.rewards == {"a": 5.0}
+
+
+def test_leaderboard_aggregator_refresh():
+    dht = hivemind.DHT(start=True)
+    node = HivemindNode.coordinator("test", CK)
+    publisher = DHTPublisher(dht)
+    aggregator = LeaderboardAggregator(dht, node, publisher)
+
+    def store_reward(key, value):
+        dht.store(
+            key=rewards_key(0, 0),
+            subkey=key,
+            value=value,
+            expiration_time=get_dht_time() + 60,
+        )
+
+    assert not aggregator.refresh(0, 0)  # Nothing published yet.
+
+    store_reward(CK, 2.0)
+    assert aggregator.refresh(0, 0)
+    assert not aggregator.refresh(0, 0)  # Unchanged.
+
+    store_reward("0", 4.0)
+    assert aggregator.refresh(0, 0)
+    assert publisher.flush(timeout=10)
+
+    leaderboard = get_dht_value(dht, key=leaderboard_key(0, 0), latest=True)
+    assert [tuple(t) for t in leaderboard] == [("0", 4.0), (CK, 2.0)]
+
+    delta = LeaderboardDelta(
+        *get_dht_value(dht, key=leaderboard_delta_key(0, 0), latest=True)
+    )
+    assert delta.version == 2
+    assert dict(delta.upserts) == {"0": 4.0}
+
+    publisher.close()
+    dht.shutdown()
@@ -0,0 +1,41 @@
+import copy
+
+import pyarrow as pa
+
+from hivemind_exp.gsm8k.generate_prompts import SESSION_RECORDS_COLUMN, get_stage2_samples, get_stage3_samples
+from hivemind_exp.gsm8k.long_format import AGENT_STRUCT, long_format_dataset, wide_row
+from hivemind_exp.tests.fake_data import CK, STAGE_1_MERGED, STAGE_2_MERGED
+
+
+def test_long_format_dataset():
+    s1 = copy.deepcopy(STAGE_1_MERGED)
+    s2 = copy.deepcopy(s1)
+    del s1["agent_answers"]["0"]
+    del s2["agent_answers"]["1"]
+    data = long_format_dataset([s1, s2])
+
+    assert data.cache_files == []
+    assert data.features.arrow_schema.field("agent_answers").type == pa.list_(AGENT_STRUCT)
+    assert len(data[0]["agent_answers"]) == 3
+    agents = {"agent_answers": [CK, "1", "2", "0"]}
+    assert wide_row(data[0], agents)["agent_answers_0"] == "No answer received..."
+    assert wide_row(data[1], agents)["agent_answers_0"] == s2["agent_answers"]["0"]
+
+
+def test_long_format_prompts_match_wide():
+    s1 = copy.deepcopy(STAGE_1_MERGED)
+    s2 = copy.deepcopy(s1)
+    del s1["agent_answers"]["0"]
+    del s2["agent_answers"]["1"]
+    wide, _ = get_stage2_samples(copy.deepcopy([s1, s2]))
+    long, _ = get_stage2_samples([s1, s2], long_format=True)
+    assert long["prompt"] == wide["prompt"]
+
+    s1 = copy.deepcopy(STAGE_2_MERGED)
+    s2 = copy.deepcopy(s1)
+    del s1["agent_opinion"][CK]
+    del s2["agent_opinion"]["0"]
+    wide, _ = get_stage3_samples(copy.deepcopy([s1, s2]))
+    long, _ = get_stage3_samples([s1, s2], long_format=True)
+    assert long["prompt"] == wide["prompt"]
+    assert SESSION_RECORDS_COLUMN not in long.column_names
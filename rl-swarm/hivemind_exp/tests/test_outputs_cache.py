@@ -0,0 +1,71 @@
+import time
+
+from hivemind_exp.outputs_cache import OutputsCache
+
+
+def test_outputs_cache_ttl():
+    cache = OutputsCache(ttl=0.1, negative_ttl=0.05)
+    cache.put("a", 0, 0, {"q": (0, {})})
+    cache.put_missing("b", 0, 0)
+
+    assert cache.lookup("a", 0, 0) == (True, {"q": (0, {})})
+    assert cache.lookup("b", 0, 0) == (True, None)
+    assert cache.lookup("c", 0, 0) == (False, None)
+
+    time.sleep(0.1)
+    assert cache.lookup("a", 0, 0) == (False, None)
+    assert cache.lookup("b", 0, 0) == (False, None)
+    assert cache.stats.as_dict() == {
+        "hits": 1,
+        "negative_hits": 1,
+        "misses": 3,
+        "evictions": 0,
+        "expirations": 2,
+        "invalidations": 0,
+        "unsettled": 0,
+    }
+
+
+def test_outputs_cache_bounds_and_invalidation():
+    cache = OutputsCache(max_entries=2)
+    cache.put("a", 0, 0, {})
+    cache.put("b", 0, 1, {})
+    cache.lookup("a", 0, 0)  # Most recently used.
+    cache.put("c", 1, 0, {})  # Evicts "b".
+
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+    assert not cache.lookup("b", 0, 1)[0]
+
+    cache.invalidate_round(0)
+    assert not cache.lookup("a", 0, 0)[0]
+    assert cache.lookup("c", 1, 0)[0]
+    assert cache.stats.invalidations == 1
+
+
+def test_outputs_cache_open_stage():
+    cache = OutputsCache(ttl=0.1)
+    cache.put("a", 0, 1, {"q": (0, {})})
+    cache.set_open_stage(0, 1)
+    assert not cache.lookup("a", 0, 1)[0]
+
+    # Served once a second fetch finds the outputs unchanged.
+    cache.put("a", 0, 1, {"q": (0, {})})
+    assert not cache.lookup("a", 0, 1)[0]
+    cache.put("a", 0, 1, {"q": (0, {}), "r": (1, {})})
+    assert not cache.lookup("a", 0, 1)[0]
+    cache.put("a", 0, 1, {"q": (0, {}), "r": (1, {})})
+    assert cache.lookup("a", 0, 1) == (True, {"q": (0, {}), "r": (1, {})})
+    assert cache.stats.unsettled == 2
+    cache.put_missing("b", 0, 1)
+    assert cache.lookup("b", 0, 1) == (True, None)
+
+    # Expired, it has to settle again.
+    time.sleep(0.1)
+    assert not cache.lookup("a", 0, 1)[0]
+    cache.put("a", 0, 1, {"q": (0, {}), "r": (1, {})})
+    assert cache.lookup("a", 0, 1)[0]
+
+    cache.set_open_stage(0, 2)
+    cache.put("c", 0, 1, {"q": (0, {})})
+    assert cache.lookup("c", 0, 1) == (True, {"q": (0, {})})
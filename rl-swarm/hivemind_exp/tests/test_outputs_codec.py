@@ -0,0 +1,39 @@
+import pytest
+
+from hivemind_exp.outputs_codec import (
+    OUTPUTS_MAGIC,
+    decode_blob,
+    decode_outputs,
+    encode_blob,
+    encode_outputs,
+)
+
+PROMPT = "The following answers were given to the question. " * 20
+
+
+def test_encode_outputs_round_trip():
+    outputs = {
+        "question": "short",
+        "answer": "42",
+        "stage2_prompt": PROMPT,
+        "agent_opinion": {"node": "<identify>Student #1</identify> " * 30},
+    }
+    encoded, blobs = encode_outputs(outputs)
+    assert encoded[0] == OUTPUTS_MAGIC
+    assert encoded[2]  # Compressed.
+    assert list(blobs.values()) == [PROMPT]
+
+    store = {d: encode_blob(text) for d, text in blobs.items()}
+    decoded = decode_outputs(encoded, lambda d: decode_blob(store[d]))
+    assert decoded == outputs
+
+
+def test_decode_outputs_legacy_and_missing_blob():
+    legacy = {"question": PROMPT, "answer": "42"}
+    assert decode_outputs(legacy) is legacy
+
+    encoded, _ = encode_outputs(legacy)
+    with pytest.raises(ValueError):
+        decode_outputs(encoded, lambda d: None)
+    with pytest.raises(ValueError):
+        decode_outputs((OUTPUTS_MAGIC, 99, False, b"{}"))
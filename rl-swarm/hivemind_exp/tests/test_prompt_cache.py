@@ -0,0 +1,63 @@
+import copy
+
+import pytest
+from transformers import AutoTokenizer
+from trl.data_utils import maybe_apply_chat_template
+
+from hivemind_exp.prompt_cache import ENTRIES_FILE, TOKENS_FILE, PromptCache
+
+TEST_MODEL_NAME = "trl-internal-testing/tiny-Qwen2ForCausalLM-2.5"
+
+
+def prompt(question, system="Be kind."):
+    return [{"role": "system", "content": system}, {"role": "user", "content": question}]
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return AutoTokenizer.from_pretrained(TEST_MODEL_NAME)
+
+
+def test_cached_batch_matches_tokenizer(tmp_path, tokenizer):
+    prompts = [prompt("How do I sleep better?"), prompt("Hi ✓")]
+    cache = PromptCache(tokenizer, str(tmp_path))
+    assert cache.tokenizer_for(prompts) is None
+    assert cache.add(prompts + prompts) == 2
+    assert cache.add(prompts) == 0
+
+    # As GRPOTrainer._prepare_inputs uses it, after a restart.
+    cached = PromptCache(tokenizer, str(tmp_path)).tokenizer_for(prompts)
+    assert cached is not None
+    texts = [maybe_apply_chat_template({"prompt": p}, cached)["prompt"] for p in prompts]
+    assert texts == [maybe_apply_chat_template({"prompt": p}, tokenizer)["prompt"] for p in prompts]
+    kwargs = dict(return_tensors="pt", padding=True, padding_side="left", add_special_tokens=False)
+    got, want = cached(texts, **kwargs), tokenizer(texts, **kwargs)
+    assert got["input_ids"].tolist() == want["input_ids"].tolist()
+    assert got["attention_mask"].tolist() == want["attention_mask"].tolist()
+    assert cached.batch_decode([1, 2]) == tokenizer.batch_decode([1, 2])
+
+    assert cache.tokenizer_for([prompt("How do I sleep better?", system="Be brief.")]) is None
+    assert cache.stats.as_dict() == {"hits": 0, "misses": 2, "added": 2}
+
+
+def test_namespace_and_recovery(tmp_path, tokenizer):
+    cache = PromptCache(tokenizer, str(tmp_path))
+    cache.add([prompt("a"), prompt("b")])
+
+    templated = copy.deepcopy(tokenizer)
+    templated.chat_template = "{% for m in messages %}{{ m['content'] }}{% endfor %}"
+    other = PromptCache(templated, str(tmp_path))
+    assert other.path != cache.path and len(other) == 0
+    assert PromptCache(tokenizer, str(tmp_path), revision="v2").path != cache.path
+
+    # A torn entry and id from a crashed append are dropped.
+    with open(f"{cache.path}/{ENTRIES_FILE}", "ab") as f:
+        f.write(b"\1" * 70)
+    with open(f"{cache.path}/{TOKENS_FILE}", "ab") as f:
+        f.write(b"\1" * 3)
+    reopened = PromptCache(tokenizer, str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.add([prompt("c")]) == 1
+    text, ids = PromptCache(tokenizer, str(tmp_path)).lookup(prompt("c"))
+    assert text == maybe_apply_chat_template({"prompt": prompt("c")}, tokenizer)["prompt"]
+    assert ids.tolist() == tokenizer(text, add_special_tokens=False)["input_ids"]
@@ -0,0 +1,92 @@
+import copy
+import re
+
+from transformers import AutoTokenizer
+
+from hivemind_exp.gsm8k.generate_prompts import (
+    build_stage3_user_prompt,
+    fill_unknown_answers_opinions,
+    generate_stage2_user_prompt,
+    pick_k_cols,
+    stage2_generator,
+    stage3_generator,
+)
+from hivemind_exp.gsm8k.prompt_packer import PROMPT_TEMPLATE_TOKENS, PromptPacker, fair_shares
+from hivemind_exp.tests.fake_data import STAGE_1_MERGED, STAGE_2_MERGED
+
+TOKENIZER = AutoTokenizer.from_pretrained("trl-internal-testing/tiny-Qwen2ForCausalLM-2.5")
+
+
+def test_fair_shares():
+    assert fair_shares([10, 100, 100], [1, 1, 1], 90) == [10, 40, 40]
+    assert fair_shares([10, 100, 100], [1, 1, 1], 91) == [10, 41, 40]
+    assert fair_shares([5, 5], [1, 1], 100) == [5, 5]
+    assert fair_shares([100, 100], [2, 1], 90) == [30, 30]
+    assert fair_shares([100], [1], -5) == [0]
+
+
+def test_pack():
+    packer = PromptPacker(TOKENIZER, budget=80, min_tokens=10)
+    long = " ".join(f"word{i}" for i in range(200))
+    items = [("a", long), ("b", "short answer"), ("c", long), ("d", long), ("e", long)]
+    packed = packer.pack("fixed text", items, markup="<m></m>")
+
+    assert list(packed) == ["a", "b", "c", "d"]  # Best first; no room for a fifth.
+    assert packed["b"] == "short answer"
+    total = packer.count("fixed text") + sum(packer.count("<m></m>") + packer.count(t) for t in packed.values())
+    assert total <= 80 + 2  # Decoded truncations may retokenize a little longer.
+    assert abs(packer.count(packed["a"]) - packer.count(packed["c"])) <= 2
+    assert packer.stats.dropped == 1 and packer.stats.truncated == 3
+
+    # Token ids are cached by content, across packs.
+    misses = packer.stats.misses
+    packer.pack("fixed text", items, markup="<m></m>")
+    assert packer.stats.misses == misses
+
+    # The best item is kept even if nothing fits.
+    assert list(PromptPacker(TOKENIZER, budget=0).pack("x", items[:2])) == ["a"]
+
+
+def test_packed_stage_prompts():
+    packer = PromptPacker(TOKENIZER, budget=600)
+    datum = next(stage2_generator([copy.deepcopy(STAGE_1_MERGED)]))
+    cols = list(datum)
+    prompt = generate_stage2_user_prompt(datum, cols, packer)
+    assert packer.count(prompt) <= 600 + 4
+    assert prompt.count("<therapist>") == 4
+    assert generate_stage2_user_prompt(datum, cols, PromptPacker(TOKENIZER, budget=10**6)) == (
+        generate_stage2_user_prompt(datum, cols)
+    )
+
+    values = [copy.deepcopy(STAGE_2_MERGED)]
+    fill_unknown_answers_opinions(values)
+    datum = next(stage3_generator(values))
+    datum["stage2_prompt"] = prompt
+    prompt, records = build_stage3_user_prompt(datum, list(datum), PromptPacker(TOKENIZER, budget=10**6))
+    assert (prompt, records) == build_stage3_user_prompt(datum, list(datum))
+    assert len(pick_k_cols(list(datum), datum, 3)) == sum(r["kind"] == "supervisor" for r in records)
+
+
+def test_packed_stage_prompts_fit_config_budget():
+    # max_prompt_length from configs/*/grpo-qwen-2.5-0.5b-deepseek-r1.yaml
+    budget = 256 - PROMPT_TEMPLATE_TOKENS
+    packer = PromptPacker(TOKENIZER, budget=budget)
+    stage1 = next(stage2_generator([copy.deepcopy(STAGE_1_MERGED)]))
+    prompt = generate_stage2_user_prompt(stage1, list(stage1), packer)
+    assert packer.count(prompt) <= budget
+    answers = re.findall(r"said \n([\s\S]*?)\n\n\n", prompt)
+    assert answers and packer.count(answers[0]) >= 16
+
+    values = [copy.deepcopy(STAGE_2_MERGED)]
+    fill_unknown_answers_opinions(values)
+    for datum in (
+        dict(next(stage3_generator(values)), stage2_prompt=prompt),
+        # With the stage 1 answers, stage 2 is repacked into its share.
+        dict(next(stage3_generator(values)), stage2_prompt=prompt, **{
+            c: v for c, v in stage1.items() if c.startswith("agent_answers")
+        }),
+    ):
+        stage3_prompt, _ = build_stage3_user_prompt(datum, list(datum), packer)
+        assert packer.count(stage3_prompt) <= budget
+        opinions = re.findall(r"provided \n([\s\S]*?)\n\n\n", stage3_prompt)
+        assert opinions and packer.count(opinions[0]) >= 16
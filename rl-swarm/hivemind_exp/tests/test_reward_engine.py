@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+
+import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+import hivemind_exp.gsm8k.stage3_rewards as stage3_rewards
+from hivemind_exp.gsm8k.reward_engine import RewardEngine, set_reward_workers
+from hivemind_exp.hivemind_utils import HivemindNode
+
+# Module level, so pool workers can import it.
+pool_engine = RewardEngine()
+
+
+@pool_engine.reward(heavy=True)
+def pid_reward(prompts, completions, **kwargs):
+    return [float(os.getpid())] * len(completions)
+
+
+@pool_engine.reward
+def inline_pid_reward(prompts, completions, **kwargs):
+    return [float(os.getpid())] * len(completions)
+
+
+def batch(contents, prompt="q"):
+    return {
+        "prompts": [[{"role": "user", "content": prompt}]] * len(contents),
+        "completions": [[{"role": "assistant", "content": c}] for c in contents],
+        "answer": ["4"] * len(contents),
+    }
+
+
+def test_reward_engine_computes_once():
+    engine = RewardEngine()
+    calls = []
+
+    @engine.reward
+    def length_reward(prompts, completions, weighting=1.0, **kwargs):
+        calls.append("length")
+        return [len(c[0]["content"]) * weighting for c in completions]
+
+    @engine.reward
+    def one_reward(completions, weighting=0.5, **kwargs):
+        calls.append("one")
+        return [weighting] * len(completions)
+
+    inputs = batch(["ab", "abcd"])
+    assert length_reward(**inputs) == [2.0, 4.0]
+    assert length_reward(**inputs) == [2.0, 4.0]
+    matrix = engine.matrix(**inputs)
+    assert calls == ["length", "one"]
+    assert matrix.names == ("length_reward", "one_reward")
+    assert matrix.total().tolist() == [2.5, 4.5]
+    assert matrix.total([2.0, 0.0]).tolist() == [4.0, 8.0]
+    assert matrix.row(1) == {"length_reward": 4.0, "one_reward": 0.5}
+    assert engine.stats.as_dict() == {
+        "hits": 2,
+        "misses": 2,
+        "uncached": 0,
+        "offloaded": 0,
+    }
+
+    # Explicit weightings and prompt-less calls aren't cached.
+    assert length_reward(weighting=2.0, **inputs) == [4.0, 8.0]
+    assert one_reward(inputs["completions"]) == [0.5, 0.5]
+    assert engine.stats.uncached == 2
+
+    # Another batch gets its own row set; old ones are evicted.
+    engine.max_batches = 1
+    engine.matrix(**batch(["ab", "abcd"], prompt="other"))
+    engine.matrix(**inputs)
+    assert calls.count("length") == 4
+
+
+def test_stage1_cumulative_matches_sum():
+    contents = [
+        "<think>\nx\n</think>\n<answer>\n4\n</answer>\n",
+        "<think>x</think> <answer>5</answer>",
+        "no tags",
+    ]
+    inputs = batch(contents)
+    funcs = [
+        stage1_rewards.correctness_reward_func,
+        stage1_rewards.int_reward_func,
+        stage1_rewards.strict_format_reward_func,
+        stage1_rewards.soft_format_reward_func,
+        stage1_rewards.xmlcount_reward_func,
+    ]
+    expected = np.sum([f(**inputs) for f in funcs], axis=0).tolist()
+
+    stats = stage1_rewards.reward_engine.stats
+    misses = stats.misses
+    node = HivemindNode("test", "test")
+    stage1_rewards.hivemind_cumulative_reward(node, logging=False, **inputs)
+    assert node.rewards == expected
+    assert stats.misses == misses
+    assert stage1_rewards.top_k_cumulative_reward(**inputs) == expected
+
+
+def test_heavy_rewards_on_pool():
+    inputs = batch(["ab", "abcd"])
+    set_reward_workers(2)
+    try:
+        # The first call of the batch starts the heavy column in a worker.
+        assert inline_pid_reward(**inputs) == [float(os.getpid())] * 2
+        assert pid_reward(**inputs)[0] != float(os.getpid())
+        assert pool_engine.stats.offloaded == 1
+
+        stage3_inputs = batch(["<majority>\nstudent_0\n</majority>\n"])
+        offloaded = stage3_rewards.reward_engine.stats.offloaded
+        pooled = stage3_rewards.reward_engine.matrix(**stage3_inputs).total()
+        assert stage3_rewards.reward_engine.stats.offloaded == offloaded + 2
+    finally:
+        set_reward_workers(0)
+
+    # Serial fallback gives the same rewards, from the similarity ratios the
+    # worker handed back.
+    stage3_rewards.reward_engine.clear()
+    hits = stage3_rewards.question_similarity.stats.hits
+    inline = stage3_rewards.reward_engine.matrix(**stage3_inputs).total()
+    assert inline.tolist() == pooled.tolist()
+    assert stage3_rewards.question_similarity.stats.hits == hits + 1
+    pool_engine.clear()
+    assert pid_reward(**inputs) == [float(os.getpid())] * 2
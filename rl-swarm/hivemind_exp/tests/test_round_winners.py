@@ -0,0 +1,53 @@
+import copy
+
+import hivemind_exp.gsm8k.stage3_rewards as stage3_rewards
+from hivemind_exp.gsm8k.round_winners import RoundWinnerScorer, score_output
+from hivemind_exp.hivemind_utils import HivemindNode
+from hivemind_exp.tests.fake_data import CK, STAGE_3_OUTPUTS
+
+
+def node_rewards_score(output):
+    # round_winners before the scorer: the cumulative reward's node.rewards.
+    node = HivemindNode("test", "test")
+    prompts = [
+        [
+            {"role": "system", "content": output["question"]},
+            {"role": "system", "content": output["stage3_prompt"]},
+        ],
+    ]
+    final_answer = next(iter(output["final_agent_decision"].items()))[1]
+    completions = [[{"role": "assistant", "content": final_answer}]]
+    stage3_rewards.hivemind_cumulative_reward(
+        node, prompts=prompts, completions=completions, **output
+    )
+    return sum(node.rewards)
+
+
+def test_round_winner_scorer():
+    good = STAGE_3_OUTPUTS[CK]
+    bad = copy.deepcopy(good)
+    bad["final_agent_decision"] = {"bad": "No tags at all."}
+    assert score_output(good) == node_rewards_score(good)
+    assert score_output(bad) == node_rewards_score(bad)
+    assert score_output(good) > score_output(bad)
+
+    scorer = RoundWinnerScorer()
+    # Training's engine isn't touched from the scorer's threads.
+    stats = stage3_rewards.reward_engine.stats.as_dict()
+    scorer.submit(0, "early", good).result()  # Arrived during the stage.
+    assert stage3_rewards.reward_engine.stats.as_dict() == stats
+    assert scorer.engine.stats.misses == len(scorer.engine.funcs)
+    outputs = [{"early": good, "late": bad}]
+    assert scorer.winners(0, outputs) == ["early", "late"]
+    assert scorer.scores(0, outputs) == {
+        "early": score_output(good),
+        "late": score_output(bad),
+    }
+    assert scorer.scored == 2
+
+    # Changed outputs are rescored; other rounds are separate.
+    scorer.winners(0, [{"early": good, "late": good}])
+    assert scorer.scored == 3
+    scorer.forget(1)
+    assert scorer.winners(1, outputs, limit=1) == ["early"]
+    assert scorer.scored == 5
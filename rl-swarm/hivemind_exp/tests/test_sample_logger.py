@@ -0,0 +1,79 @@
+import gzip
+import os
+import subprocess
+import sys
+
+import hivemind_exp.gsm8k.stage1_rewards as stage1_rewards
+from hivemind_exp.sample_logger import SampleLogger, sample_dir
+
+
+def test_sampling_is_deterministic():
+    samples = SampleLogger(rate=0.1, min_interval=0)
+    drawn = [samples.sampled("a.txt", f"key {i}") for i in range(10000)]
+    assert 800 < sum(drawn) < 1200
+    assert drawn == [samples.sampled("a.txt", f"key {i}") for i in range(10000)]
+    assert SampleLogger(rate=0).sampled("a.txt", "key") is False
+
+
+def test_rate_limit_per_file():
+    samples = SampleLogger(rate=1.0, min_interval=60)
+    assert samples.sampled("a.txt", "x")
+    assert not samples.sampled("a.txt", "y")
+    assert samples.sampled("b.txt", "y")
+    assert samples.stats.as_dict()["rate_limited"] == 1
+
+
+def test_rotation(tmp_path):
+    samples = SampleLogger(str(tmp_path), max_bytes=100, backup_count=2, compress=True)
+    for i in range(6):
+        samples.write("run/s.txt", f"{i}" * 60)
+        assert samples.flush(timeout=10)
+
+    run = tmp_path / "run"
+    assert sorted(p.name for p in run.iterdir()) == ["s.txt", "s.txt.1.gz", "s.txt.2.gz"]
+    assert (run / "s.txt").read_text() == "5" * 60
+    assert gzip.open(run / "s.txt.1.gz").read() == b"4" * 60
+    assert gzip.open(run / "s.txt.2.gz").read() == b"3" * 60
+    assert samples.stats.written == 6
+    assert samples.stats.rotated == 5
+
+
+def test_capture(tmp_path):
+    samples = SampleLogger(str(tmp_path))
+    with samples.capture() as captured:
+        samples.write("a.txt", "x")
+    samples.write("a.txt", "y")
+    assert samples.flush(timeout=10)
+    assert captured == [("a.txt", "x")]
+    assert (tmp_path / "a.txt").read_text() == "y"
+
+
+def test_reward_func_samples(tmp_path, monkeypatch):
+    samples = SampleLogger(str(tmp_path), rate=1.0)
+    monkeypatch.setattr(stage1_rewards, "sample_logger", samples)
+    completions = [[{"role": "assistant", "content": "<answer>\n4\n</answer>\n"}]]
+    prompts = [[{"role": "user", "content": "2 + 2?"}]]
+    stage1_rewards.correctness_reward_func(
+        prompts, completions, ["4"], weighting=2.0, logging=True
+    )
+    assert samples.flush(timeout=10)
+
+    text = (tmp_path / sample_dir("gsm8k") / "correctness_samples.txt").read_text()
+    assert text.startswith("-" * 20 + "Question:\n2 + 2?")
+
+
+def test_flushes_at_exit(tmp_path):
+    # The writer is a daemon thread; exiting right after a write still writes it.
+    script = (
+        "from hivemind_exp.sample_logger import sample_logger\n"
+        "sample_logger.write('run/s.txt', 'x' * 100000)\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": root},
+        check=True,
+        timeout=60,
+    )
+    assert (tmp_path / "model_output_samples" / "run" / "s.txt").read_text() == "x" * 100000
@@ -0,0 +1,158 @@
+import json
+import logging
+import threading
+
+import hivemind_exp.gsm8k.generate_prompts as generate_prompts
+from hivemind_exp.session_store import SessionStore
+
+
+def test_append_and_render(tmp_path):
+    store = SessionStore(str(tmp_path / "session"), max_segment_bytes=200)
+    assert store.next_id("supervisor") == 1
+    store.append("text", "# All Supervisor Feedback\n\n")
+    assert store.append("supervisor", "Good.", id="0") == 1
+    assert store.append("supervisor", "Better.", id="1") == 2
+    assert store.append("therapist_answer", "Breathe.", id="3") == 1
+    assert store.append("supervisor_feedback", "**Tip** rest") == 1
+    assert store.append("model_response", "Hi.", conversation=True) == 1
+    assert store.next_id("supervisor") == 3
+    assert len(list((tmp_path / "session").glob("segment-*.jsonl"))) > 1
+
+    assert "".join(store.render()) == (
+        "# All Supervisor Feedback\n\n"
+        '<supervisor id="0" entry="1">\nGood.\n</supervisor>\n\n'
+        '<supervisor id="1" entry="2">\nBetter.\n</supervisor>\n\n'
+        '<therapist_answer id="3" entry="1">\nBreathe.\n</therapist_answer>\n\n'
+        + "-" * 80 + "\n\n"
+        "<supervisor_feedback #1>\n**Tip** rest\n</supervisor_feedback>\n\n"
+        '<model_response #1 conversation="ongoing">\nHi.\n</model_response>\n\n'
+        + "-" * 80 + "\n\n"
+    )
+    assert [r["text"] for r in store.records(["supervisor"])] == ["Good.", "Better."]
+
+
+def test_recovers_unindexed_records(tmp_path):
+    root = tmp_path / "session"
+    store = SessionStore(str(root))
+    store.append("supervisor", "a", id="0")
+    store.flush()
+    index = (root / "index.json").read_text()
+    store.append("supervisor", "b", id="0")
+
+    # Crash after the record but before the index, with a torn last line.
+    (root / "index.json").write_text(index)
+    with open(root / "segment-00000.jsonl", "a") as f:
+        f.write('{"kind": "super')
+    reopened = SessionStore(str(root))
+    assert reopened.next_id("supervisor") == 3
+    assert reopened.append("supervisor", "c", id="0") == 3
+
+    (root / "index.json").unlink()
+    assert SessionStore(str(root)).next_id("supervisor") == 4
+
+
+def test_prompt_builders_use_store(tmp_path, monkeypatch):
+    store = SessionStore(str(tmp_path / "session"))
+    monkeypatch.setattr(generate_prompts, "session_store", store)
+    generate_prompts.extract_supervisor_content("**Advice** rest well")
+    generate_prompts.extract_supervisor_content("**Advice** sleep")
+    for i in range(3):
+        generate_prompts.record_therapist_answer(i, f"answer {i}")
+
+    assert store.next_id("supervisor_feedback") == 3
+    assert store.next_id("therapist_answer") == 4
+    for i in range(3):
+        store.append("supervisor", f"feedback {i}", id=str(i))
+    assert generate_prompts.extract_valuable_supervisor_feedback() == [
+        {"entry": 3, "text": "feedback 2"}
+    ]
+
+
+def test_entry_index(tmp_path):
+    root = tmp_path / "session"
+    store = SessionStore(str(root), max_segment_bytes=150)
+    for i in range(10):
+        store.append("supervisor", f"feedback {i}", id=str(i))
+        store.append("text", "-\n")
+    got = list(store.entries("supervisor", [3, 6, 9, 11]))
+    assert [(r["entry"], r["text"]) for r in got] == [(3, "feedback 2"), (6, "feedback 5"), (9, "feedback 8")]
+    assert list(store.entries("therapist_answer", [1])) == []
+
+    # A stale tail is dropped; a missing index is rebuilt from the segments.
+    with open(root / "supervisor.idx", "ab") as f:
+        f.write(b"\0" * 7)
+    assert [r["entry"] for r in SessionStore(str(root)).entries("supervisor", [10])] == [10]
+    (root / "supervisor.idx").unlink()
+    rebuilt = SessionStore(str(root))
+    assert [r["text"] for r in rebuilt.entries("supervisor", [1, 10])] == ["feedback 0", "feedback 9"]
+    assert rebuilt.next_id("text") == 11
+
+
+def test_imports_and_keeps_content_file(tmp_path, monkeypatch):
+    root, content = tmp_path / "session", tmp_path / "supervisor_content.txt"
+    legacy = (
+        '<supervisor id="0" entry="3">\nold feedback\n</supervisor>\n\n'
+        "<supervisor_feedback #2>\n**Tip** old\n</supervisor_feedback>\n\n"
+    )
+    content.write_text(legacy)
+    store = SessionStore(str(root), content_path=str(content))
+    assert store.next_id("supervisor") == 4
+    assert store.next_id("supervisor_feedback") == 3
+    assert store.append("supervisor", "feedback 4", id="1") == 4
+    assert store.append("supervisor", "feedback 5", id="2") == 5
+    assert store.append("supervisor", "feedback 6", id="3") == 6
+    assert content.read_text().startswith(legacy)
+    assert content.read_text() == "".join(store.render())
+    assert [r["entry"] for r in store.entries("supervisor", [3, 4])] == [4]
+
+    monkeypatch.setattr(generate_prompts, "session_store", store)
+    assert generate_prompts.extract_valuable_supervisor_feedback() == [
+        {"entry": 3, "text": "old feedback"},
+        {"entry": 6, "text": "feedback 6"},
+    ]
+
+    # A file out of step with the store is rendered again; a rebuilt index
+    # keeps the imported numbering.
+    content.write_text(legacy)
+    (root / "index.json").unlink()
+    (root / "supervisor.idx").unlink()
+    reopened = SessionStore(str(root), content_path=str(content))
+    assert reopened.next_id("supervisor") == 7
+    assert content.read_text() == "".join(store.render())
+    assert [r["text"] for r in reopened.entries("supervisor", [4])] == ["feedback 4"]
+
+
+def test_batches_index_saves(tmp_path):
+    root = tmp_path / "session"
+    store = SessionStore(str(root), save_every=3)
+    for i in range(4):
+        store.append("supervisor", f"feedback {i}", id=str(i))
+    assert json.loads((root / "index.json").read_text())["counters"] == {"supervisor": 3}
+    assert SessionStore(str(root)).next_id("supervisor") == 5  # Recovered.
+
+    store.append("supervisor", "feedback 4", id="4")
+    store.flush()
+    assert json.loads((root / "index.json").read_text())["counters"] == {"supervisor": 5}
+
+
+def test_logging_handler_can_append(tmp_path):
+    content = tmp_path / "supervisor_content.txt"
+    content.write_text("<supervisor_feedback #2>\nold\n</supervisor_feedback>\n\n")
+    log = logging.getLogger("test_session_store.handler")
+    log.setLevel(logging.INFO)
+    store = SessionStore(str(tmp_path / "session"), content_path=str(content), log=log)
+
+    class StoreHandler(logging.Handler):
+        def emit(self, record):
+            store.append("text", self.format(record) + "\n")
+
+    log.addHandler(StoreHandler())
+    try:
+        # Opening logs the import, which the handler appends to the store.
+        opened = threading.Thread(target=store.next_id, args=("text",), daemon=True)
+        opened.start()
+        opened.join(timeout=10)
+        assert not opened.is_alive()
+    finally:
+        log.handlers.clear()
+    assert "Imported" in [r["text"] for r in store.records(["text"])][-1]
@@ -0,0 +1,75 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+import hivemind_exp.gsm8k.stage3_rewards as stage3_rewards
+from hivemind_exp.gsm8k.similarity import Similarity, lcs_length, lcs_ratio
+
+
+def dp_lcs_length(a, b):
+    row = [0] * (len(b) + 1)
+    for ch in a:
+        prev = 0
+        for j, other in enumerate(b):
+            prev, row[j + 1] = row[j + 1], prev + 1 if ch == other else max(row[j + 1], row[j])
+    return row[-1]
+
+
+def test_lcs_matches_dynamic_programming():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choices("abc ", k=rng.randint(0, 30)))
+        b = "".join(rng.choices("abcd", k=rng.randint(0, 30)))
+        assert lcs_length(a, b) == dp_lcs_length(a, b), (a, b)
+        assert lcs_ratio(a, b) >= SequenceMatcher(None, a, b).ratio() - 1e-12
+    assert lcs_ratio("", "") == 1.0
+    assert lcs_ratio("same", "same") == 1.0
+
+
+def test_similarity_cache():
+    similarity = Similarity("exact", cache_size=2)
+    assert similarity.ratio("abcd", "abce") == SequenceMatcher(None, "abcd", "abce").ratio()
+    similarity.ratios(["abcd", "x"], "abce")
+    assert similarity.stats.as_dict() == {"hits": 1, "misses": 2}
+    similarity.ratio("y", "abce")
+    similarity.ratio("abcd", "abce")
+    assert similarity.stats.misses == 4
+
+    with pytest.raises(ValueError):
+        Similarity("unknown")
+
+
+def test_similarity_record_and_update():
+    worker, parent = Similarity(), Similarity()
+    worker.ratio("abcd", "abce")
+    with worker.record() as recorded:
+        worker.ratios(["abcd", "x"], "abce")
+    assert len(recorded) == 1
+
+    parent.update(recorded)
+    assert parent.ratio("x", "abce") == worker.ratio("x", "abce")
+    assert parent.stats.as_dict() == {"hits": 1, "misses": 0}
+
+
+def test_question_recreation_backends(monkeypatch):
+    question = "How many apples are left after eating two of five?"
+    prompt = (
+        f"The question we were given is: {question}  \n\n"
+        "The following answers to this question were suggested:"
+    )
+    recreations = [question, "How many apples are left?", "Unrelated text."]
+    completions = [
+        [{"role": "assistant", "content": f"<question>\n{r}\n</question>\n"}]
+        for r in recreations
+    ]
+    prompts = [[{"role": "user", "content": prompt}]] * len(completions)
+
+    monkeypatch.setattr(stage3_rewards, "question_similarity", Similarity("exact"))
+    exact = stage3_rewards.question_recreation_reward_func(prompts, completions, weighting=1.0)
+    assert exact == [SequenceMatcher(None, r, question).ratio() for r in recreations]
+
+    monkeypatch.setattr(stage3_rewards, "question_similarity", Similarity("lcs"))
+    fast = stage3_rewards.question_recreation_reward_func(prompts, completions, weighting=1.0)
+    assert fast[0] == 1.0
+    assert all(f >= e for f, e in zip(fast, exact))
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import hivemind
+
+from hivemind_exp.dht_utils import get_outputs_batch, get_outputs_cache
+from hivemind_exp.stage_prefetch import StagePrefetcher
+from hivemind_exp.tests.test_dht_utils import store_outputs
+
+
+def test_stage_prefetcher_waits_until_ready():
+    ready = threading.Event()
+    calls = []
+
+    def prefetch_fn(r, s):
+        calls.append((r, s))
+        return lambda: len(calls)
+
+    prefetcher = StagePrefetcher(
+        prefetch_fn, 0, 1, ready_fn=ready.is_set, interval=0.01
+    ).start()
+    time.sleep(0.05)
+    assert not calls
+
+    ready.set()
+    while prefetcher.refreshes < 2:
+        time.sleep(0.01)
+
+    build_fn = prefetcher.take(max_age=10)
+    assert build_fn
+    assert build_fn() >= 2
+    assert set(calls) == {(0, 1)}
+
+
+def test_stage_prefetcher_refreshes_on_take():
+    ready = threading.Event()
+    calls = []
+
+    def prefetch_fn(r, s):
+        calls.append((r, s))
+        return lambda: len(calls)
+
+    prefetcher = StagePrefetcher(
+        prefetch_fn, 0, 1, ready_fn=ready.is_set, interval=10
+    ).start()
+    time.sleep(0.05)
+    ready.set()  # Since the last poll.
+    build_fn = prefetcher.take(max_age=10)
+    assert build_fn and build_fn() == 1
+
+    # Outputs published after the last background refresh are collected too.
+    prefetcher = StagePrefetcher(prefetch_fn, 0, 1, interval=10).start()
+    while not prefetcher.refreshes:
+        time.sleep(0.01)
+    build_fn = prefetcher.take(max_age=10)
+    assert build_fn and build_fn() == 3
+    assert prefetcher.refreshes == 2
+
+
+def test_stage_prefetcher_freshness():
+    calls = []
+
+    def prefetch_fn(r, s):
+        calls.append((r, s))
+        if len(calls) > 1:
+            raise ValueError("DHT unavailable")
+        return lambda: "old"
+
+    prefetcher = StagePrefetcher(prefetch_fn, 0, 1, interval=10).start()
+    while not prefetcher.refreshes:
+        time.sleep(0.01)
+
+    time.sleep(0.05)
+    assert prefetcher.take(max_age=0.01) is None
+    build_fn = prefetcher.take(max_age=10)
+    assert build_fn and build_fn() == "old"
+
+
+def test_stage_prefetcher_errors():
+    def prefetch_fn(r, s):
+        raise ValueError("no rewards")
+
+    prefetcher = StagePrefetcher(prefetch_fn, 0, 1, interval=0.01).start()
+    time.sleep(0.05)
+    assert prefetcher.take(max_age=10) is None
+    prefetcher.stop()
+
+
+def test_stage_prefetcher_take_reuses_settled_outputs():
+    dht = hivemind.DHT(start=True)
+    for node_key in ("a", "b"):
+        store_outputs(dht, node_key, 0, 0)
+    # Stage 0 is still being trained while stage 1 is prefetched.
+    cache = get_outputs_cache(dht)
+    cache.set_open_stage(0, 0)
+
+    def prefetch_fn(r, s):
+        batch = get_outputs_batch(dht, ["a", "b", "c"], r, s - 1)
+        return lambda: batch
+
+    prefetcher = StagePrefetcher(prefetch_fn, 0, 1, interval=0.01).start()
+    while prefetcher.refreshes < 2:
+        time.sleep(0.01)
+    prefetcher.stop()
+
+    # Peers seen unchanged by two refreshes are served without a DHT get.
+    hits = cache.stats.hits
+    build_fn = prefetcher.take(max_age=10)
+    assert build_fn and build_fn().outputs.keys() == {"a", "b"}
+    assert cache.stats.hits == hits + 2
+
+    dht.shutdown()
@@ -0,0 +1,80 @@
+import json
+import urllib.request
+
+import hivemind
+from hivemind.utils import get_dht_time
+
+from hivemind_exp.dht_utils import get_dht_value
+from hivemind_exp.stage_timeline import (
+    StageTimeline,
+    attach_timeline,
+    serve_prometheus,
+    value_nbytes,
+)
+
+
+def test_stage_timeline_flush(tmp_path):
+    path = tmp_path / "timeline.jsonl"
+    timeline = StageTimeline(str(path))
+    timeline.set_stage(0, 0)
+    timeline.record("generation", 2.0)
+    timeline.record("generation", 1.0)
+    timeline.record("dht_store", 0.5, nbytes=100)
+    store = timeline.timed("dht_store", lambda: None, nbytes=50)
+
+    timeline.set_stage(0, 1)
+    with timeline.span("datasets"):
+        pass
+    store()  # Finishes late; still counted against stage 0.
+
+    records = timeline.flush()
+    assert [(r["round"], r["stage"]) for r in records] == [(0, 0), (0, 1)]
+    assert records[0]["phases"]["generation"] == {
+        "calls": 2,
+        "seconds": 3.0,
+        "max_seconds": 2.0,
+        "bytes": 0,
+    }
+    assert records[0]["phases"]["dht_store"]["calls"] == 2
+    assert records[0]["phases"]["dht_store"]["bytes"] == 150
+    assert records[1]["phases"]["datasets"]["calls"] == 1
+
+    assert timeline.flush() == []
+    timeline.record("checkpoint_write", 1.0, 10, round_num=0, stage=0)
+    timeline.flush()
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(r["round"], r["stage"]) for r in lines] == [(0, 0), (0, 1), (0, 0)]
+    assert timeline.totals["generation"].calls == 2
+
+
+def test_stage_timeline_prometheus():
+    timeline = StageTimeline()
+    timeline.set_stage(3, 1)
+    timeline.record("reward/format", 0.25)
+
+    server = serve_prometheus(timeline, 0, host="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        text = urllib.request.urlopen(url).read().decode()
+    finally:
+        server.shutdown()
+
+    assert 'rl_swarm_phase_seconds_total{phase="reward/format"} 0.25' in text
+    assert 'rl_swarm_phase_calls_total{phase="reward/format"} 1' in text
+    assert "rl_swarm_round 3" in text
+    assert "rl_swarm_stage 1" in text
+
+
+def test_dht_get_recorded():
+    dht = hivemind.DHT(start=True)
+    timeline = StageTimeline()
+    attach_timeline(dht, timeline)
+    timeline.set_stage(0, 0)
+
+    dht.store("key", (1, "value"), get_dht_time() + 60)
+    assert get_dht_value(dht, key="key", latest=True) == (1, "value")
+
+    stats = timeline.flush()[0]["phases"]["dht_get"]
+    assert stats["calls"] == 1
+    assert stats["bytes"] == value_nbytes((1, "value"))
@@ -16,6 +16,10 @@ class TestnetGRPOTrainer(HivemindGRPOTrainer):
     def get_round_and_stage(self):
         return self.coordinator.get_round_and_stage()
 
+    def get_round_stage_record(self):
+        # Rounds are driven by the chain; no transition estimates to go by.
+        return None
+
     def train_stages(self, round_num, start_stage, is_coordinator):
         super().train_stages(round_num, start_stage, is_coordinator)
         self.submit_winners(round_num, self.stage_data.round_winner_fn())
@@ -1,11 +1,14 @@
 import gc
 import hashlib
 import logging
+import random
 import time
 import traceback
 import json
 import os
-from typing import Any, Dict, List
+from collections import defaultdict
+from functools import wraps
+from typing import Any, Dict, Iterable, List
 
 import datasets
 import torch
@@ -13,21 +16,103 @@ from hivemind.dht import DHT
 from hivemind.utils import get_dht_time
 from trl import GRPOConfig, GRPOTrainer
 
+from hivemind_exp.checkpoint import CheckpointManager, CheckpointMeta
 from hivemind_exp.debug_utils import print_system_info
 from hivemind_exp.dht_utils import (
     ROUND_STAGE_NUMBER_KEY,
+    ROUND_STAGE_RECORD_KEY,
+    RoundStageRecord,
+    blob_key,
     get_dht_value,
+    get_outputs_cache,
     get_round_and_stage,
-    leaderboard_key,
+    get_round_stage_record,
     node_outputs_key,
     rewards_key,
+    round_stage_version,
 )
+from hivemind_exp.dht_publisher import DHTPublisher
 from hivemind_exp.hivemind_utils import HivemindNode, StageData
+from hivemind_exp.leaderboard import LeaderboardAggregator
 from hivemind_exp.name_utils import get_name_from_peer_id
+from hivemind_exp.outputs_codec import encode_blob, encode_outputs
+from hivemind_exp.prompt_cache import PromptCache
+from hivemind_exp.sample_logger import sample_logger
+from hivemind_exp.stage_prefetch import StagePrefetcher
+from hivemind_exp.stage_timeline import (
+    TIMELINE_FILE,
+    StageTimeline,
+    attach_timeline,
+    serve_prometheus,
+    value_nbytes,
+)
 
 
 MAX_TRAIN_FAILS = 5
 CADENCE_OF_UPDATE_STEPS = 4
+LEADERBOARD_REFRESH_INTERVAL = 10.0  # seconds
+CHECKPOINT_DIR = "stage_checkpoints"  # Under output_dir.
+# Followers wake this long before the expected next round, plus up to JITTER.
+ROUND_WAKE_LEAD = 2.0  # seconds
+ROUND_WAKE_JITTER = 2.0  # seconds
+# Allowed lag of a checkpoint's clock behind the coordinator's stage start.
+CHECKPOINT_CLOCK_SKEW = 60.0  # seconds
+# Blobs are published again once less than this share of their lifetime is
+# left, so outputs published later don't reference expired blobs.
+BLOB_REFRESH_SHARE = 0.5
+
+
+def next_round_check_delay(
+    record: RoundStageRecord | None,
+    round_num: int,
+    check_interval: float,
+    lead: float = ROUND_WAKE_LEAD,
+    jitter: float = ROUND_WAKE_JITTER,
+) -> float | None:
+    """
+    Seconds a follower that finished `round_num` should sleep before checking
+    for the next round. None if there's no record for that round to go by.
+    """
+    if not record or record.round_num != round_num:
+        return None
+
+    delay = check_interval  # Estimate unknown or overdue; keep polling.
+    if record.next_round_at:
+        delay = max(delay, record.next_round_at - lead - get_dht_time())
+    return delay + random.uniform(0, jitter)
+
+
+def checkpoint_matches_swarm(
+    meta: CheckpointMeta,
+    round_num: int,
+    stage: int,
+    record: RoundStageRecord | None,
+    clock_skew: float = CHECKPOINT_CLOCK_SKEW,
+) -> bool:
+    """
+    Whether a local checkpoint can be from the swarm run now at `round_num`
+    and `stage`. Rounds only move forward, so a checkpoint past that point,
+    or written before the stage it completed started, is from another run.
+    """
+    if (meta.round_num, meta.stage) > (round_num, stage):
+        return False
+    if record and (record.round_num, record.stage) == (meta.round_num, meta.stage):
+        return meta.created_at + clock_skew >= record.started_at
+    return True
+
+
+def blobs_to_publish(
+    published: dict[str, float],
+    digests: Iterable[str],
+    now: float,
+    lifetime: float,
+    refresh_share: float = BLOB_REFRESH_SHARE,
+) -> list[str]:
+    """
+    Digests that were never published or whose blob expires (per `published`,
+    digest -> expiration time) within `refresh_share * lifetime` of `now`.
+    """
+    return [d for d in digests if published.get(d, 0.0) - now < refresh_share * lifetime]
 
 
 class HivemindGRPOTrainer:
@@ -43,34 +128,102 @@ class HivemindGRPOTrainer:
             dht: DHT,
             tokenizer,
             logger,
+            publisher: DHTPublisher | None = None,
+            timeline: StageTimeline | None = None,
             **kwargs,
         ):
             self.node = node
             self.dht = dht
             self.logger = logger
+            # DHT writes are sent in the background so they don't add to step time.
+            self.publisher = publisher or DHTPublisher(dht, log=logger)
+            self.timeline = timeline or StageTimeline()
+            self._reward_seconds = 0.0
             self.stage_rewards = 0.0
             self.stage_outputs = {}
+            self.published_blobs: dict[str, float] = {}  # Digest -> expiration time.
+            # Set for stages whose prompts are cached; see stage_prompt_cache.
+            self.prompt_cache: PromptCache | None = None
             super().__init__(processing_class=tokenizer, **kwargs)
 
-        def publish_leaderboard(self):
-            r, s = self.node.round_num, self.node.stage_num
-            curr_rewards: dict[str, Any] | None = get_dht_value(
-                self.dht, key=rewards_key(r, s), latest=True
-            )
-            if curr_rewards:
-                # Sorted list of (node_key, reward) pairs.
-                leaderboard = list(
-                    sorted(
-                        curr_rewards.items(), key=lambda t: (t[1], t[0]), reverse=True
-                    )
-                )
-                self.dht.store(
-                    key=leaderboard_key(r, s),
-                    value=leaderboard,
-                    expiration_time=get_dht_time() + self.node.out_expiration,
+        def set_stage(self, train_dataset, eval_dataset, reward_funcs: list):
+            """
+            Points this trainer at another stage. Model, optimizer and reference
+            model stay resident; their state is reset to match a new trainer.
+            """
+            assert all(callable(f) for f in reward_funcs)
+            self.train_dataset = train_dataset
+            self.eval_dataset = eval_dataset
+            self.reward_funcs = list(reward_funcs)
+            self.reward_processing_classes = [None] * len(self.reward_funcs)
+            if self.args.reward_weights is not None:
+                assert len(self.args.reward_weights) == len(self.reward_funcs)
+                self.reward_weights = torch.tensor(
+                    self.args.reward_weights, dtype=torch.float32
                 )
             else:
-                self.logger.info(f"Can't retrieve round {r} stage {s - 1} rewards")
+                self.reward_weights = torch.ones(
+                    len(self.reward_funcs), dtype=torch.float32
+                )
+
+            # Fresh LR schedule and optimizer moments, as before.
+            self.lr_scheduler = None
+            if self.optimizer is not None:
+                self.optimizer.state.clear()
+            # Reference weights follow the model, like a new reference copy would.
+            if self.ref_model is not None:
+                self.accelerator.unwrap_model(self.ref_model).load_state_dict(
+                    self.accelerator.unwrap_model(self.model).state_dict()
+                )
+            if self.use_vllm:
+                self._last_loaded_step = -1  # Step counter restarts; reload weights.
+
+            self._metrics = defaultdict(list)
+            self.stage_rewards = 0.0
+            self.stage_outputs = {}
+            now = get_dht_time()
+            self.published_blobs = {
+                d: t for d, t in self.published_blobs.items() if t > now
+            }
+
+        def _timed_reward_func(self, reward_func):
+            phase = f"reward/{getattr(reward_func, '__name__', 'reward')}"
+
+            @wraps(reward_func)
+            def timed_reward_func(*args, **kwargs):
+                start_time = time.monotonic()
+                try:
+                    return reward_func(*args, **kwargs)
+                finally:
+                    elapsed = time.monotonic() - start_time
+                    self._reward_seconds += elapsed
+                    self.timeline.record(phase, elapsed)
+
+            return timed_reward_func
+
+        def _prepare_inputs(self, inputs):
+            # Generation and scoring happen here; reward functions are timed
+            # individually, the rest (generation, reference log-probs) as one.
+            reward_funcs = self.reward_funcs
+            self.reward_funcs = [
+                f if isinstance(f, torch.nn.Module) else self._timed_reward_func(f)
+                for f in reward_funcs
+            ]
+            # Cached prompts skip the chat template and tokenizer.
+            tokenizer = self.processing_class
+            if self.prompt_cache is not None:
+                cached = self.prompt_cache.tokenizer_for([x["prompt"] for x in inputs])
+                self.processing_class = cached or tokenizer
+            self._reward_seconds = 0.0
+            start_time = time.monotonic()
+            try:
+                return super()._prepare_inputs(inputs)
+            finally:
+                self.reward_funcs = reward_funcs
+                self.processing_class = tokenizer
+                self.timeline.record(
+                    "generation", time.monotonic() - start_time - self._reward_seconds
+                )
 
         def compute_loss(self, model, inputs, *args, **kwargs):
             loss = super().compute_loss(model, inputs, *args, **kwargs)
@@ -95,11 +248,24 @@ class HivemindGRPOTrainer:
                 self.logger.info("-" * 50)
 
                 value = (time.time(), self.node.outputs)
-                self.dht.store(
+                expiration_time = get_dht_time() + self.node.out_expiration
+                encoded, blobs = encode_outputs(self.node.outputs)
+                # Shared strings are published once per lifetime and referenced by digest.
+                for digest in blobs_to_publish(
+                    self.published_blobs, blobs, get_dht_time(), self.node.out_expiration
+                ):
+                    self.publisher.store(
+                        key=blob_key(digest),
+                        value=encode_blob(blobs[digest]),
+                        expiration_time=expiration_time,
+                        keep=True,  # Queued outputs records reference it.
+                    )
+                    self.published_blobs[digest] = expiration_time
+                self.publisher.store(
                     key=node_outputs_key(self.node),
                     subkey=q_hash,
-                    value=value,
-                    expiration_time=get_dht_time() + self.node.out_expiration,
+                    value=(value[0], encoded),
+                    expiration_time=expiration_time,
                 )
                 self.node.put_stage_outputs(
                     self.node.round_num, self.node.stage_num, q_hash, value
@@ -107,14 +273,12 @@ class HivemindGRPOTrainer:
 
                 # Just the latest.
                 self.stage_rewards += sum(self.node.rewards)
-                self.dht.store(
+                self.publisher.store(
                     key=rewards_key(self.node.round_num, self.node.stage_num),
                     subkey=self.node.key,
                     value=self.stage_rewards,
                     expiration_time=get_dht_time() + self.node.out_expiration,
                 )
-            if self.node.is_coordinator:
-                self.publish_leaderboard()
 
             return loss
 
@@ -127,6 +291,9 @@ class HivemindGRPOTrainer:
         model,
         tokenizer,
         log_tag=None,
+        reuse_trainer=True,
+        metrics_port: int | None = None,
+        prompt_cache: PromptCache | None = None,
         **kwargs,
     ):
         # The single coordinator is responsible for incrementing round + stage numbers.
@@ -142,6 +309,7 @@ class HivemindGRPOTrainer:
         self.config.output_dir += f"-{get_name_from_peer_id(self.node.key, True)}"  # TODO: Add animal name to save path in more appropriate spot
         self.model = model
         self.tokenizer = tokenizer
+        self.resume_point: tuple[int, int] | None = None  # (round, stage) to resume at.
         if tokenizer.pad_token is None:
             tokenizer.pad_token = tokenizer.eos_token
 
@@ -149,10 +317,41 @@ class HivemindGRPOTrainer:
             log_tag = self.node.key
 
         self.logger = logging.getLogger(f"{__name__}:{log_tag}")
+        # Time spent per phase, written per round and stage to output_dir.
+        self.timeline = StageTimeline(
+            os.path.join(self.config.output_dir, TIMELINE_FILE), log=self.logger
+        )
+        attach_timeline(self.dht, self.timeline)
+        if metrics_port is not None:
+            serve_prometheus(self.timeline, metrics_port)
+            self.logger.info(f"Serving timeline metrics on port {metrics_port}")
+        self.publisher = DHTPublisher(self.dht, log=self.logger)
+        self.checkpoints = CheckpointManager(
+            os.path.join(self.config.output_dir, CHECKPOINT_DIR),
+            timeline=self.timeline,
+            log=self.logger,
+        )
+        # Keep one GRPO trainer across stages instead of building one per stage.
+        self.reuse_trainer = reuse_trainer
+        self.stage_trainer: HivemindGRPOTrainer.PublishingGRPOTrainer | None = None
+        self.prompt_cache = prompt_cache
+        self.leaderboard = LeaderboardAggregator(
+            self.dht,
+            self.node,
+            self.publisher,
+            interval=LEADERBOARD_REFRESH_INTERVAL,
+            log=self.logger,
+        )
         
         # Storage for final summary
         self.all_stage_outputs = []
 
+        # Last seen duration of each stage; used to estimate transitions.
+        self.stage_durations: dict[int, float] = {}
+        # Seconds from seeing a new round to training on it (followers).
+        self.join_latencies: list[float] = []
+        self._join_seen_at: float | None = None
+
     def wait_for(self, result_fn=lambda: None, interval=10, timeout=30):
         start_time = time.monotonic()
         while time.monotonic() - start_time < timeout:
@@ -165,35 +364,56 @@ class HivemindGRPOTrainer:
         return result
 
     def train_stages(self, round_num, start_stage, is_coordinator):
-        # TODO: Needs checkpoint loading
         self.node.round_num = round_num
-        for i, stage in enumerate(self.stage_data.stages[start_stage:]):
-            stage_num = start_stage + i
-            self.node.stage_num = stage_num
-
-            if is_coordinator:
-                self.dht.store(
-                    key=ROUND_STAGE_NUMBER_KEY,
-                    value=(self.node.round_num, stage_num),
-                    expiration_time=get_dht_time() + self.node.out_expiration,
+        prefetcher: StagePrefetcher | None = None
+        try:
+            for i, stage in enumerate(self.stage_data.stages[start_stage:]):
+                stage_num = start_stage + i
+                self.node.stage_num = stage_num
+                self.timeline.set_stage(round_num, stage_num)
+
+                stage_start_time = time.monotonic()
+                if is_coordinator:
+                    self.leaderboard.start()
+                    self.publish_round_stage(round_num, stage_num)
+
+                self.logger.info(f"📈 Training round: {round_num} stage: {stage_num}")
+                train_dataset, test_dataset = self.stage_datasets(
+                    stage, round_num, stage_num, prefetcher
                 )
+                # Outputs of this stage are published while it trains.
+                get_outputs_cache(self.dht).set_open_stage(round_num, stage_num)
+                prefetcher = self.start_prefetch(round_num, stage_num + 1)
+                trainer = self.get_stage_trainer(stage, train_dataset, test_dataset)
+                if self._join_seen_at is not None:
+                    latency = time.monotonic() - self._join_seen_at
+                    self.join_latencies.append(latency)
+                    self._join_seen_at = None
+                    self.logger.info(
+                        f"Started training round {round_num} stage {stage_num} {latency:.1f}s after seeing it"
+                    )
+                self.train_and_save(trainer, train_dataset)
+                self.flush_publisher()
+                self.flush_samples()
+                if is_coordinator:
+                    # Make sure the final stage rewards make it onto the leaderboard.
+                    self.leaderboard.refresh(round_num, stage_num)
+                    self.flush_publisher()
+                self.stage_durations[stage_num] = time.monotonic() - stage_start_time
+                self.flush_timeline()
+                self.logger.info(
+                    f"📉 Finished training round: {round_num} stage: {stage_num}"
+                )
+        finally:
+            if prefetcher:
+                prefetcher.stop(wait=False)
+            # Started again by the coordinator's next round.
+            self.leaderboard.stop()
 
-            self.logger.info(f"📈 Training round: {round_num} stage: {stage_num}")
-            train_dataset, test_dataset = stage.datasets_fn(round_num, stage_num)
-            kwargs = {
-                "model": self.model,
-                "args": self.config,
-                "reward_funcs": stage.reward_funcs,
-                "train_dataset": train_dataset,
-                "eval_dataset": test_dataset,
-            }
-            trainer = HivemindGRPOTrainer.PublishingGRPOTrainer(
-                self.node, self.dht, self.tokenizer, self.logger, **kwargs
-            )
-            self.train_and_save(trainer, train_dataset)
-            self.logger.info(
-                f"📉 Finished training round: {round_num} stage: {stage_num}"
-            )
+        # The round's final weights, loadable from output_dir next to the
+        # tokenizer; stage checkpoints under it rotate.
+        with self.timeline.span("save_model"):
+            trainer.save_model(self.config.output_dir)
 
         # Push to HF hub if desired
         # TODO: Come back and add additional logic checking if they've provided access token+HF username
@@ -217,8 +437,106 @@ class HivemindGRPOTrainer:
         # Print final summary of all stages
         self.print_all_stage_outputs()
         self.cleanup()
+        self.flush_timeline()
+
+    def get_stage_trainer(self, stage, train_dataset, test_dataset):
+        start_time = time.monotonic()
+        if self.reuse_trainer and self.stage_trainer:
+            trainer = self.stage_trainer
+            trainer.set_stage(train_dataset, test_dataset, stage.reward_funcs)
+        else:
+            trainer = HivemindGRPOTrainer.PublishingGRPOTrainer(
+                self.node,
+                self.dht,
+                self.tokenizer,
+                self.logger,
+                publisher=self.publisher,
+                timeline=self.timeline,
+                model=self.model,
+                args=self.config,
+                reward_funcs=stage.reward_funcs,
+                train_dataset=train_dataset,
+                eval_dataset=test_dataset,
+            )
+            if self.reuse_trainer:
+                self.stage_trainer = trainer
+        trainer.prompt_cache = self.stage_prompt_cache(train_dataset)
+        self.logger.info(f"Stage trainer ready in {time.monotonic() - start_time:.2f}s")
+        return trainer
+
+    def stage_prompt_cache(self, train_dataset) -> PromptCache | None:
+        # Stage 0 prompts repeat every round; later stages' are new each time.
+        if self.prompt_cache is None or self.node.stage_num != 0:
+            return None
+        if added := self.prompt_cache.add(x["prompt"] for x in train_dataset):
+            self.logger.info(f"Cached {added} stage 0 prompts")
+        self.logger.info(f"Prompt cache stats: {self.prompt_cache.stats.as_dict()}")
+        return self.prompt_cache
+
+    def start_prefetch(self, round_num, stage_num) -> StagePrefetcher | None:
+        if not self.stage_data.prefetch or stage_num > len(self.stage_data):
+            return None
+        if stage_num == len(self.stage_data):
+            # After the final stage: its outputs, for round winners.
+            prefetch_fn = self.stage_data.round_winner_prefetch_fn
+        else:
+            prefetch_fn = self.stage_data.stages[stage_num].prefetch_fn
+        if not prefetch_fn:
+            return None
+
+        # Start collecting once this node has published its own outputs.
+        return StagePrefetcher(
+            prefetch_fn,
+            round_num,
+            stage_num,
+            ready_fn=lambda: bool(self.node.get_stage_outputs(round_num, stage_num - 1)),
+            interval=self.stage_data.prefetch_interval,
+            log=self.logger,
+        ).start()
+
+    def stage_datasets(
+        self, stage, round_num, stage_num, prefetcher: StagePrefetcher | None
+    ):
+        start_time = time.monotonic()
+        build_fn = None
+        with self.timeline.span("datasets"):
+            # Collects once more, now that the previous stage is done.
+            if prefetcher:
+                build_fn = prefetcher.take(self.stage_data.prefetch_max_age)
+            if build_fn:
+                datasets = build_fn()
+            else:
+                datasets = stage.datasets_fn(round_num, stage_num)
+        self.logger.info(
+            f"Round {round_num} stage {stage_num} datasets ready in {time.monotonic() - start_time:.1f}s"
+            + (" (prefetched)" if build_fn else "")
+        )
+        return datasets
+
+    def flush_publisher(self, timeout: float = 60.0):
+        if not self.publisher.flush(timeout):
+            self.logger.warning(f"Timed out flushing DHT writes after {timeout}s")
+        self.logger.info(f"DHT publisher stats: {self.publisher.stats.as_dict()}")
+
+    def flush_samples(self, timeout: float = 60.0):
+        if not sample_logger.flush(timeout):
+            self.logger.warning(f"Timed out writing output samples after {timeout}s")
+
+    def flush_timeline(self):
+        for record in self.timeline.flush():
+            phases = sorted(
+                record["phases"].items(), key=lambda t: t[1]["seconds"], reverse=True
+            )
+            summary = ", ".join(f"{name} {stats['seconds']:.1f}s" for name, stats in phases)
+            self.logger.info(
+                f"Round {record['round']} stage {record['stage']} time by phase: {summary}"
+            )
 
     def cleanup(self):
+        with self.timeline.span("cleanup"):
+            self._cleanup()
+
+    def _cleanup(self):
         # Clear various stage caches.
         gc.collect()
         if torch.cuda.is_available():
@@ -234,10 +552,16 @@ class HivemindGRPOTrainer:
 
         self.node.clear_stage_cache()
 
+        # Peer outputs from the finished round won't be asked for again.
+        outputs_cache = get_outputs_cache(self.dht)
+        outputs_cache.invalidate_round(self.node.round_num)
+        self.logger.info(f"Outputs cache stats: {outputs_cache.stats.as_dict()}")
+
     def train_and_save(self, trainer, train_dataset):
         for num_fails in range(MAX_TRAIN_FAILS):
             try:
-                train_result = trainer.train()
+                with self.timeline.span("train"):
+                    train_result = trainer.train()
                 break
             except (BlockingIOError, EOFError) as e:
                 self.logger.warning(f"DHT IPC error: {e}. Restarting training...")
@@ -277,24 +601,95 @@ class HivemindGRPOTrainer:
         self.logger.info("=" * 60)
         
         trainer.log_metrics("train", metrics)
+        save_start_time = time.monotonic()
         trainer.save_metrics("train", metrics)
         trainer.save_state()
 
-        self.logger.info("Saving model")
+        # Written in the background; includes this round's outputs for resuming.
         trainer.model.config.use_cache = True
-        trainer.save_model(self.config.output_dir)
-        self.logger.info(f"Model saved to {self.config.output_dir}")
+        self.checkpoints.save(
+            trainer.model, self.node.round_num, self.node.stage_num, self.node.round_cache
+        )
+        self.logger.info(
+            f"Checkpoint for round {self.node.round_num} stage {self.node.stage_num} queued"
+        )
         assert self.config.distributed_state
         self.config.distributed_state.wait_for_everyone()  # wait for all processes to load
 
-        self.tokenizer.save_pretrained(self.config.output_dir)
-        self.logger.info(f"Tokenizer saved to {self.config.output_dir}")
+        if self.checkpoints.save_tokenizer(self.tokenizer, self.config.output_dir):
+            self.logger.info(f"Tokenizer saved to {self.config.output_dir}")
+        # Time on the training thread; the checkpoint itself is timed as it's written.
+        self.timeline.record("save_model", time.monotonic() - save_start_time)
+
+    def resume_from_checkpoint(
+        self,
+        swarm_round: int | None = None,
+        swarm_stage: int | None = None,
+        record: RoundStageRecord | None = None,
+    ):
+        """
+        Restores model weights and round outputs from the latest checkpoint.
+        Followers pass the swarm's current round and stage; a checkpoint that
+        can't be from this run is ignored.
+        """
+        meta = self.checkpoints.latest()
+        if not meta:
+            return
+        if swarm_round is not None and not checkpoint_matches_swarm(
+            meta, swarm_round, swarm_stage, record  # type: ignore
+        ):
+            self.logger.warning(
+                f"Ignoring checkpoint after round {meta.round_num} stage {meta.stage}; "
+                f"it is not from the swarm's run at round {swarm_round} stage {swarm_stage}"
+            )
+            return
+
+        self.node.round_cache.update(self.checkpoints.load(meta, self.model))
+        round_num, stage = meta.next_stage()
+        if stage >= len(self.stage_data):
+            round_num, stage = round_num + 1, 0
+        self.resume_point = (round_num, stage)
+        self.logger.info(
+            f"Resumed from checkpoint after round {meta.round_num} stage {meta.stage}"
+        )
+
+    def publish_round_stage(self, round_num, stage_num):
+        now = get_dht_time()
+        remaining = [
+            self.stage_durations.get(s) for s in range(stage_num, len(self.stage_data))
+        ]
+        record = RoundStageRecord(
+            version=round_stage_version(round_num, stage_num, len(self.stage_data)),
+            round_num=round_num,
+            stage=stage_num,
+            started_at=now,
+            next_transition_at=now + remaining[0] if remaining[0] else 0.0,
+            next_round_at=now + sum(remaining) if all(remaining) else 0.0,  # type: ignore
+        )
+        expiration_time = now + self.node.out_expiration
+        with self.timeline.span("dht_store", value_nbytes((round_num, stage_num))):
+            self.dht.store(
+                key=ROUND_STAGE_NUMBER_KEY,
+                value=(round_num, stage_num),
+                expiration_time=expiration_time,
+            )
+        with self.timeline.span("dht_store", value_nbytes(tuple(record))):
+            self.dht.store(
+                key=ROUND_STAGE_RECORD_KEY,
+                value=tuple(record),
+                expiration_time=expiration_time,
+            )
 
     def get_round_and_stage(self):
         return get_round_and_stage(self.dht)
 
+    def get_round_stage_record(self) -> RoundStageRecord | None:
+        return get_round_stage_record(self.dht)
+
     def coordinator_train(self):
-        round_num = 0
+        self.resume_from_checkpoint()
+        round_num, start_stage = self.resume_point or (0, 0)
+        self.resume_point = None
         start_time = time.monotonic()
         while (
             round_num < self.stage_data.max_rounds
@@ -303,7 +698,8 @@ class HivemindGRPOTrainer:
             self.logger.info(f"🤖 Starting new round: {round_num}")
 
             _ = self.dht.get_visible_maddrs(latest=True)
-            self.train_stages(round_num, 0, is_coordinator=True)
+            self.train_stages(round_num, start_stage, is_coordinator=True)
+            start_stage = 0
 
             round_num += 1
             if round_num == self.stage_data.max_rounds:
@@ -315,6 +711,7 @@ class HivemindGRPOTrainer:
         self, check_interval=5.0, log_timeout=10.0, max_check_interval=60.0 * 5
     ):
         done_rounds = set()
+        resumed = False
         start_time = time.monotonic()
         fetch_log_time = start_time
         check_backoff = (
@@ -337,10 +734,27 @@ class HivemindGRPOTrainer:
                 time.sleep(check_interval)
                 continue
 
+            record = self.get_round_stage_record()
+            if not resumed:
+                # Only once the swarm's round is known to check the checkpoint against.
+                resumed = True
+                self.resume_from_checkpoint(round_num, stage, record)
+            if self.resume_point:
+                # Skip rounds and stages this node finished before restarting.
+                resume_round, resume_stage = self.resume_point
+                self.resume_point = None
+                done_rounds.update(range(resume_round))
+                if resume_round == round_num:
+                    stage = max(stage, resume_stage)
             if round_num not in done_rounds:
                 self.logger.info(
                     f"🐝 Joining round: {round_num} starting at stage: {stage}"
                 )
+                self._join_seen_at = time.monotonic()
+                if record and (record.round_num, record.stage) == (round_num, stage):
+                    self.logger.info(
+                        f"Saw round {round_num} stage {stage} {get_dht_time() - record.started_at:.1f}s after it started"
+                    )
                 try:
                     self.train_stages(round_num, stage, is_coordinator=False)
                 except datasets.exceptions.DatasetGenerationError:
@@ -354,6 +768,15 @@ class HivemindGRPOTrainer:
 
                 done_rounds.add(round_num)
                 check_backoff = check_interval  # Reset backoff after successful round
+            elif (
+                delay := next_round_check_delay(record, round_num, check_interval)
+            ) is not None:
+                # Wake just before the coordinator expects to start the next round.
+                delay = min(delay, max_check_interval)
+                self.logger.info(
+                    f"Already finished round: {round_num}. Next check in {delay:.1f}s."
+                )
+                time.sleep(delay)
             else:
                 self.logger.info(
                     f"Already finished round: {round_num}. Next check in {check_backoff}s."
@@ -375,6 +798,8 @@ class HivemindGRPOTrainer:
     def train(self):
         try:
             self._train()
+            if not self.checkpoints.wait(timeout=600):
+                self.logger.warning("Timed out writing the last checkpoint")
 
         except Exception:
             self.logger.error("Encountered error during training!")
@@ -25,5 +25,6 @@ python -m hivemind_exp.gsm8k.train_single_gpu \
 
 echo ""
 echo "Therapy chatbot session ended."
-echo "All feedback and therapist responses have been recorded in supervisor_content.txt"
+echo "All feedback and therapist responses have been recorded in supervisor_session/"
+echo "and rendered to supervisor_content.txt as they were added."
 echo "Use this file to further improve the model in future sessions." 
\ No newline at end of file
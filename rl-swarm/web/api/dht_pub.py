@@ -10,7 +10,13 @@ import random
 from abc import ABC, abstractmethod
 
 from hivemind.dht import DHT
-from hivemind_exp.dht_utils import get_dht_value, rewards_key, outputs_key
+from hivemind_exp.dht_utils import (
+    decode_values,
+    get_blob,
+    get_dht_value,
+    outputs_key,
+    rewards_key,
+)
 from hivemind_exp.name_utils import get_name_from_peer_id
 from hivemind_exp.chain_utils import ModalSwarmCoordinator
 
@@ -101,7 +107,9 @@ class BaseDHTPublisher(ABC):
     def _get_outputs_data(self, node_key: str, round_num: int, stage_num: int) -> dict[str, Any] | None:
         outputs_key_str = outputs_key(node_key, round_num, stage_num)
         outputs_data = get_dht_value(self.dht, key=outputs_key_str)
-        return outputs_data
+        if outputs_data is None:
+            return None
+        return decode_values(outputs_data, lambda d: get_blob(self.dht, d))
 
 
     def _get_peer_name_from_id(self, peer_id: str) -> str:
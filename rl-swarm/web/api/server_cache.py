@@ -7,6 +7,7 @@ import os
 from .gossip_utils import *
 
 from hivemind_exp.dht_utils import *
+from hivemind_exp.leaderboard import LeaderboardView
 from hivemind_exp.name_utils import get_name_from_peer_id
 from .gossip_utils import stage1_message, stage2_message, stage3_message
 from .kinesis import GossipMessage, GossipMessageData, RewardsMessage, RewardsMessageData
@@ -33,6 +34,7 @@ class Cache:
         self.current_round = self.manager.Value("i", -1)
         self.current_stage = self.manager.Value("i", -1)
 
+        self.leaderboard_view = LeaderboardView()
         self.last_polled = None
 
     def get_round_and_stage(self):
@@ -94,6 +96,21 @@ class Cache:
         curr_stage = self.current_stage.value
         return self._get_dht_value(key=rewards_key(curr_round, curr_stage))
 
+    def _leaderboard_rewards(self) -> dict[str, Any] | None:
+        # Apply the coordinator's versioned delta if it chains onto what we have;
+        # otherwise resync from the full rewards dict.
+        curr_round = self.current_round.value
+        curr_stage = self.current_stage.value
+        delta = self._get_dht_value(key=leaderboard_delta_key(curr_round, curr_stage))
+        if delta and self.leaderboard_view.apply(curr_round, curr_stage, delta):
+            return self.leaderboard_view.rewards
+
+        rewards = self._current_rewards()
+        if rewards:
+            version = delta[0] if delta else 0  # LeaderboardDelta.version
+            self.leaderboard_view.reset(curr_round, curr_stage, rewards, version)
+        return rewards
+
     def _previous_rewards(self):
         return self._get_dht_value(key=rewards_key(*self._previous_round_and_stage()))
 
@@ -233,7 +250,7 @@ class Cache:
 
     def _get_leaderboard(self):
         try:
-            if rewards := self._current_rewards():
+            if rewards := self._leaderboard_rewards():
                 # Sorted list of (node_key, reward) pairs.
                 raw = list(
                     sorted(rewards.items(), key=lambda t: (t[1], t[0]), reverse=True)
@@ -331,6 +348,7 @@ class Cache:
                     break
 
                 if outputs := self._get_dht_value(key=outputs_key(node_key, r, s)):
+                    outputs = decode_values(outputs, lambda d: get_blob(self.dht, d))
                     sorted_outputs = sorted(
                         list(outputs.items()), key=lambda t: t[1][0]
                     )